@@ -21,6 +21,24 @@ app.config['PERMANENT_SESSION_LIFETIME'] = 86400  # 24 hours
 app.config['SESSION_COOKIE_SECURE'] = False  # Set to True in production with HTTPS
 app.config['SESSION_COOKIE_HTTPONLY'] = True
 
+# Stage timers, Server-Timing headers and /metrics; registered first so the
+# request timings include the auth check
+from app.metrics import init_metrics
+init_metrics(app)
+
+# Sampled request traces, exported in the background; off by default
+from app.tracing import init_tracing
+init_tracing(app)
+
+# Keep session data and credentials in the shared store so any worker or
+# node can serve any request
+from app.session_store import init_session_store
+init_session_store(app)
+
+# Validate credentials once per request and expose them on flask.g
+from app.auth_middleware import init_auth
+init_auth(app)
+
 from app import routes
 
 # Initialize routes and register blueprints
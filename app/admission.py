@@ -0,0 +1,260 @@
+import functools
+import math
+import os
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import Future
+from flask import current_app, jsonify, make_response, request, session
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request can't be admitted; retry_after is in seconds"""
+
+    def __init__(self, reason, retry_after):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionTicket:
+    """A held slot; release is idempotent so it can be tied to several completion paths"""
+
+    def __init__(self, controller, user):
+        self._controller = controller
+        self._user = user
+        self._started = time.monotonic()
+        self._released = False
+
+    def release(self):
+        self._controller._release(self)
+
+
+class AdmissionController:
+    """Per-user and global concurrency caps with a bounded FIFO wait queue
+
+    A user over max_per_user (counting queued requests) is rejected
+    immediately. Otherwise the request runs if a global slot is free, waits
+    in the queue for up to queue_timeout seconds, or is rejected at once if
+    the queue is full. Rejections carry a Retry-After estimated from recent
+    hold times, so clients back off instead of piling on.
+    """
+
+    def __init__(self, name, max_concurrent, max_per_user, max_queue, queue_timeout, default_hold_seconds=30):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.max_per_user = max_per_user
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._avg_hold = float(default_hold_seconds)
+        self._active = 0
+        self._users = Counter()
+        self._queue = deque()
+        self._cond = threading.Condition()
+
+    def _retry_after(self, ahead):
+        return max(1, math.ceil(self._avg_hold * (ahead + 1) / self.max_concurrent))
+
+    def acquire(self, user):
+        """Wait for a slot and return an AdmissionTicket, or raise AdmissionRejected"""
+        with self._cond:
+            if self._users[user] >= self.max_per_user:
+                raise AdmissionRejected("Too many requests in progress for this user", self._retry_after(0))
+            if self._active < self.max_concurrent and not self._queue:
+                return self._admit(user)
+            if len(self._queue) >= self.max_queue:
+                raise AdmissionRejected("Server is busy", self._retry_after(len(self._queue)))
+
+            waiter = object()
+            self._queue.append(waiter)
+            self._users[user] += 1
+            deadline = time.monotonic() + self.queue_timeout
+            try:
+                while self._queue[0] is not waiter or self._active >= self.max_concurrent:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise AdmissionRejected("Server is busy", self._retry_after(self._queue.index(waiter)))
+                    self._cond.wait(remaining)
+            except BaseException:
+                self._queue.remove(waiter)
+                self._users[user] -= 1
+                self._cond.notify_all()
+                raise
+            self._queue.popleft()
+            self._users[user] -= 1
+            return self._admit(user)
+
+    def _admit(self, user):
+        self._active += 1
+        self._users[user] += 1
+        return AdmissionTicket(self, user)
+
+    def _release(self, ticket):
+        with self._cond:
+            if ticket._released:
+                return
+            ticket._released = True
+            self._active -= 1
+            self._users[ticket._user] -= 1
+            if not self._users[ticket._user]:
+                del self._users[ticket._user]
+            # Exponentially weighted so Retry-After follows recent load
+            self._avg_hold = 0.8 * self._avg_hold + 0.2 * (time.monotonic() - ticket._started)
+            self._cond.notify_all()
+
+
+def _env_int(name, default):
+    return int(os.getenv(name, str(default)))
+
+
+# Participant searches hold their slot until the background search finishes
+study_admission = AdmissionController(
+    "study",
+    max_concurrent=_env_int("STUDY_MAX_CONCURRENT", 64),
+    max_per_user=_env_int("STUDY_MAX_PER_USER", 2),
+    max_queue=_env_int("STUDY_MAX_QUEUE", 32),
+    queue_timeout=_env_int("STUDY_QUEUE_TIMEOUT", 5),
+    default_hold_seconds=60,
+)
+compose_admission = AdmissionController(
+    "compose",
+    max_concurrent=_env_int("COMPOSE_MAX_CONCURRENT", 16),
+    max_per_user=_env_int("COMPOSE_MAX_PER_USER", 1),
+    max_queue=_env_int("COMPOSE_MAX_QUEUE", 32),
+    queue_timeout=_env_int("COMPOSE_QUEUE_TIMEOUT", 10),
+)
+send_admission = AdmissionController(
+    "send",
+    max_concurrent=_env_int("SEND_MAX_CONCURRENT", 8),
+    max_per_user=_env_int("SEND_MAX_PER_USER", 1),
+    max_queue=_env_int("SEND_MAX_QUEUE", 16),
+    queue_timeout=_env_int("SEND_QUEUE_TIMEOUT", 10),
+)
+
+
+def current_user_key():
+    """Session id, or the client address for requests without a session"""
+    return getattr(session, 'sid', None) or request.remote_addr
+
+
+def too_many_requests(rejection):
+    response = jsonify({"error": str(rejection), "retry_after": rejection.retry_after})
+    response.status_code = 429
+    response.headers['Retry-After'] = str(rejection.retry_after)
+    return response
+
+
+def admission_controlled(controller):
+    """Hold a slot from controller for the duration of the view"""
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            try:
+                ticket = controller.acquire(current_user_key())
+            except AdmissionRejected as e:
+                return too_many_requests(e)
+            try:
+                return current_app.ensure_sync(view)(*args, **kwargs)
+            finally:
+                ticket.release()
+        return wrapper
+    return decorator
+
+
+_inflight = {}
+_inflight_lock = threading.Lock()
+
+
+def _forget(key):
+    with _inflight_lock:
+        _inflight.pop(key, None)
+
+
+class _SharedStream:
+    """A streamed response body replayed to every request that joined it"""
+
+    def __init__(self, chunks, on_done):
+        self._chunks = chunks
+        self._on_done = on_done
+        self._buffer = []
+        self._done = False
+        self._condition = threading.Condition()
+
+    def feed(self):
+        """The leader's body: passes chunks through, keeping them for followers"""
+        try:
+            for chunk in self._chunks:
+                with self._condition:
+                    self._buffer.append(chunk)
+                    self._condition.notify_all()
+                yield chunk
+        finally:
+            self.finish()
+
+    def finish(self):
+        with self._condition:
+            if self._done:
+                return
+            self._done = True
+            self._condition.notify_all()
+        self._on_done()
+
+    def replay(self):
+        """A follower's body: everything sent so far, then the rest as it arrives"""
+        index = 0
+        while True:
+            with self._condition:
+                while index >= len(self._buffer) and not self._done:
+                    self._condition.wait()
+                if index >= len(self._buffer):
+                    return
+                chunk = self._buffer[index]
+            index += 1
+            yield chunk
+
+
+def coalesce_duplicates(request_key):
+    """Share one execution between identical in-flight requests from the same session
+
+    Requests are identical when they hit the same endpoint and request_key()
+    returns the same value for both, e.g. a double-clicked submit.
+    request_key reads the fields that decide what the view does. Raw bodies
+    won't do, since multipart boundaries and client tokens differ on every
+    request. The duplicate waits for the first and gets a copy of its
+    response instead of starting the work again. A streamed response is
+    replayed to duplicates as it is produced.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            key = (current_user_key(), request.endpoint, request_key())
+            with _inflight_lock:
+                future = _inflight.get(key)
+                leader = future is None
+                if leader:
+                    future = _inflight[key] = Future()
+
+            if not leader:
+                body, status, headers = future.result()
+                if isinstance(body, _SharedStream):
+                    body = body.replay()
+                return current_app.response_class(body, status=status, headers=headers)
+
+            try:
+                response = make_response(current_app.ensure_sync(view)(*args, **kwargs))
+            except BaseException as e:
+                future.set_exception(e)
+                _forget(key)
+                raise
+            if response.is_streamed:
+                # Stays joinable until the stream ends or the response is closed unread
+                shared = _SharedStream(response.response, lambda: _forget(key))
+                response.response = shared.feed()
+                response.call_on_close(shared.finish)
+                future.set_result((shared, response.status_code, list(response.headers)))
+                return response
+            future.set_result((response.get_data(), response.status_code, list(response.headers)))
+            _forget(key)
+            return response
+        return wrapper
+    return decorator
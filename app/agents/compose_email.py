@@ -1,94 +1,51 @@
 from crewai import Agent, Task, Crew, Process
 from langchain_google_genai import ChatGoogleGenerativeAI
+import google.generativeai as genai
 from dotenv import load_dotenv
+from app.agents.study_analysis import ANALYSIS_FINGERPRINT, analyze_study, format_analysis
+from app.db.models import get_cached_draft, store_cached_draft
+from app.metrics import count, timed, timer
+import hashlib
+import json
 import os
 
-def setup_crewai_agents():
-    load_dotenv()
-    api_key = os.getenv('GEMINI_API_KEY')
-    if not api_key:
-        raise ValueError("GEMINI_API_KEY not found in environment variables")
-    llm = ChatGoogleGenerativeAI(
-        model="gemini-2.5-flash",
-        google_api_key=api_key,
-        temperature=0.7
-    )
+MODEL_NAME = "gemini-2.5-flash"
+TEMPERATURE = 0.7
 
-    research_analyst = Agent(
-        role='Research Study Analyst',
-        goal='Analyze research study descriptions to understand participant requirements, study purpose, and methodology',
-        backstory=(
-            "You are an expert research analyst with years of experience in "
-            "understanding research methodologies and participant recruitment strategies. "
-            "You excel at breaking down complex research studies into clear, actionable "
-            "components for participant recruitment."
-        ),
-        verbose=True,
-        allow_delegation=False,
-        llm=llm
-    )
+# "full" runs the copywriter/editor crew, "fast" a single structured Gemini call.
+# Both start from the shared structured study analysis.
+COMPOSE_MODES = ('full', 'fast')
 
-    email_copywriter = Agent(
-        role='Professional Email Copywriter',
-        goal='Create compelling, professional recruitment emails that effectively communicate study details and encourage participation',
-        backstory=(
+AGENT_CONFIGS = {
+    'email_copywriter': {
+        'role': 'Professional Email Copywriter',
+        'goal': 'Create compelling, professional recruitment emails that effectively communicate study details and encourage participation',
+        'backstory': (
             "You are a senior email copywriter specializing in research "
             "recruitment communications. You have a proven track record of creating "
             "emails that achieve high response rates from potential research participants. "
             "You understand how to balance professionalism with approachability and "
             "always include clear calls-to-action."
         ),
-        verbose=True,
-        allow_delegation=False,
-        llm=llm
-    )
-
-    email_editor = Agent(
-        role='Email Content Editor',
-        goal='Review and polish email content to ensure it meets professional standards and is ready for sending',
-        backstory=(
+    },
+    'email_editor': {
+        'role': 'Email Content Editor',
+        'goal': 'Review and polish email content to ensure it meets professional standards and is ready for sending',
+        'backstory': (
             "You are a meticulous email editor with expertise in research "
             "communications. You ensure all emails are grammatically correct, "
             "professionally formatted, and follow best practices for participant "
             "recruitment. You have a keen eye for tone, clarity, and effectiveness."
         ),
-        verbose=True,
-        allow_delegation=False,
-        llm=llm
-    )
-
-    return research_analyst, email_copywriter, email_editor
-
-def compose_recruitment_email(study_description):
-    if not study_description:
-        raise ValueError("Study description cannot be None or empty")
-
-    try:
-        research_analyst, email_copywriter, email_editor = setup_crewai_agents()
-
-        analyze_study_task = Task(
-            description=f"""
-            Analyze the following research study description and extract key information:
+    },
+}
 
+CREATE_EMAIL_PROMPT = """
             Study Description: {study_description}
 
-            Provide a detailed analysis including:
-            1. Study purpose and objectives
-            2. Target participant characteristics
-            3. Participation requirements and time commitment
-            4. Potential benefits or compensation
-            5. Key selling points for recruitment
-            6. Any special considerations or requirements
-
-            Format your analysis in a clear, structured manner that can be used 
-            by an email copywriter to create compelling recruitment content.
-            """,
-            agent=research_analyst,
-            expected_output="A comprehensive analysis of the research study with all key recruitment factors identified"
-        )
-
-        create_email_task = Task(
-            description="""
+            Research study analysis:
+            {analysis}
+
             Using the research study analysis provided, create a compelling and 
             professional recruitment email that:
 
@@ -104,14 +61,9 @@ def compose_recruitment_email(study_description):
 
             The email should be well-structured with proper paragraphs and formatting.
             Focus on making it compelling while maintaining ethical recruitment practices.
-            """,
-            agent=email_copywriter,
-            context=[analyze_study_task],
-            expected_output="A complete, professional recruitment email ready for review"
-        )
-
-        review_email_task = Task(
-            description="""
+            """
+
+REVIEW_EMAIL_PROMPT = """
             Review the generated recruitment email and ensure it meets the highest 
             professional standards:
 
@@ -123,26 +75,61 @@ def compose_recruitment_email(study_description):
             6. Ensure the email follows best practices for participant recruitment
 
             Provide the final, polished email that is ready to send to potential participants.
-            """,
-            agent=email_editor,
-            context=[create_email_task],
-            expected_output="A final, polished recruitment email ready for sending"
-        )
-
-        crew = Crew(
-            agents=[research_analyst, email_copywriter, email_editor],
-            tasks=[analyze_study_task, create_email_task, review_email_task],
-            verbose=True,
-            process=Process.sequential
-        )
-
-        result = crew.kickoff()
-        print(f"Generated email content: {result[:100]}...")
-        return result
+            """
 
-    except Exception as e:
-        print(f"Error generating email content with CrewAI: {e}")
-        return f"""Subject: Invitation to Participate in Research Study
+FAST_COMPOSE_PROMPT = """
+            You are a research recruitment specialist. Write the recruitment email
+            for the research study below in a single pass.
+
+            Study Description: {study_description}
+
+            Research study analysis:
+            {analysis}
+
+            Write a professional, friendly recruitment email that opens with a
+            greeting, explains the study and why it matters, outlines what participation
+            involves, mentions any compensation, gives clear next steps with a strong
+            call-to-action, and closes professionally. Check it for grammar, clarity
+            and ethical recruitment practice before answering.
+
+            Respond with a JSON object with exactly these keys:
+            "subject": the email subject line,
+            "body": the email body without the subject line.
+            """
+
+# Hash of everything besides the study description that shapes a draft;
+# changing any prompt or agent setting invalidates previously cached drafts
+PIPELINE_FINGERPRINT = hashlib.sha256(json.dumps({
+    'model': MODEL_NAME,
+    'temperature': TEMPERATURE,
+    'agents': AGENT_CONFIGS,
+    'analysis': ANALYSIS_FINGERPRINT,
+    'prompts': [CREATE_EMAIL_PROMPT, REVIEW_EMAIL_PROMPT, FAST_COMPOSE_PROMPT],
+}, sort_keys=True).encode('utf-8')).hexdigest()
+
+def setup_crewai_agents():
+    load_dotenv()
+    api_key = os.getenv('GEMINI_API_KEY')
+    if not api_key:
+        raise ValueError("GEMINI_API_KEY not found in environment variables")
+    llm = ChatGoogleGenerativeAI(
+        model=MODEL_NAME,
+        google_api_key=api_key,
+        temperature=TEMPERATURE
+    )
+
+    email_copywriter = Agent(**AGENT_CONFIGS['email_copywriter'], verbose=True, allow_delegation=False, llm=llm)
+    email_editor = Agent(**AGENT_CONFIGS['email_editor'], verbose=True, allow_delegation=False, llm=llm)
+
+    return email_copywriter, email_editor
+
+def draft_cache_key(study_description, mode='full'):
+    """Content-addressed cache key for a study description under the current pipeline"""
+    return hashlib.sha256(f"{PIPELINE_FINGERPRINT}\n{mode}\n{study_description}".encode('utf-8')).hexdigest()
+
+def fallback_email(study_description):
+    """Template draft used when the LLM pipeline fails"""
+    return f"""Subject: Invitation to Participate in Research Study
 
 Dear Potential Participant,
 
@@ -162,3 +149,186 @@ Thank you for considering this opportunity.
 
 Best regards,
 Research Team"""
+
+def setup_gemini_model(system_instruction=None, **generation_config):
+    """Gemini model for the stages that call the API directly instead of through CrewAI"""
+    load_dotenv()
+    api_key = os.getenv('GEMINI_API_KEY')
+    if not api_key:
+        raise ValueError("GEMINI_API_KEY not found in environment variables")
+    genai.configure(api_key=api_key)
+    return genai.GenerativeModel(
+        MODEL_NAME,
+        system_instruction=system_instruction,
+        generation_config={"temperature": TEMPERATURE, **generation_config}
+    )
+
+def build_compose_tasks(study_description, analysis, agents):
+    """Create the write -> review tasks for the given agents"""
+    email_copywriter, email_editor = agents
+
+    create_email_task = Task(
+        description=CREATE_EMAIL_PROMPT.format(
+            study_description=study_description,
+            analysis=format_analysis(analysis)
+        ),
+        agent=email_copywriter,
+        expected_output="A complete, professional recruitment email ready for review"
+    )
+
+    review_email_task = Task(
+        description=REVIEW_EMAIL_PROMPT,
+        agent=email_editor,
+        context=[create_email_task],
+        expected_output="A final, polished recruitment email ready for sending"
+    )
+
+    return [create_email_task, review_email_task]
+
+@timed("compose_crew")
+def run_compose_crew(study_description):
+    """Run the copywriter -> editor crew on the shared study analysis
+
+    Returns the final draft and the total tokens used across both agents.
+    """
+    analysis = analyze_study(study_description)
+    agents = setup_crewai_agents()
+    crew = Crew(
+        agents=list(agents),
+        tasks=build_compose_tasks(study_description, analysis, agents),
+        verbose=True,
+        process=Process.sequential
+    )
+
+    result = crew.kickoff()
+    return str(result), result.token_usage.total_tokens
+
+@timed("compose_fast")
+def run_fast_compose(study_description):
+    """Draft the email from the shared study analysis in one structured Gemini call
+
+    Returns the draft in the same "Subject: ..." format as the crew, and the
+    total tokens used.
+    """
+    model = setup_gemini_model(response_mime_type="application/json")
+    response = model.generate_content(FAST_COMPOSE_PROMPT.format(
+        study_description=study_description,
+        analysis=format_analysis(analyze_study(study_description))
+    ))
+    data = json.loads(response.text)
+    draft = f"Subject: {data['subject'].strip()}\n\n{data['body'].strip()}"
+    return draft, response.usage_metadata.total_token_count
+
+def stream_compose_crew(study_description):
+    """Run the copywriter through the crew, then stream the editing stage
+
+    The editor's review is a direct streaming Gemini call using the editor
+    agent's persona and task prompt, so its tokens can be shown as they are
+    generated. Yields ("stage", name) and ("delta", text) events.
+    """
+    yield "stage", "drafting"
+    analysis = analyze_study(study_description)
+    agents = setup_crewai_agents()
+    create_email_task, _ = build_compose_tasks(study_description, analysis, agents)
+
+    crew = Crew(
+        agents=[agents[0]],
+        tasks=[create_email_task],
+        verbose=True,
+        process=Process.sequential
+    )
+    with timer("compose_copywriter"):
+        draft = str(crew.kickoff())
+
+    yield "stage", "editing"
+    editor = AGENT_CONFIGS['email_editor']
+    model = setup_gemini_model(
+        system_instruction=f"You are a {editor['role']}. {editor['backstory']} Your goal: {editor['goal']}."
+    )
+    prompt = (
+        f"{REVIEW_EMAIL_PROMPT}\n"
+        f"Email to review:\n{draft}\n\n"
+        "Respond with only the final email, starting with its 'Subject:' line."
+    )
+    for chunk in model.generate_content(prompt, stream=True):
+        if chunk.parts:
+            yield "delta", chunk.text
+
+COMPOSE_PIPELINES = {
+    'full': run_compose_crew,
+    'fast': run_fast_compose,
+}
+
+def compose_recruitment_email(study_description, mode='full', regenerate=False):
+    """Compose a recruitment email, reusing a cached draft unless regenerate is set
+
+    Args:
+        study_description: The researcher's study description
+        mode: One of COMPOSE_MODES
+        regenerate: Skip the draft cache and run the pipeline again
+    """
+    if not study_description:
+        raise ValueError("Study description cannot be None or empty")
+    if mode not in COMPOSE_PIPELINES:
+        raise ValueError(f"Unknown compose mode: {mode}")
+
+    cache_key = draft_cache_key(study_description, mode)
+    if not regenerate:
+        with timer("compose_cache"):
+            cached = get_cached_draft(cache_key)
+        count("compose_cache_lookups", outcome="miss" if cached is None else "hit")
+        if cached is not None:
+            return cached
+
+    try:
+        result, total_tokens = COMPOSE_PIPELINES[mode](study_description)
+        count("compose_tokens", total_tokens or 0, mode=mode)
+        print(f"Generated email content ({mode}, {total_tokens} tokens): {result[:100]}...")
+        store_cached_draft(cache_key, result)
+        return result
+
+    except Exception as e:
+        print(f"Error generating email content ({mode} mode): {e}")
+        return fallback_email(study_description)
+
+def stream_recruitment_email(study_description, mode='full', regenerate=False):
+    """Compose a recruitment email as a stream of events
+
+    Yields ("stage", name), ("delta", text), ("error", message) and finally
+    ("done", draft). A cached draft is returned as a single delta; a
+    completed draft is written to the draft cache.
+    """
+    if not study_description:
+        raise ValueError("Study description cannot be None or empty")
+    if mode not in COMPOSE_PIPELINES:
+        raise ValueError(f"Unknown compose mode: {mode}")
+
+    cache_key = draft_cache_key(study_description, mode)
+    if not regenerate:
+        cached = get_cached_draft(cache_key)
+        if cached is not None:
+            yield "delta", cached
+            yield "done", cached
+            return
+
+    try:
+        if mode == 'fast':
+            # A single call has no intermediate stages worth streaming
+            yield "stage", "drafting"
+            draft, _ = run_fast_compose(study_description)
+            yield "delta", draft
+        else:
+            chunks = []
+            for event, data in stream_compose_crew(study_description):
+                if event == "delta":
+                    chunks.append(data)
+                yield event, data
+            draft = "".join(chunks).strip()
+
+        store_cached_draft(cache_key, draft)
+        yield "done", draft
+
+    except Exception as e:
+        print(f"Error streaming email content ({mode} mode): {e}")
+        yield "error", str(e)
+        yield "done", fallback_email(study_description)
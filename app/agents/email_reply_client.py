@@ -1,50 +1,74 @@
 #!/usr/bin/env python3
 """
-Client for testing the Email Reply MCP Server
+Client for the Email Reply MCP Server over streamable HTTP
 """
 
 import asyncio
-import json
 import sys
 import os
-from typing import Dict, Any
+import secrets
+import threading
+from typing import Dict, Any, Optional
 from google.oauth2.credentials import Credentials
-from mcp import ClientSession, StdioServerParameters
-from mcp.client.stdio import stdio_client
+from mcp import ClientSession
+from mcp.client.streamable_http import streamablehttp_client
 
 # Add the parent directory to the path so we can import from app
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
 
+SERVER_URL = os.getenv("EMAIL_REPLY_SERVER_URL", "http://127.0.0.1:8051/mcp")
+
+# The server only answers requests carrying this secret. The supervisor hands
+# it to the server it starts, so by default each app process picks its own
+SERVER_SECRET_HEADER = "X-Email-Reply-Secret"
+SERVER_SECRET = os.getenv("EMAIL_REPLY_SERVER_SECRET") or secrets.token_urlsafe(32)
+
 class EmailReplyMCPClient:
     """Client for interacting with the Email Reply MCP server"""
     
-    def __init__(self, server_script_path: str = "app/agents/email_reply_server.py"):
-        self.server_script_path = server_script_path
+    def __init__(self, server_url: str = SERVER_URL, secret: str = SERVER_SECRET):
+        self.server_url = server_url
+        self.secret = secret
         self.session = None
-        self.stdio = None
-        self.write = None
+        self._closed = None
+        self._runner = None
     
     async def connect_to_server(self):
-        """Connect to the email reply MCP server"""
-        # Server configuration
-        server_params = StdioServerParameters(
-            command="python",
-            args=[self.server_script_path],
-        )
-        
-        # Connect to the server
-        stdio_transport = await stdio_client(server_params)
-        self.stdio, self.write = stdio_transport
-        self.session = await ClientSession(self.stdio, self.write)
-        
-        # Initialize the connection
-        await self.session.initialize()
-        
-        # List available tools
-        tools_result = await self.session.list_tools()
-        print("\nConnected to Email Reply MCP server with tools:")
-        for tool in tools_result.tools:
-            print(f"  - {tool.name}: {tool.description}")
+        """Open a long-lived streamable HTTP session to the email reply MCP server"""
+        ready = asyncio.get_running_loop().create_future()
+        self._closed = asyncio.Event()
+        # The transport's context managers must be entered and exited by the
+        # same task, so a dedicated task owns them for the session's lifetime
+        self._runner = asyncio.create_task(self._run_session(ready))
+        await ready
+    
+    async def _run_session(self, ready: asyncio.Future):
+        try:
+            headers = {SERVER_SECRET_HEADER: self.secret}
+            async with streamablehttp_client(self.server_url, headers=headers) as (read_stream, write_stream, _):
+                async with ClientSession(read_stream, write_stream) as session:
+                    await session.initialize()
+                    self.session = session
+                    ready.set_result(None)
+                    await self._closed.wait()
+        except Exception as e:
+            if not ready.done():
+                ready.set_exception(e)
+        finally:
+            self.session = None
+    
+    async def close(self):
+        """Close the session"""
+        if self._closed is not None:
+            self._closed.set()
+            await self._runner
+    
+    async def call_tool(self, name: str, arguments: Optional[Dict[str, Any]] = None) -> str:
+        """Call a tool on the server and return its text result"""
+        if self.session is None:
+            raise ConnectionError("Not connected to the email reply MCP server")
+        result = await self.session.call_tool(name, arguments=arguments or {})
+        return result.content[0].text
     
     async def initialize_gmail(self, credentials: Credentials) -> str:
         """Initialize Gmail service with credentials"""
@@ -54,41 +78,105 @@ class EmailReplyMCPClient:
             'token_uri': credentials.token_uri,
             'client_id': credentials.client_id,
             'client_secret': credentials.client_secret,
-            'scopes': credentials.scopes
+            'scopes': credentials.scopes,
+            'expiry': credentials.expiry.isoformat() if credentials.expiry else None
         }
         
-        result = await self.session.call_tool("initialize_gmail", arguments={"credentials_dict": creds_dict})
-        return result.content[0].text
+        return await self.call_tool("initialize_gmail", {"credentials_dict": creds_dict})
     
     async def start_listener(self) -> str:
         """Start the email listener"""
-        result = await self.session.call_tool("start_email_listener", arguments={})
-        return result.content[0].text
+        return await self.call_tool("start_email_listener")
     
     async def stop_listener(self) -> str:
         """Stop the email listener"""
-        result = await self.session.call_tool("stop_email_listener", arguments={})
-        return result.content[0].text
+        return await self.call_tool("stop_email_listener")
     
     async def check_emails(self) -> str:
         """Manually check for emails"""
-        result = await self.session.call_tool("check_incoming_emails", arguments={})
-        return result.content[0].text
+        return await self.call_tool("check_incoming_emails")
     
     async def get_stats(self) -> str:
         """Get email statistics"""
-        result = await self.session.call_tool("get_email_stats", arguments={})
-        return result.content[0].text
+        return await self.call_tool("get_email_stats")
     
     async def test_connection(self) -> str:
         """Test Gmail connection"""
-        result = await self.session.call_tool("test_gmail_connection", arguments={})
-        return result.content[0].text
+        return await self.call_tool("test_gmail_connection")
     
     async def reload_contexts(self) -> str:
         """Reload reply contexts"""
-        result = await self.session.call_tool("reload_reply_contexts", arguments={})
-        return result.content[0].text
+        return await self.call_tool("reload_reply_contexts")
+
+
+class EmailReplyMCPClientPool:
+    """Small pool of long-lived MCP client sessions for synchronous callers
+    
+    Sessions live on a private event loop thread and are reused across
+    calls, so a tool call from a Flask request costs one local HTTP round
+    trip instead of a new connection and handshake. A session that fails is
+    discarded and replaced on the next call.
+    """
+    
+    def __init__(self, server_url: str = SERVER_URL, secret: str = SERVER_SECRET, size: int = 2,
+                 call_timeout: float = 30):
+        self.server_url = server_url
+        self.secret = secret
+        self.size = size
+        self.call_timeout = call_timeout
+        self._loop = None
+        self._slots = None
+        self._lock = threading.Lock()
+    
+    def _ensure_loop(self):
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever, name="email-reply-client-pool", daemon=True).start()
+                asyncio.run_coroutine_threadsafe(self._create_slots(), self._loop).result()
+    
+    async def _create_slots(self):
+        # Each slot holds a connected client, or None until it is first used
+        self._slots = asyncio.Queue()
+        for _ in range(self.size):
+            self._slots.put_nowait(None)
+    
+    def call_tool(self, name: str, arguments: Optional[Dict[str, Any]] = None, timeout: Optional[float] = None) -> str:
+        """Call a tool on the email reply server from synchronous code"""
+        self._ensure_loop()
+        future = asyncio.run_coroutine_threadsafe(self._call_tool(name, arguments), self._loop)
+        return future.result(timeout or self.call_timeout)
+    
+    async def _call_tool(self, name: str, arguments: Optional[Dict[str, Any]]) -> str:
+        client = await self._slots.get()
+        try:
+            if client is None:
+                client = EmailReplyMCPClient(self.server_url, self.secret)
+                await client.connect_to_server()
+            return await client.call_tool(name, arguments)
+        except Exception:
+            if client is not None:
+                await client.close()
+            client = None
+            raise
+        finally:
+            self._slots.put_nowait(client)
+    
+    def close(self):
+        """Close all pooled sessions"""
+        if self._loop is None:
+            return
+        asyncio.run_coroutine_threadsafe(self._close_all(), self._loop).result(self.call_timeout)
+    
+    async def _close_all(self):
+        for _ in range(self.size):
+            client = await self._slots.get()
+            if client is not None:
+                await client.close()
+        await self._create_slots()
+
+
+email_reply_client_pool = EmailReplyMCPClientPool()
 
 
 async def main():
@@ -99,6 +187,12 @@ async def main():
         # Connect to the server
         await client.connect_to_server()
         
+        # List available tools
+        tools_result = await client.session.list_tools()
+        print("\nConnected to Email Reply MCP server with tools:")
+        for tool in tools_result.tools:
+            print(f"  - {tool.name}: {tool.description}")
+        
         # Test the connection
         print("\nTesting Gmail connection...")
         connection_result = await client.test_connection()
@@ -127,8 +221,7 @@ async def main():
     except Exception as e:
         print(f"Error: {e}")
     finally:
-        if client.session:
-            await client.session.close()
+        await client.close()
 
 
 if __name__ == "__main__":
@@ -1,54 +1,39 @@
-import google.generativeai as genai
 from exa_py import Exa
 from exa_py.websets.types import CreateWebsetParameters, CreateEnrichmentParameters
 from dotenv import load_dotenv
+from app.agents.study_analysis import analyze_study
+from app.executors import run_blocking
+from app.metrics import timed, timer
+from app.participants import Participant, ParticipantBatch
 import os
-import json
-import time
 import asyncio
-import weave
-weave.init("LinkLine")
 
 load_dotenv()
 
+# Seconds between webset status checks
+WEBSET_POLL_INTERVAL = 2
+
+# Enrichment formats Exa can add to a webset, with the description sent for each
+ENRICHMENT_DESCRIPTIONS = {
+    "email": "Email of the person",
+    "phone": "Phone number of the person",
+}
+
+# Enrichments requested with every search unless the study asks for others;
+# the rest are only requested when a researcher asks for them
+DEFAULT_SEARCH_ENRICHMENTS = [
+    name.strip() for name in os.getenv("SEARCH_ENRICHMENTS", "email").split(",") if name.strip()
+]
 
-def setup_gemini():
-    """Setup Gemini API"""
-    print("Setting up Gemini API")
-    load_dotenv()
-    api_key = os.getenv('GEMINI_API_KEY')
-    if not api_key:
-        raise ValueError("GEMINI_API_KEY not found in environment variables")
-    
-    genai.configure(api_key=api_key)
-    return genai.GenerativeModel('gemini-2.5-flash')
 
+@timed("search_query")
 def process_study_description(description):
-    """Use Gemini to extract a search query from a study description"""
+    """Get the participant search query from the shared structured study analysis"""
     if not description:
         raise ValueError("Study description cannot be None or empty")
-    
-    model = setup_gemini()
-
-    prompt = f"""
-    You are an AI assistant that helps researchers find participants for their studies. 
-    Given the following research study description, generate a concise search query 
-    that can be used to find relevant participants.
-
-    Focus only on returning a single-line search query based on:
-    - Professional roles or job titles
-    - Industry or domain
-    - Skills or expertise
-    - Demographics (e.g. location, education level, etc.)
-
-    Study Description: {description}
-
-    Only return the search query. Do not include explanations or any other text.
-    """
 
     try:
-        response = model.generate_content(prompt)
-        search_query = response.text.strip()
+        search_query = analyze_study(description)["query_variants"][0].strip()
         print(f"Search Query: {search_query}")
         return search_query
     
@@ -57,49 +42,24 @@ def process_study_description(description):
         return "biology college students in San Francisco"
 
 
-def search_participants(study_description):
-    """Search for potential participants using Exa Websets API (synchronous)"""
-    load_dotenv()
-    print(os.getenv('EXA_API_KEY'))
-    
-    # Check if API key is available
-    api_key = os.getenv('EXA_API_KEY')
-    print(api_key)
-    if not api_key:
-        raise ValueError("EXA_API_KEY not found in environment variables")
-    
-    exa = Exa(api_key)
-    
-    # Process the study description using Gemini
-    search_query = process_study_description(study_description)
-    
-    print(f"Searching with query: {search_query}")
+def enrichment_params(enrichment):
+    return CreateEnrichmentParameters(description=ENRICHMENT_DESCRIPTIONS[enrichment], format=enrichment)
+
 
-    webset = exa.websets.create(
-        params=CreateWebsetParameters(
-            search={
-                "query": search_query,
-                "count": 2
-            },
-            enrichments=[
-                CreateEnrichmentParameters(
-                    description="Email of the person",
-                    format="email",
-                ),
-                CreateEnrichmentParameters(
-                    description="Phone of number of the person",
-                    format="phone",
-                ),
-            ],
-        )
+def build_webset_params(search_query, enrichments=None):
+    """Webset parameters for a participant search query"""
+    return CreateWebsetParameters(
+        search={
+            "query": search_query,
+            "count": 2
+        },
+        enrichments=[enrichment_params(name) for name in (enrichments or DEFAULT_SEARCH_ENRICHMENTS)],
     )
 
-    # Wait for processing to complete
-    webset = exa.websets.wait_until_idle(webset.id)
 
-    # Retrieve and parse items
-    items = exa.websets.items.list(webset_id=webset.id)
-    output = []
+def parse_webset_items(items):
+    """Turn a page of webset items into the participant results shape"""
+    output = ParticipantBatch()
 
     for item in items.data:
         # Safely access person object
@@ -127,12 +87,7 @@ def search_participants(study_description):
                 elif isinstance(enrichment.result, str):
                     phone = enrichment.result
 
-        output.append({
-            "name": name,
-            "email": email or "Not found",
-            "phone": phone or "Not found",
-            "linkedin": url or "Not found"
-        })
+        output.append(Participant(name=name, email=email, phone=phone, linkedin=url, item_id=item.id))
 
     return {
         "participants": output,
@@ -140,5 +95,86 @@ def search_participants(study_description):
     }
 
 
+def _exa_client():
+    load_dotenv()
+    api_key = os.getenv('EXA_API_KEY')
+    if not api_key:
+        raise ValueError("EXA_API_KEY not found in environment variables")
+    return Exa(api_key)
+
+
+async def _wait_for_webset_async(exa, webset_id, poll_interval):
+    """Poll a webset until it is idle; cancelling the task cancels the webset"""
+    try:
+        with timer("exa_wait_idle"):
+            while True:
+                with timer("exa_get"):
+                    current = await run_blocking('exa', exa.websets.get, webset_id)
+                if getattr(current.status, "value", current.status) == "idle":
+                    return
+                await asyncio.sleep(poll_interval)
+    except asyncio.CancelledError:
+        with timer("exa_cancel"):
+            await run_blocking('exa', exa.websets.cancel, webset_id)
+        raise
+
+
+async def search_participants_async(study_description, poll_interval=WEBSET_POLL_INTERVAL, enrichments=None):
+    """Search for potential participants without holding a thread while the webset runs
+
+    SDK calls are offloaded to the bounded LLM and Exa executors and the wait
+    between status polls is an asyncio sleep. Cancelling the task cancels the
+    webset on Exa's side too. The results carry the webset id, so more
+    enrichments can be added later with enrich_webset_async.
+    """
+    exa = _exa_client()
+    
+    search_query = await run_blocking('llm', process_study_description, study_description)
+    print(f"Searching with query: {search_query}")
+    
+    with timer("exa_create"):
+        webset = await run_blocking('exa', exa.websets.create, params=build_webset_params(search_query, enrichments))
+    await _wait_for_webset_async(exa, webset.id, poll_interval)
+    
+    with timer("exa_list_items"):
+        items = await run_blocking('exa', exa.websets.items.list, webset_id=webset.id)
+    return {**parse_webset_items(items), "webset_id": webset.id}
+
 
+async def _wait_for_enrichment_async(exa, webset_id, enrichment_id, poll_interval):
+    """Poll an enrichment until Exa reports it completed
 
+    The webset itself can still read idle just after an enrichment is
+    created, so its status says nothing about whether the enrichment ran.
+    """
+    with timer("exa_wait_enrichment"):
+        while True:
+            with timer("exa_get_enrichment"):
+                enrichment = await run_blocking('exa', exa.websets.enrichments.get, webset_id, enrichment_id)
+            status = getattr(enrichment.status, "value", enrichment.status)
+            if status == "completed":
+                return
+            if status == "canceled":
+                raise RuntimeError(f"Enrichment {enrichment_id} of webset {webset_id} was cancelled")
+            await asyncio.sleep(poll_interval)
+
+
+async def enrich_webset_async(webset_id, enrichments, poll_interval=WEBSET_POLL_INTERVAL):
+    """Add enrichments to an existing webset and return its re-parsed items
+
+    Exa runs an enrichment over every item of the webset, so one call
+    covers all of a study's participants.
+    """
+    exa = _exa_client()
+    created = []
+    for enrichment in enrichments:
+        with timer("exa_enrich"):
+            created.append(await run_blocking(
+                'exa', exa.websets.enrichments.create, webset_id, params=enrichment_params(enrichment)
+            ))
+    for enrichment in created:
+        await _wait_for_enrichment_async(exa, webset_id, enrichment.id, poll_interval)
+    
+    with timer("exa_list_items"):
+        items = await run_blocking('exa', exa.websets.items.list, webset_id=webset_id)
+    return parse_webset_items(items)
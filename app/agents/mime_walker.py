@@ -0,0 +1,131 @@
+import base64
+import binascii
+from html.parser import HTMLParser
+from typing import Any, Dict, List, Optional
+
+DEFAULT_MAX_BODY_BYTES = 64 * 1024
+
+
+class _TextExtractor(HTMLParser):
+    """Collects the visible text of an HTML document"""
+
+    SKIP_TAGS = {"script", "style", "head", "title"}
+    BREAK_TAGS = {"br", "p", "div", "li", "tr", "h1", "h2", "h3", "h4", "h5", "h6"}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.chunks: List[str] = []
+        self._skip_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIP_TAGS:
+            self._skip_depth += 1
+        elif tag in self.BREAK_TAGS:
+            self.chunks.append("\n")
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIP_TAGS and self._skip_depth:
+            self._skip_depth -= 1
+
+    def handle_data(self, data):
+        if not self._skip_depth:
+            self.chunks.append(data)
+
+
+def strip_html(html: str) -> str:
+    """Convert an HTML body to plain text"""
+    parser = _TextExtractor()
+    parser.feed(html)
+    parser.close()
+    lines = (" ".join(line.split()) for line in "".join(parser.chunks).splitlines())
+    return "\n".join(line for line in lines if line)
+
+
+def _header(part: Dict[str, Any], name: str) -> str:
+    name = name.lower()
+    for header in part.get("headers", []):
+        if header["name"].lower() == name:
+            return header["value"]
+    return ""
+
+
+def _charset(part: Dict[str, Any]) -> str:
+    for param in _header(part, "Content-Type").split(";")[1:]:
+        key, _, value = param.strip().partition("=")
+        if key.lower() == "charset" and value:
+            return value.strip('"\'')
+    return "utf-8"
+
+
+def _is_attachment(part: Dict[str, Any]) -> bool:
+    if part.get("filename"):
+        return True
+    if "attachmentId" in part.get("body", {}):
+        return True
+    return _header(part, "Content-Disposition").lower().startswith("attachment")
+
+
+def decode_part(part: Dict[str, Any], max_bytes: int = DEFAULT_MAX_BODY_BYTES) -> str:
+    """Decode at most ``max_bytes`` of a part's base64url body
+
+    Only the prefix of the encoded data needed for ``max_bytes`` is decoded,
+    so huge bodies cost no more than the cap.
+    """
+    data = part.get("body", {}).get("data")
+    if not data:
+        return ""
+
+    encoded = data[:-(-max_bytes // 3) * 4]
+    encoded += "=" * (-len(encoded) % 4)
+    try:
+        raw = base64.urlsafe_b64decode(encoded)[:max_bytes]
+    except (binascii.Error, ValueError):
+        return ""
+
+    try:
+        return raw.decode(_charset(part), errors="ignore")
+    except LookupError:
+        return raw.decode("utf-8", errors="ignore")
+
+
+def find_text_parts(payload: Dict[str, Any]) -> tuple:
+    """Walk a Gmail message payload and return its first (text/plain, text/html) parts
+
+    The walk is depth-first in document order and stops at the first plain
+    text part. Attachments are never descended into or decoded.
+    """
+    plain: Optional[Dict[str, Any]] = None
+    html: Optional[Dict[str, Any]] = None
+
+    stack = [payload]
+    while stack:
+        part = stack.pop()
+        if _is_attachment(part):
+            continue
+
+        mime_type = part.get("mimeType", "").lower()
+        if mime_type.startswith("multipart/") or "parts" in part:
+            stack.extend(reversed(part.get("parts", [])))
+        elif mime_type == "text/plain":
+            plain = part
+            break
+        elif mime_type == "text/html" and html is None:
+            html = part
+
+    return plain, html
+
+
+def extract_body(payload: Dict[str, Any], max_bytes: int = DEFAULT_MAX_BODY_BYTES) -> str:
+    """Return the best plain-text body of a Gmail message payload
+
+    Prefers a text/plain part anywhere in the MIME tree and falls back to
+    the stripped text of the first text/html part.
+    """
+    plain, html = find_text_parts(payload)
+    if plain is not None:
+        return decode_part(plain, max_bytes)
+    if html is not None:
+        return strip_html(decode_part(html, max_bytes))
+    if "parts" not in payload and not _is_attachment(payload):
+        return decode_part(payload, max_bytes)
+    return ""
@@ -0,0 +1,111 @@
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Optional
+
+RATE_LIMIT_REASONS = {"rateLimitExceeded", "userRateLimitExceeded", "quotaExceeded"}
+
+
+def retry_after_seconds(error) -> Optional[float]:
+    """Read the Retry-After header of a googleapiclient HttpError, if any"""
+    resp = getattr(error, "resp", None)
+    value = resp.get("retry-after") if resp is not None else None
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+
+def is_rate_limit_error(error) -> bool:
+    """True if an HttpError means the Gmail quota or rate limit was hit"""
+    resp = getattr(error, "resp", None)
+    status = getattr(resp, "status", None)
+    if status == 429:
+        return True
+    if status == 403:
+        details = getattr(error, "error_details", None) or []
+        return any(isinstance(d, dict) and d.get("reason") in RATE_LIMIT_REASONS for d in details)
+    return False
+
+
+class AdaptivePollScheduler:
+    """Decides how long the reply listener waits before the next inbox poll
+
+    The interval drops to ``min_check_interval_seconds`` while mail is
+    arriving or for ``campaign_boost_minutes`` after a campaign is sent, and
+    otherwise grows by ``backoff_factor`` per empty poll from
+    ``check_interval_minutes`` up to ``max_check_interval_minutes``. Quota
+    errors pause polling for their Retry-After. Settings are read on every
+    decision, so reloading the reply contexts takes effect immediately.
+    """
+
+    def __init__(self, settings_provider: Callable[[], Dict[str, Any]]):
+        self._settings = settings_provider
+        self._idle_polls = 0
+        self._rate_limited_polls = 0
+        self._retry_after: Optional[float] = None
+        self._boost_until = 0.0
+        self._pending_due_in: Optional[float] = None
+        self._wake = threading.Event()
+        self.last_delay: Optional[float] = None
+
+    def _setting(self, name: str, default: float) -> float:
+        return float(self._settings().get(name, default))
+
+    def record_poll(self, new_messages: int):
+        """Record the outcome of a successful poll"""
+        self._rate_limited_polls = 0
+        self._idle_polls = 0 if new_messages else self._idle_polls + 1
+
+    def record_rate_limit(self, retry_after: Optional[float] = None):
+        """Record a quota error; without Retry-After, back off exponentially from one minute"""
+        self._rate_limited_polls += 1
+        if retry_after is None:
+            retry_after = 60 * 2 ** (self._rate_limited_polls - 1)
+        self._retry_after = retry_after
+
+    def record_pending(self, due_in: Optional[float]):
+        """Poll again within due_in seconds to flush held replies; None when nothing is held"""
+        self._pending_due_in = due_in
+
+    def notify_campaign_sent(self):
+        """Poll at the minimum interval for a while, starting now"""
+        self._boost_until = time.monotonic() + self._setting("campaign_boost_minutes", 60) * 60
+        self._idle_polls = 0
+        self._wake.set()
+
+    def wake(self):
+        """Cut the current wait short"""
+        self._wake.set()
+
+    def next_delay(self) -> float:
+        """Seconds to wait before the next poll"""
+        min_interval = self._setting("min_check_interval_seconds", 30)
+        max_interval = self._setting("max_check_interval_minutes", 30) * 60
+
+        if self._retry_after is not None:
+            delay = max(self._retry_after, min_interval)
+            self._retry_after = None
+            return delay
+        if self._idle_polls == 0 or time.monotonic() < self._boost_until:
+            return min_interval
+
+        base = self._setting("check_interval_minutes", 5) * 60
+        factor = self._setting("backoff_factor", 2)
+        delay = max(min_interval, min(max_interval, base * factor ** (self._idle_polls - 1)))
+        if self._pending_due_in is not None:
+            delay = max(min_interval, min(delay, self._pending_due_in))
+        return delay
+
+    def wait(self):
+        """Sleep until the next poll is due or the scheduler is woken"""
+        self.last_delay = self.next_delay()
+        self._wake.wait(self.last_delay)
+        self._wake.clear()
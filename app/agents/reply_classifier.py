@@ -0,0 +1,149 @@
+import re
+import zlib
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+DEFAULT_N_FEATURES = 2 ** 14
+DEFAULT_CONFIDENCE_THRESHOLD = 0.5
+
+# Class label for emails that should get default_response rather than a context
+DEFAULT_LABEL = -1
+
+_TOKEN_RE = re.compile(r"[a-z0-9$']+")
+
+
+class HashedNgramVectorizer:
+    """Word unigram and bigram counts hashed into a fixed number of TF-IDF features
+
+    A batch is returned in a flat sparse layout: the feature indices and
+    values of every email concatenated, plus the offset where each email
+    starts. Each email has at least one entry, so np.add.reduceat over the
+    offsets sums exactly one email per row.
+    """
+
+    def __init__(self, n_features: int = DEFAULT_N_FEATURES):
+        self.n_features = n_features
+        self.idf = np.ones(n_features, dtype=np.float32)
+
+    def _hash_ngrams(self, text: str) -> List[int]:
+        words = _TOKEN_RE.findall(text.lower())
+        ngrams = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+        # crc32 rather than hash() so features don't change between processes
+        return [zlib.crc32(ngram.encode("utf-8")) % self.n_features for ngram in ngrams]
+
+    def _counts(self, texts: List[str]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        indices, counts, offsets = [], [], []
+        position = 0
+        for text in texts:
+            features, feature_counts = np.unique(np.array(self._hash_ngrams(text), dtype=np.int64), return_counts=True)
+            if not len(features):
+                features, feature_counts = np.zeros(1, dtype=np.int64), np.zeros(1, dtype=np.int64)
+            indices.append(features)
+            counts.append(feature_counts)
+            offsets.append(position)
+            position += len(features)
+        return np.concatenate(indices), np.concatenate(counts), np.array(offsets, dtype=np.int64)
+
+    def fit(self, texts: List[str]):
+        indices, _, _ = self._counts(texts)
+        document_frequency = np.bincount(indices, minlength=self.n_features)
+        self.idf = (np.log((1 + len(texts)) / (1 + document_frequency)) + 1).astype(np.float32)
+        return self
+
+    def transform(self, texts: List[str]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Return (indices, values, offsets) of sublinear TF-IDF rows with unit L2 norm"""
+        indices, counts, offsets = self._counts(texts)
+        values = np.where(counts > 0, 1 + np.log(np.maximum(counts, 1)), 0).astype(np.float32) * self.idf[indices]
+        lengths = np.diff(np.append(offsets, len(indices)))
+        norms = np.sqrt(np.add.reduceat(values * values, offsets))
+        values /= np.repeat(np.maximum(norms, 1e-12), lengths)
+        return indices, values, offsets
+
+
+class ReplyClassifier:
+    """Softmax regression over hashed n-grams, picking a reply context per email
+
+    Trained from the training_examples listed on each email context (and on
+    default_response, for mail that should get the default reply). A whole
+    poll batch is scored with one gather and one segmented sum over the
+    weight matrix.
+    """
+
+    def __init__(self, vectorizer: HashedNgramVectorizer, labels: np.ndarray,
+                 weights: np.ndarray, bias: np.ndarray):
+        self.vectorizer = vectorizer
+        self.labels = labels
+        self.weights = weights
+        self.bias = bias
+
+    @classmethod
+    def train(cls, texts: List[str], labels: List[int], n_features: int = DEFAULT_N_FEATURES,
+              iterations: int = 500, learning_rate: float = 10.0, l2: float = 1e-3) -> "ReplyClassifier":
+        vectorizer = HashedNgramVectorizer(n_features).fit(texts)
+        indices, values, offsets = vectorizer.transform(texts)
+
+        # Train densely on just the features the examples use, then scatter
+        # the weights back; features never seen keep a zero weight
+        used, columns = np.unique(indices, return_inverse=True)
+        rows = np.repeat(np.arange(len(texts)), np.diff(np.append(offsets, len(indices))))
+        features = np.zeros((len(texts), len(used)), dtype=np.float32)
+        np.add.at(features, (rows, columns), values)
+
+        classes, targets = np.unique(np.array(labels), return_inverse=True)
+        one_hot = np.eye(len(classes), dtype=np.float32)[targets]
+        used_weights = np.zeros((len(used), len(classes)), dtype=np.float32)
+        bias = np.zeros(len(classes), dtype=np.float32)
+        for _ in range(iterations):
+            error = (_softmax(features @ used_weights + bias) - one_hot) / len(texts)
+            used_weights -= learning_rate * (features.T @ error + l2 * used_weights)
+            bias -= learning_rate * error.sum(axis=0)
+
+        weights = np.zeros((n_features, len(classes)), dtype=np.float32)
+        weights[used] = used_weights
+        return cls(vectorizer, classes, weights, bias)
+
+    def predict(self, texts: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """Return the predicted label and its probability for each text"""
+        if not texts:
+            return np.empty(0, dtype=self.labels.dtype), np.empty(0, dtype=np.float32)
+        indices, values, offsets = self.vectorizer.transform(texts)
+        logits = np.add.reduceat(self.weights[indices] * values[:, None], offsets, axis=0) + self.bias
+        probabilities = _softmax(logits)
+        best = probabilities.argmax(axis=1)
+        return self.labels[best], probabilities[np.arange(len(texts)), best]
+
+
+def _softmax(logits: np.ndarray) -> np.ndarray:
+    exp = np.exp(logits - logits.max(axis=1, keepdims=True))
+    return exp / exp.sum(axis=1, keepdims=True)
+
+
+def email_text(body: str, subject: str) -> str:
+    return f"{subject}\n{body}"
+
+
+def build_classifier(reply_contexts: Dict[str, Any]) -> Optional[ReplyClassifier]:
+    """Train a classifier from the examples in data.json
+
+    Labels are indexes into email_contexts, or DEFAULT_LABEL. Returns None
+    when the classifier is disabled or fewer than two labels have examples.
+    """
+    settings = reply_contexts.get("auto_reply_settings", {})
+    if not settings.get("classifier_enabled", True):
+        return None
+
+    texts, labels = [], []
+    for index, context in enumerate(reply_contexts.get("email_contexts", [])):
+        examples = context.get("training_examples", [])
+        texts.extend(examples)
+        labels.extend([index] * len(examples))
+    examples = reply_contexts.get("default_response", {}).get("training_examples", [])
+    texts.extend(examples)
+    labels.extend([DEFAULT_LABEL] * len(examples))
+
+    if len(set(labels)) < 2:
+        return None
+    return ReplyClassifier.train(
+        texts, labels, n_features=settings.get("classifier_features", DEFAULT_N_FEATURES)
+    )
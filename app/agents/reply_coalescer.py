@@ -0,0 +1,106 @@
+import bisect
+import threading
+from email.utils import parseaddr
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+
+def normalize_sender(sender: str) -> str:
+    """Reduce a From header to its lowercased address without a +tag"""
+    address = parseaddr(sender)[1].lower() or sender.strip().lower()
+    local, at, domain = address.partition("@")
+    return f"{local.split('+', 1)[0]}{at}{domain}"
+
+
+class ReplyGroup:
+    """New messages from one sender on one thread, answered with a single reply"""
+
+    __slots__ = ("sender", "thread_id", "message_ids", "bodies", "sent_at", "subject", "message_id_header",
+                 "references")
+
+    def __init__(self, sender: str, thread_id: str):
+        self.sender = sender
+        self.thread_id = thread_id
+        self.message_ids: List[str] = []
+        self.bodies: List[str] = []
+        self.sent_at: List[int] = []
+        self.subject = ""
+        self.message_id_header: Optional[str] = None
+        self.references: Optional[str] = None
+
+    def add(self, message_id: str, body: str, subject: str, message_id_header: Optional[str],
+            references: Optional[str], sent_at: int = 0):
+        # Gmail lists newest first, so keep the messages in the order they were sent
+        index = bisect.bisect_right(self.sent_at, sent_at)
+        self.sent_at.insert(index, sent_at)
+        self.message_ids.insert(index, message_id)
+        self.bodies.insert(index, body)
+        # The reply answers the latest message, so its headers win
+        if index == len(self.sent_at) - 1:
+            self.subject = subject or self.subject
+            self.message_id_header = message_id_header
+            self.references = references
+
+    @property
+    def body(self) -> str:
+        return "\n\n".join(self.bodies)
+
+
+class ReplyCoalescer:
+    """Holds new messages in time buckets so each sender gets one reply per window
+
+    A message joins the pending group for its (normalized sender, thread),
+    or opens a group in the bucket for the current window. Buckets are
+    flushed by the first poll after their window closes. A window of 0
+    flushes every group on the poll that collected it.
+    """
+
+    def __init__(self, window_provider: Callable[[], float]):
+        self._window = window_provider
+        self._lock = threading.Lock()
+        # Buckets are keyed by the time their window closes
+        self._buckets: Dict[float, Dict[Tuple[str, str], ReplyGroup]] = {}
+        self._group_bucket: Dict[Tuple[str, str], float] = {}
+        self._pending_ids = set()
+
+    def is_pending(self, message_id: str) -> bool:
+        return message_id in self._pending_ids
+
+    def add(self, message_id: str, thread_id: str, sender: str, subject: str, body: str, now: float,
+            message_id_header: Optional[str] = None, references: Optional[str] = None, sent_at: int = 0):
+        """Hold a message; sent_at is its Gmail internalDate, which orders the group"""
+        key = (normalize_sender(sender), thread_id)
+        with self._lock:
+            bucket = self._group_bucket.get(key)
+            if bucket is None:
+                window = self._window()
+                bucket = (now // window + 1) * window if window > 0 else now
+                self._group_bucket[key] = bucket
+                self._buckets.setdefault(bucket, {})[key] = ReplyGroup(sender, thread_id)
+            self._buckets[bucket][key].add(message_id, body, subject, message_id_header, references, sent_at)
+            self._pending_ids.add(message_id)
+
+    def pop_due(self, now: float) -> List[ReplyGroup]:
+        """Remove and return the groups whose window has closed"""
+        with self._lock:
+            due = [bucket for bucket in self._buckets if bucket <= now]
+            groups = []
+            for bucket in sorted(due):
+                for key, group in self._buckets.pop(bucket).items():
+                    del self._group_bucket[key]
+                    self._pending_ids.difference_update(group.message_ids)
+                    groups.append(group)
+            return groups
+
+    def next_due_in(self, now: float) -> Optional[float]:
+        """Seconds until the oldest pending bucket closes, or None when nothing is held"""
+        with self._lock:
+            if not self._buckets:
+                return None
+            return max(0.0, min(self._buckets) - now)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "pending_reply_groups": len(self._group_bucket),
+                "pending_messages": len(self._pending_ids),
+            }
@@ -0,0 +1,437 @@
+import base64
+import json
+import sys
+import threading
+import time
+from email.mime.text import MIMEText
+from email.mime.multipart import MIMEMultipart
+from typing import Any, Dict, List, Optional
+from googleapiclient.errors import HttpError
+from mcp.server.fastmcp import FastMCP
+
+# Imported as app.agents.reply_processor by the app, and as a top-level
+# module by email_reply_server.py, which avoids importing the app package
+try:
+    from .mime_walker import DEFAULT_MAX_BODY_BYTES, extract_body
+    from .poll_scheduler import AdaptivePollScheduler, is_rate_limit_error, retry_after_seconds
+    from .reply_store import ReplyThreadStore
+    from .reply_coalescer import ReplyCoalescer
+    from .reply_classifier import DEFAULT_CONFIDENCE_THRESHOLD, DEFAULT_LABEL, build_classifier, email_text
+    from .server_profiler import ServerProfiler, profiled_poll, register_profiling_tools
+except ImportError:
+    from mime_walker import DEFAULT_MAX_BODY_BYTES, extract_body
+    from poll_scheduler import AdaptivePollScheduler, is_rate_limit_error, retry_after_seconds
+    from reply_store import ReplyThreadStore
+    from reply_coalescer import ReplyCoalescer
+    from reply_classifier import DEFAULT_CONFIDENCE_THRESHOLD, DEFAULT_LABEL, build_classifier, email_text
+    from server_profiler import ServerProfiler, profiled_poll, register_profiling_tools
+
+
+class AutoReplyProcessor:
+    """Polls Gmail and sends the auto-replies; shared by both email reply MCP servers
+
+    Subclasses set gmail_service and may register more tools in _register_tools.
+    """
+
+    not_initialized_message = "Gmail service not initialized"
+
+    def __init__(self, data_file: str, host: str, port: int):
+        """Load the reply contexts and create the MCP server
+
+        Args:
+            data_file: Path to the data.json file with reply contexts
+            host: Interface the MCP server's HTTP transport binds to
+            port: Port the MCP server's HTTP transport listens on
+        """
+        self.data_file = data_file
+        self.reply_contexts = self._load_reply_contexts()
+        self.classifier = build_classifier(self.reply_contexts)
+        self.processed_emails = set()  # Track processed emails to avoid duplicates
+        self.send_attempts: Dict[str, int] = {}  # Failed auto-reply sends per message id
+        self.reply_threads = ReplyThreadStore()  # Auto-replies sent per thread
+        self.is_listening = False
+        self.listen_thread = None
+        self.poll_scheduler = AdaptivePollScheduler(
+            lambda: self.reply_contexts.get("auto_reply_settings", {})
+        )
+        self.reply_coalescer = ReplyCoalescer(
+            lambda: float(self.reply_contexts.get("auto_reply_settings", {}).get("coalesce_window_seconds", 0))
+        )
+        self.gmail_service = None
+        self.profiler = ServerProfiler()  # On-demand profiling and poll stage timings
+
+        # Create MCP server
+        self.mcp = FastMCP(
+            name="EmailReplyServer",
+            host=host,
+            port=port,
+            stateless_http=True,
+        )
+
+        # Register MCP tools
+        self._register_tools()
+        register_profiling_tools(self.mcp, self.profiler)
+
+    def _load_reply_contexts(self) -> Dict[str, Any]:
+        """Load reply contexts from data.json file"""
+        try:
+            with open(self.data_file, 'r') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            # stdout carries the MCP protocol on stdio, so warn on stderr
+            print(f"Warning: {self.data_file} not found. Using default contexts.", file=sys.stderr)
+            return {
+                "email_contexts": [],
+                "default_response": {
+                    "subject": "Thank You for Your Message",
+                    "template": "Thank you for contacting us. We have received your message and will respond within 24-48 hours."
+                },
+                "auto_reply_settings": {
+                    "enabled": True,
+                    "check_interval_minutes": 5,
+                    "min_check_interval_seconds": 30,
+                    "max_check_interval_minutes": 30,
+                    "backoff_factor": 2,
+                    "campaign_boost_minutes": 60,
+                    "max_replies_per_email": 1,
+                    "max_body_bytes": DEFAULT_MAX_BODY_BYTES,
+                    "exclude_senders": ["noreply@", "no-reply@", "donotreply@"]
+                }
+            }
+
+    def _register_tools(self):
+        """Register MCP tools for email operations"""
+
+        @self.mcp.tool()
+        def start_email_listener() -> str:
+            """Start listening for incoming emails and auto-reply"""
+            if not self.gmail_service:
+                return self.not_initialized_message
+
+            if self.is_listening:
+                return "Email listener is already running"
+
+            self.is_listening = True
+            self.listen_thread = threading.Thread(target=self._listen_for_emails, daemon=True)
+            self.listen_thread.start()
+            return "Email listener started successfully"
+
+        @self.mcp.tool()
+        def stop_email_listener() -> str:
+            """Stop listening for incoming emails"""
+            if not self.is_listening:
+                return "Email listener is not running"
+
+            self.is_listening = False
+            self.poll_scheduler.wake()
+            if self.listen_thread:
+                self.listen_thread.join(timeout=5)
+            return "Email listener stopped successfully"
+
+        @self.mcp.tool()
+        def check_incoming_emails() -> str:
+            """Manually check for incoming emails and send auto-replies"""
+            if not self.gmail_service:
+                return self.not_initialized_message
+
+            try:
+                emails_processed = self._process_incoming_emails()
+                return f"Processed {emails_processed} new emails"
+            except Exception as e:
+                return f"Error processing emails: {str(e)}"
+
+        @self.mcp.tool()
+        def notify_campaign_sent() -> str:
+            """Poll for replies at the fastest interval now that a campaign went out"""
+            self.poll_scheduler.notify_campaign_sent()
+            return "Polling interval tightened for incoming replies"
+
+        @self.mcp.tool()
+        def get_email_stats() -> str:
+            """Get statistics about processed emails"""
+            stats = {
+                "processed_emails_count": len(self.processed_emails),
+                "replied_threads_count": len(self.reply_threads),
+                "is_listening": self.is_listening,
+                "poll_interval_seconds": self.poll_scheduler.last_delay,
+                **self.reply_coalescer.stats(),
+                "reply_contexts_count": len(self.reply_contexts.get("email_contexts", [])),
+                "auto_reply_enabled": self.reply_contexts.get("auto_reply_settings", {}).get("enabled", False),
+                "classifier_trained": self.classifier is not None,
+                "gmail_initialized": self.gmail_service is not None
+            }
+            return json.dumps(stats, indent=2)
+
+        @self.mcp.tool()
+        def reload_reply_contexts() -> str:
+            """Reload reply contexts from data.json file"""
+            try:
+                reply_contexts = self._load_reply_contexts()
+                self.classifier = build_classifier(reply_contexts)
+                self.reply_contexts = reply_contexts
+                return "Reply contexts reloaded successfully"
+            except Exception as e:
+                return f"Error reloading contexts: {str(e)}"
+
+    def _should_exclude_sender(self, sender: str) -> bool:
+        """Check if sender should be excluded from auto-replies"""
+        exclude_patterns = self.reply_contexts.get("auto_reply_settings", {}).get("exclude_senders", [])
+        sender_lower = sender.lower()
+        return any(pattern in sender_lower for pattern in exclude_patterns)
+
+    def _find_matching_context(self, email_content: str, subject: str) -> Optional[Dict[str, Any]]:
+        """Find matching reply context based on email content and subject"""
+        content_lower = (email_content + " " + subject).lower()
+
+        for context in self.reply_contexts.get("email_contexts", []):
+            keywords = context.get("trigger_keywords", [])
+            if any(keyword.lower() in content_lower for keyword in keywords):
+                return context
+
+        return None
+
+    def _match_contexts(self, emails: List[tuple]) -> List[Optional[Dict[str, Any]]]:
+        """Pick the reply context for each (body, subject) pair; None means the default response
+
+        The classifier scores the whole batch at once. Emails it is not
+        confident about fall back to keyword matching.
+        """
+        if not emails:
+            return []
+        if self.classifier is None:
+            return [self._find_matching_context(body, subject) for body, subject in emails]
+
+        threshold = self.reply_contexts.get("auto_reply_settings", {}).get(
+            "classifier_confidence_threshold", DEFAULT_CONFIDENCE_THRESHOLD
+        )
+        contexts = self.reply_contexts.get("email_contexts", [])
+        labels, confidences = self.classifier.predict([email_text(body, subject) for body, subject in emails])
+        matched = []
+        for (body, subject), label, confidence in zip(emails, labels, confidences):
+            if confidence < threshold:
+                matched.append(self._find_matching_context(body, subject))
+            else:
+                matched.append(None if label == DEFAULT_LABEL else contexts[label])
+        return matched
+
+    def _generate_reply(self, sender: str, context: Optional[Dict[str, Any]]) -> Optional[Dict[str, str]]:
+        """Generate auto-reply from the matched context"""
+        # Check if sender should be excluded
+        if self._should_exclude_sender(sender):
+            return None
+
+        if context:
+            return {
+                "subject": context["subject"],
+                "body": context["response_template"]
+            }
+        else:
+            # Use default response
+            default = self.reply_contexts.get("default_response", {})
+            return {
+                "subject": default.get("subject", "Thank You for Your Message"),
+                "body": default.get("template", "Thank you for contacting us. We will respond within 24-48 hours.")
+            }
+
+    def _send_reply(self, thread_id: str, reply_subject: str, reply_body: str, original_sender: str,
+                    in_reply_to: Optional[str] = None, references: Optional[str] = None) -> bool:
+        """Send reply to email thread
+
+        Args:
+            thread_id: Gmail threadId the reply is filed under
+            in_reply_to: Message-ID header of the message being answered
+            references: References header of the message being answered
+        """
+        try:
+            # Create reply message
+            message = MIMEMultipart()
+            message['to'] = original_sender
+            message['subject'] = reply_subject
+            if in_reply_to:
+                message['In-Reply-To'] = in_reply_to
+                message['References'] = f"{references} {in_reply_to}" if references else in_reply_to
+
+            # Add body
+            text_part = MIMEText(reply_body, 'plain')
+            message.attach(text_part)
+
+            # Encode message
+            raw_message = base64.urlsafe_b64encode(message.as_bytes()).decode('utf-8')
+
+            # Send reply
+            with self.profiler.poll_stats.api_call("messages.send"):
+                self.gmail_service.users().messages().send(
+                    userId='me',
+                    body={'raw': raw_message, 'threadId': thread_id}
+                ).execute()
+
+            print(f"Auto-reply sent to {original_sender} for thread {thread_id}")
+            return True
+
+        except HttpError as error:
+            print(f"Error sending auto-reply: {error}")
+            return False
+        except Exception as e:
+            print(f"Unexpected error sending auto-reply: {e}")
+            return False
+
+    def _record_failed_send(self, message_ids: List[str]):
+        """Count a failed auto-reply; its messages are retried up to max_send_attempts times"""
+        max_attempts = int(self.reply_contexts.get("auto_reply_settings", {}).get("max_send_attempts", 3))
+        for message_id in message_ids:
+            attempts = self.send_attempts.get(message_id, 0) + 1
+            if attempts >= max_attempts:
+                print(f"Giving up on auto-reply to message {message_id} after {attempts} failed sends")
+                self.send_attempts.pop(message_id, None)
+                self.processed_emails.add(message_id)
+            else:
+                self.send_attempts[message_id] = attempts
+
+    def _get_header(self, message_data: Dict[str, Any], name: str) -> Optional[str]:
+        """Return a message header by case-insensitive name"""
+        name = name.lower()
+        for header in message_data.get('payload', {}).get('headers', []):
+            if header['name'].lower() == name:
+                return header['value']
+        return None
+
+    def _get_email_content(self, message_data: Dict[str, Any]) -> tuple:
+        """Extract email content, subject, and sender from message data"""
+        headers = message_data.get('payload', {}).get('headers', [])
+
+        subject = ""
+        sender = ""
+
+        for header in headers:
+            if header['name'] == 'Subject':
+                subject = header['value']
+            elif header['name'] == 'From':
+                sender = header['value']
+
+        # Extract email body; only the first max_body_bytes are needed for keyword matching
+        max_bytes = self.reply_contexts.get("auto_reply_settings", {}).get("max_body_bytes", DEFAULT_MAX_BODY_BYTES)
+        body = extract_body(message_data.get('payload', {}), max_bytes)
+
+        return body, subject, sender
+
+    @profiled_poll
+    def _process_incoming_emails(self) -> int:
+        """Process incoming emails and send auto-replies"""
+        stats = self.profiler.poll_stats
+        try:
+            # Get recent messages (last 24 hours)
+            query = "is:inbox newer_than:1d"
+            with stats.api_call("messages.list"):
+                results = self.gmail_service.users().messages().list(
+                    userId='me', q=query
+                ).execute()
+
+            messages = results.get('messages', [])
+            processed_count = 0
+            new_count = 0
+            max_replies = self.reply_contexts.get("auto_reply_settings", {}).get("max_replies_per_email", 1)
+            now = time.time()
+
+            for message in messages:
+                message_id = message['id']
+
+                # Skip if already processed or waiting in a reply group
+                if message_id in self.processed_emails or self.reply_coalescer.is_pending(message_id):
+                    continue
+                # Messages whose reply failed are retried, but aren't new mail
+                if message_id not in self.send_attempts:
+                    new_count += 1
+
+                # Skip threads that already got their share of auto-replies
+                thread_id = message['threadId']
+                if self.reply_threads.reply_count(thread_id) >= max_replies:
+                    self.processed_emails.add(message_id)
+                    continue
+
+                # Get full message details
+                with stats.api_call("messages.get"):
+                    message_data = self.gmail_service.users().messages().get(
+                        userId='me', id=message_id
+                    ).execute()
+
+                # Extract email content
+                with stats.stage("extract"):
+                    body, subject, sender = self._get_email_content(message_data)
+
+                # Hold it with the sender's other new messages on this thread
+                self.reply_coalescer.add(
+                    message_id, thread_id, sender, subject, body, now,
+                    message_id_header=self._get_header(message_data, 'Message-ID'),
+                    references=self._get_header(message_data, 'References'),
+                    sent_at=int(message_data.get('internalDate', 0))
+                )
+
+            # Groups whose window has closed get one reply each, classified in one batch
+            groups = self.reply_coalescer.pop_due(now)
+            with stats.stage("classify"):
+                contexts = self._match_contexts([(group.body, group.subject) for group in groups])
+
+            for group, context in zip(groups, contexts):
+                thread_id = group.thread_id
+                # The thread may have used up its replies since the group was opened
+                if self.reply_threads.reply_count(thread_id) >= max_replies:
+                    self.processed_emails.update(group.message_ids)
+                    continue
+
+                # Generate reply
+                with stats.stage("generate_reply"):
+                    reply = self._generate_reply(group.sender, context)
+
+                if reply:
+                    # Gmail only files a reply into the thread when the subject matches
+                    subject = group.subject
+                    if not subject:
+                        reply_subject = reply['subject']
+                    elif subject.lower().startswith('re:'):
+                        reply_subject = subject
+                    else:
+                        reply_subject = f"Re: {subject}"
+
+                    # Send auto-reply
+                    success = self._send_reply(
+                        thread_id,
+                        reply_subject,
+                        reply['body'],
+                        group.sender,
+                        in_reply_to=group.message_id_header,
+                        references=group.references
+                    )
+
+                    if success:
+                        self.processed_emails.update(group.message_ids)
+                        self.reply_threads.record_reply(thread_id, group.message_ids[-1])
+                        processed_count += len(group.message_ids)
+                        for message_id in group.message_ids:
+                            self.send_attempts.pop(message_id, None)
+                    else:
+                        self._record_failed_send(group.message_ids)
+                else:
+                    # Excluded sender: never answered, so don't collect it again
+                    self.processed_emails.update(group.message_ids)
+
+            self.poll_scheduler.record_poll(new_count)
+            self.poll_scheduler.record_pending(self.reply_coalescer.next_due_in(time.time()))
+            return processed_count
+
+        except HttpError as error:
+            if is_rate_limit_error(error):
+                self.poll_scheduler.record_rate_limit(retry_after_seconds(error))
+            print(f"Error processing incoming emails: {error}")
+            return 0
+        except Exception as e:
+            print(f"Error processing incoming emails: {e}")
+            return 0
+
+    def _listen_for_emails(self):
+        """Background thread to continuously listen for emails"""
+        while self.is_listening:
+            try:
+                self._process_incoming_emails()
+            except Exception as e:
+                print(f"Error in email listener: {e}")
+            self.poll_scheduler.wait()
@@ -0,0 +1,48 @@
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Optional
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+DB_PATH = os.getenv("LINKLINE_DB", os.path.join(PROJECT_ROOT, "linkline.db"))
+SCHEMA_FILE = os.path.join(PROJECT_ROOT, "app", "db", "schema.sql")
+
+
+class ReplyThreadStore:
+    """Per-thread auto-reply counters persisted in SQLite
+
+    Counts are loaded into memory once, so checking a thread before replying
+    never touches the database; only recording a reply writes through.
+    """
+
+    def __init__(self, db_path: str = DB_PATH):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        with open(SCHEMA_FILE, 'r') as f:
+            self._conn.executescript(f.read())
+        self._counts = dict(self._conn.execute("SELECT thread_id, reply_count FROM reply_threads"))
+
+    def reply_count(self, thread_id: str) -> int:
+        """Number of auto-replies already sent on a thread"""
+        return self._counts.get(thread_id, 0)
+
+    def record_reply(self, thread_id: str, message_id: Optional[str] = None):
+        """Record that an auto-reply was sent on a thread"""
+        with self._lock:
+            self._conn.execute(
+                """
+                INSERT INTO reply_threads (thread_id, reply_count, last_message_id, last_reply_at)
+                VALUES (?, 1, ?, ?)
+                ON CONFLICT(thread_id) DO UPDATE SET
+                    reply_count = reply_count + 1,
+                    last_message_id = excluded.last_message_id,
+                    last_reply_at = excluded.last_reply_at
+                """,
+                (thread_id, message_id, datetime.now().isoformat())
+            )
+            self._conn.commit()
+            self._counts[thread_id] = self._counts.get(thread_id, 0) + 1
+
+    def __len__(self) -> int:
+        return len(self._counts)
@@ -0,0 +1,294 @@
+import cProfile
+import functools
+import gc
+import io
+import json
+import pstats
+import resource
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+from typing import Any, Dict, Optional
+
+
+class PollStats:
+    """Per-stage timings and API call counts for inbox polls
+
+    Kept as running totals (count, total, max, last), so the cost stays
+    constant however long the server runs.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stages: Dict[str, list] = {}
+        self.api_calls = Counter()
+        self.api_errors = Counter()
+
+    def _record(self, name: str, elapsed: float):
+        with self._lock:
+            stage = self._stages.get(name)
+            if stage is None:
+                stage = self._stages[name] = [0, 0.0, 0.0, 0.0]
+            stage[0] += 1
+            stage[1] += elapsed
+            stage[2] = max(stage[2], elapsed)
+            stage[3] = elapsed
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._record(name, time.perf_counter() - start)
+
+    @contextmanager
+    def api_call(self, name: str):
+        """Time a Gmail API call as a stage and count it, and its failures"""
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            with self._lock:
+                self.api_errors[name] += 1
+            raise
+        finally:
+            with self._lock:
+                self.api_calls[name] += 1
+            self._record(name, time.perf_counter() - start)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "stages": {
+                    name: {
+                        "count": count,
+                        "avg_ms": round(total / count * 1000, 3),
+                        "max_ms": round(longest * 1000, 3),
+                        "last_ms": round(last * 1000, 3),
+                    }
+                    for name, (count, total, longest, last) in self._stages.items()
+                },
+                "api_calls": dict(self.api_calls),
+                "api_errors": dict(self.api_errors),
+            }
+
+
+class SamplingProfiler:
+    """Samples the stacks of every other thread at a fixed interval
+
+    Unlike cProfile it sees all threads and costs one stack walk per
+    interval, so it is safe to leave on for a while in production.
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.samples = 0
+        self.self_counts = Counter()
+        self.total_counts = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                self.samples += 1
+                seen = set()
+                leaf = True
+                while frame is not None:
+                    code = frame.f_code
+                    key = f"{code.co_filename}:{code.co_firstlineno}({code.co_name})"
+                    if leaf:
+                        self.self_counts[key] += 1
+                        leaf = False
+                    if key not in seen:
+                        self.total_counts[key] += 1
+                        seen.add(key)
+                    frame = frame.f_back
+
+    def report(self, top_n: int) -> str:
+        if not self.samples:
+            return "No samples collected"
+        lines = [f"{self.samples} thread samples every {self.interval * 1000:g} ms", "", "self%   total%  function"]
+        for key, count in self.self_counts.most_common(top_n):
+            lines.append(f"{100 * count / self.samples:5.1f}  {100 * self.total_counts[key] / self.samples:6.1f}  {key}")
+        return "\n".join(lines)
+
+
+class ServerProfiler:
+    """On-demand CPU and memory profiling for the long-running reply server"""
+
+    def __init__(self):
+        self.poll_stats = PollStats()
+        self._lock = threading.Lock()
+        self._cprofile: Optional[cProfile.Profile] = None
+        self._sampler: Optional[SamplingProfiler] = None
+        self._started_at: Optional[float] = None
+        self._last_snapshot: Optional[tracemalloc.Snapshot] = None
+
+    def start_cpu(self, mode: str = "sampling", interval_ms: float = 5.0) -> str:
+        with self._lock:
+            if self._cprofile or self._sampler:
+                return "A CPU profile is already running; stop it first"
+            if mode == "cprofile":
+                # Enabled around each poll in the thread running it, see profiled_poll
+                self._cprofile = cProfile.Profile()
+            elif mode == "sampling":
+                self._sampler = SamplingProfiler(interval_ms / 1000)
+                self._sampler.start()
+            else:
+                return f"Unknown profiling mode: {mode}"
+            self._started_at = time.monotonic()
+        return f"Started {mode} profiling"
+
+    def stop_cpu(self, top_n: int = 30) -> str:
+        with self._lock:
+            profile, sampler = self._cprofile, self._sampler
+            self._cprofile = self._sampler = None
+            started_at = self._started_at
+        if profile is None and sampler is None:
+            return "No CPU profile is running"
+        header = f"Profiled for {time.monotonic() - started_at:.1f}s\n"
+        if sampler is not None:
+            sampler.stop()
+            return header + sampler.report(top_n)
+        out = io.StringIO()
+        try:
+            pstats.Stats(profile, stream=out).sort_stats("cumulative").print_stats(top_n)
+        except TypeError:
+            return header + "No polls ran while cProfile was active"
+        return header + out.getvalue()
+
+    @contextmanager
+    def cprofile_active(self):
+        profile = self._cprofile
+        if profile is None:
+            yield
+            return
+        try:
+            profile.enable()
+        except ValueError:
+            # Another poll is already being profiled in a different thread
+            yield
+            return
+        try:
+            yield
+        finally:
+            profile.disable()
+
+    def start_memory(self, frames: int = 10) -> str:
+        if tracemalloc.is_tracing():
+            return "tracemalloc is already tracing"
+        tracemalloc.start(frames)
+        self._last_snapshot = tracemalloc.take_snapshot()
+        return f"tracemalloc started with {frames} frames per allocation"
+
+    def stop_memory(self) -> str:
+        if not tracemalloc.is_tracing():
+            return "tracemalloc is not tracing"
+        tracemalloc.stop()
+        self._last_snapshot = None
+        return "tracemalloc stopped"
+
+    def memory_top(self, top_n: int = 20, key_type: str = "lineno") -> str:
+        """Top allocation sites now; the snapshot becomes the baseline for memory_diff"""
+        if not tracemalloc.is_tracing():
+            return "tracemalloc is not tracing; call start_memory_tracing first"
+        snapshot = self._filtered(tracemalloc.take_snapshot())
+        self._last_snapshot = snapshot
+        current, peak = tracemalloc.get_traced_memory()
+        lines = [f"Traced {current / 1024:.1f} KiB (peak {peak / 1024:.1f} KiB)"]
+        lines += [str(stat) for stat in snapshot.statistics(key_type)[:top_n]]
+        return "\n".join(lines)
+
+    def memory_diff(self, top_n: int = 20, key_type: str = "lineno") -> str:
+        """Allocation growth since the previous snapshot, which this one replaces"""
+        if not tracemalloc.is_tracing() or self._last_snapshot is None:
+            return "tracemalloc is not tracing; call start_memory_tracing first"
+        snapshot = self._filtered(tracemalloc.take_snapshot())
+        previous, self._last_snapshot = self._filtered(self._last_snapshot), snapshot
+        return "\n".join(str(stat) for stat in snapshot.compare_to(previous, key_type)[:top_n])
+
+    @staticmethod
+    def _filtered(snapshot):
+        return snapshot.filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        ))
+
+    def process_stats(self) -> Dict[str, Any]:
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        return {
+            "cpu_user_seconds": usage.ru_utime,
+            "cpu_system_seconds": usage.ru_stime,
+            "max_rss_kib": usage.ru_maxrss,
+            "threads": threading.active_count(),
+            "gc_counts": gc.get_count(),
+            "tracemalloc_tracing": tracemalloc.is_tracing(),
+        }
+
+
+def profiled_poll(method):
+    """Time an inbox poll as the "poll" stage, under cProfile when it is active"""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.profiler.poll_stats.stage("poll"), self.profiler.cprofile_active():
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+def register_profiling_tools(mcp, profiler: ServerProfiler):
+    """Add the profiling tools to an MCP server"""
+
+    @mcp.tool()
+    def start_profiler(mode: str = "sampling", interval_ms: float = 5.0) -> str:
+        """Start CPU profiling
+
+        Args:
+            mode: "sampling" samples every thread's stack; "cprofile" traces inbox polls exactly
+            interval_ms: Sampling interval
+        """
+        return profiler.start_cpu(mode, interval_ms)
+
+    @mcp.tool()
+    def stop_profiler(top_n: int = 30) -> str:
+        """Stop CPU profiling and return the hottest functions"""
+        return profiler.stop_cpu(top_n)
+
+    @mcp.tool()
+    def start_memory_tracing(frames: int = 10) -> str:
+        """Start tracemalloc and take a baseline snapshot"""
+        return profiler.start_memory(frames)
+
+    @mcp.tool()
+    def memory_snapshot(top_n: int = 20) -> str:
+        """Return the top allocation sites and make this the baseline for memory_diff"""
+        return profiler.memory_top(top_n)
+
+    @mcp.tool()
+    def memory_diff(top_n: int = 20) -> str:
+        """Return allocation growth by site since the previous snapshot"""
+        return profiler.memory_diff(top_n)
+
+    @mcp.tool()
+    def stop_memory_tracing() -> str:
+        """Stop tracemalloc and drop its snapshots"""
+        return profiler.stop_memory()
+
+    @mcp.tool()
+    def get_poll_stats() -> str:
+        """Per-stage poll timings, Gmail API call counts and process resource usage"""
+        return json.dumps({**profiler.poll_stats.snapshot(), "process": profiler.process_stats()}, indent=2)
@@ -0,0 +1,132 @@
+import google.generativeai as genai
+from concurrent.futures import Future
+from collections import OrderedDict
+from dotenv import load_dotenv
+from app.db.models import get_study_analysis, store_study_analysis
+from app.metrics import timed
+import hashlib
+import json
+import os
+import threading
+
+MODEL_NAME = "gemini-2.5-flash"
+MEMORY_CACHE_SIZE = 128
+
+ANALYST_PERSONA = (
+    "You are an expert research analyst with years of experience in "
+    "understanding research methodologies and participant recruitment strategies. "
+    "You excel at breaking down complex research studies into clear, actionable "
+    "components for participant recruitment."
+)
+
+ANALYSIS_PROMPT = """
+    Analyze the following research study description for participant recruitment.
+
+    Study Description: {description}
+
+    Respond with a JSON object with exactly these keys:
+    "purpose": the study purpose and objectives,
+    "target_roles": list of professional roles or job titles to recruit,
+    "industries": list of industries or domains,
+    "skills": list of skills or expertise participants need,
+    "demographics": object with any location, education level, age or other demographic requirements,
+    "query_variants": list of 1 to 3 concise single-line search queries for finding these participants,
+        most specific first, each combining roles, industry, skills and demographics,
+    "compensation": compensation or incentives offered, or null if not stated,
+    "time_commitment": what participation involves and how long it takes, or null if not stated,
+    "selling_points": list of key selling points for recruitment,
+    "special_considerations": list of any special considerations or requirements.
+    """
+
+# Changing the prompt or model invalidates stored analyses
+ANALYSIS_FINGERPRINT = hashlib.sha256(
+    f"{MODEL_NAME}\n{ANALYST_PERSONA}\n{ANALYSIS_PROMPT}".encode('utf-8')
+).hexdigest()
+
+_memory_cache = OrderedDict()
+_inflight = {}
+_lock = threading.Lock()
+
+
+def analysis_cache_key(description):
+    return hashlib.sha256(f"{ANALYSIS_FINGERPRINT}\n{description}".encode('utf-8')).hexdigest()
+
+
+@timed("study_analysis")
+def run_study_analysis(description):
+    """Ask Gemini for the structured analysis of a study description"""
+    load_dotenv()
+    api_key = os.getenv('GEMINI_API_KEY')
+    if not api_key:
+        raise ValueError("GEMINI_API_KEY not found in environment variables")
+    genai.configure(api_key=api_key)
+    model = genai.GenerativeModel(
+        MODEL_NAME,
+        system_instruction=ANALYST_PERSONA,
+        generation_config={"response_mime_type": "application/json"}
+    )
+
+    response = model.generate_content(ANALYSIS_PROMPT.format(description=description))
+    analysis = json.loads(response.text)
+    if not analysis.get("query_variants"):
+        raise ValueError("Study analysis did not include any search queries")
+    return analysis
+
+
+def analyze_study(description):
+    """Return the structured analysis of a study description
+
+    Analyses are cached in memory and in SQLite, and concurrent callers for
+    the same description (the participant search and the speculative email
+    draft) share a single Gemini call.
+    """
+    if not description:
+        raise ValueError("Study description cannot be None or empty")
+
+    cache_key = analysis_cache_key(description)
+    with _lock:
+        if cache_key in _memory_cache:
+            _memory_cache.move_to_end(cache_key)
+            return _memory_cache[cache_key]
+        future = _inflight.get(cache_key)
+        owner = future is None
+        if owner:
+            future = _inflight[cache_key] = Future()
+
+    if not owner:
+        return future.result()
+
+    try:
+        stored = get_study_analysis(cache_key)
+        if stored is not None:
+            analysis = json.loads(stored)
+        else:
+            analysis = run_study_analysis(description)
+            store_study_analysis(cache_key, json.dumps(analysis))
+        with _lock:
+            _memory_cache[cache_key] = analysis
+            if len(_memory_cache) > MEMORY_CACHE_SIZE:
+                _memory_cache.popitem(last=False)
+        future.set_result(analysis)
+        return analysis
+    except Exception as e:
+        future.set_exception(e)
+        raise
+    finally:
+        with _lock:
+            _inflight.pop(cache_key, None)
+
+
+def format_analysis(analysis):
+    """Render an analysis as readable text for prompt context"""
+    lines = []
+    for key, value in analysis.items():
+        if key == "query_variants" or value in (None, "", [], {}):
+            continue
+        label = key.replace("_", " ").capitalize()
+        if isinstance(value, list):
+            value = "; ".join(str(v) for v in value)
+        elif isinstance(value, dict):
+            value = "; ".join(f"{k}: {v}" for k, v in value.items())
+        lines.append(f"{label}: {value}")
+    return "\n".join(lines)
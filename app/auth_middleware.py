@@ -0,0 +1,99 @@
+import datetime
+import os
+import threading
+from collections import OrderedDict
+from flask import g, request, session
+from google.oauth2.credentials import Credentials
+from app.session_store import auth_epoch
+from app.token_manager import parse_expiry
+
+# Sessions whose parsed credentials are kept in memory
+CREDENTIALS_CACHE_SIZE = int(os.getenv("CREDENTIALS_CACHE_SIZE", "1024"))
+
+_credentials_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def _fingerprint(creds_dict):
+    return (creds_dict.get('auth_time'), creds_dict.get('token'), creds_dict.get('refresh_token'))
+
+
+def _build_credentials(creds_dict):
+    """Parse auth_time and build Credentials; raises on a malformed dict"""
+    auth_time = datetime.datetime.fromisoformat(creds_dict['auth_time'])
+    credentials = Credentials(
+        creds_dict['token'],
+        refresh_token=creds_dict.get('refresh_token'),
+        token_uri=creds_dict['token_uri'],
+        client_id=creds_dict['client_id'],
+        client_secret=creds_dict['client_secret'],
+        scopes=creds_dict['scopes'],
+        expiry=parse_expiry(creds_dict.get('expiry'))
+    )
+    return auth_time, credentials
+
+
+def _cached_credentials(sid, creds_dict):
+    """Return (auth_time, Credentials) for a session, reusing the cached pair while the dict is unchanged"""
+    fingerprint = _fingerprint(creds_dict)
+    with _cache_lock:
+        entry = _credentials_cache.get(sid)
+        if entry is not None and entry[0] == fingerprint:
+            _credentials_cache.move_to_end(sid)
+            return entry[1], entry[2]
+
+    auth_time, credentials = _build_credentials(creds_dict)
+    with _cache_lock:
+        _credentials_cache[sid] = (fingerprint, auth_time, credentials)
+        _credentials_cache.move_to_end(sid)
+        if len(_credentials_cache) > CREDENTIALS_CACHE_SIZE:
+            _credentials_cache.popitem(last=False)
+    return auth_time, credentials
+
+
+def forget_credentials(sid):
+    """Drop a session's cached credentials, e.g. on logout"""
+    with _cache_lock:
+        _credentials_cache.pop(sid, None)
+
+
+def _reject(reason):
+    session.pop('credentials', None)
+    forget_credentials(getattr(session, 'sid', None))
+    return None, reason
+
+
+def _authenticate():
+    creds_dict = session.get('credentials')
+    if not creds_dict:
+        return None, "not_authenticated"
+    # Old format credentials without timestamp
+    if 'auth_time' not in creds_dict:
+        return _reject("invalid_format")
+
+    try:
+        auth_time, credentials = _cached_credentials(getattr(session, 'sid', None), creds_dict)
+    except (KeyError, TypeError, ValueError):
+        return _reject("invalid_format")
+
+    # Credentials issued before the deployment's invalidation epoch
+    if auth_time < auth_epoch():
+        return _reject("sessions_invalidated")
+    return credentials, None
+
+
+def load_request_auth():
+    """Validate the session's credentials once per request and attach them to flask.g
+
+    Sets g.credentials (google Credentials or None), g.authenticated and
+    g.auth_reason ("not_authenticated", "invalid_format" or
+    "sessions_invalidated" when not authenticated).
+    """
+    if request.endpoint == 'static':
+        return
+    g.credentials, g.auth_reason = _authenticate()
+    g.authenticated = g.credentials is not None
+
+
+def init_auth(app):
+    app.before_request(load_request_auth)
@@ -0,0 +1,280 @@
+import os
+import sqlite3
+import threading
+import time
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+DB_PATH = os.getenv("LINKLINE_DB", os.path.join(PROJECT_ROOT, "linkline.db"))
+SCHEMA_FILE = os.path.join(os.path.dirname(__file__), "schema.sql")
+
+DRAFT_CACHE_MAX_ENTRIES = int(os.getenv("DRAFT_CACHE_MAX_ENTRIES", "256"))
+
+# Stay under SQLite's limit on bound parameters per statement
+SQL_PARAMETER_CHUNK = 500
+
+_local = threading.local()
+_schema_lock = threading.Lock()
+_schema_ready = False
+
+
+def get_db():
+    """Return this thread's SQLite connection, creating the schema on first use"""
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = sqlite3.connect(DB_PATH, timeout=10)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        init_db(conn)
+        _local.conn = conn
+    return conn
+
+
+def init_db(conn):
+    """Apply schema.sql once per process"""
+    global _schema_ready
+    with _schema_lock:
+        if not _schema_ready:
+            with open(SCHEMA_FILE, 'r') as f:
+                conn.executescript(f.read())
+            _schema_ready = True
+
+
+def get_cached_draft(cache_key):
+    """Return a cached email draft and mark it as recently used"""
+    db = get_db()
+    row = db.execute("SELECT content FROM draft_cache WHERE cache_key = ?", (cache_key,)).fetchone()
+    if row is None:
+        return None
+    db.execute("UPDATE draft_cache SET last_used_at = ? WHERE cache_key = ?", (time.time(), cache_key))
+    db.commit()
+    return row["content"]
+
+
+def store_cached_draft(cache_key, content, max_entries=DRAFT_CACHE_MAX_ENTRIES):
+    """Cache an email draft, evicting the least recently used entries beyond max_entries"""
+    db = get_db()
+    db.execute(
+        "INSERT OR REPLACE INTO draft_cache (cache_key, content, last_used_at) VALUES (?, ?, ?)",
+        (cache_key, content, time.time())
+    )
+    db.execute(
+        """
+        DELETE FROM draft_cache WHERE cache_key NOT IN (
+            SELECT cache_key FROM draft_cache ORDER BY last_used_at DESC LIMIT ?
+        )
+        """,
+        (max_entries,)
+    )
+    db.commit()
+
+
+def create_study(description, title=None):
+    """Insert a research study and return its id"""
+    db = get_db()
+    cursor = db.execute(
+        "INSERT INTO research_studies (title, description) VALUES (?, ?)",
+        (title, description)
+    )
+    db.commit()
+    return cursor.lastrowid
+
+
+def save_study_draft(study_id, mode, content):
+    """Store the email draft composed for a study"""
+    db = get_db()
+    db.execute(
+        "INSERT OR REPLACE INTO study_drafts (study_id, mode, content) VALUES (?, ?, ?)",
+        (study_id, mode, content)
+    )
+    db.commit()
+
+
+def get_study_draft(study_id, mode):
+    """Return the email draft composed for a study, if any"""
+    row = get_db().execute(
+        "SELECT content FROM study_drafts WHERE study_id = ? AND mode = ?",
+        (study_id, mode)
+    ).fetchone()
+    return row["content"] if row else None
+
+
+def get_study_analysis(cache_key):
+    """Return a stored structured study analysis as JSON text"""
+    row = get_db().execute(
+        "SELECT analysis_json FROM study_analyses WHERE cache_key = ?", (cache_key,)
+    ).fetchone()
+    return row["analysis_json"] if row else None
+
+
+def store_study_analysis(cache_key, analysis_json):
+    """Store a structured study analysis"""
+    db = get_db()
+    db.execute(
+        "INSERT OR REPLACE INTO study_analyses (cache_key, analysis_json) VALUES (?, ?)",
+        (cache_key, analysis_json)
+    )
+    db.commit()
+
+
+def save_study_search(study_id, status, results_json=None, error=None):
+    """Record the state of a study's participant search"""
+    db = get_db()
+    db.execute(
+        "INSERT OR REPLACE INTO study_searches (study_id, status, results_json, error, updated_at) "
+        "VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)",
+        (study_id, status, results_json, error)
+    )
+    db.commit()
+
+
+def get_study_search(study_id):
+    """Return the stored participant search row for a study, if any"""
+    return get_db().execute(
+        "SELECT status, results_json, error FROM study_searches WHERE study_id = ?", (study_id,)
+    ).fetchone()
+
+
+def save_study_webset(study_id, webset_id, enrichments_json):
+    """Record a study's Exa webset and the enrichment formats requested on it so far"""
+    db = get_db()
+    db.execute(
+        "INSERT OR REPLACE INTO study_websets (study_id, webset_id, enrichments_json) VALUES (?, ?, ?)",
+        (study_id, webset_id, enrichments_json)
+    )
+    db.commit()
+
+
+def get_study_webset(study_id):
+    """Return the webset row of a study, if its search recorded one"""
+    return get_db().execute(
+        "SELECT webset_id, enrichments_json FROM study_websets WHERE study_id = ?", (study_id,)
+    ).fetchone()
+
+
+def get_session_data(sid):
+    """Return the serialized data of an unexpired server-side session"""
+    row = get_db().execute(
+        "SELECT data FROM sessions WHERE sid = ? AND expires_at > ?", (sid, time.time())
+    ).fetchone()
+    return row["data"] if row else None
+
+
+def store_session_data(sid, data, expires_at):
+    """Create or replace a server-side session"""
+    db = get_db()
+    db.execute(
+        "INSERT OR REPLACE INTO sessions (sid, data, expires_at) VALUES (?, ?, ?)",
+        (sid, data, expires_at)
+    )
+    db.commit()
+
+
+def delete_session_data(sid):
+    db = get_db()
+    db.execute("DELETE FROM sessions WHERE sid = ?", (sid,))
+    db.commit()
+
+
+def purge_expired_sessions():
+    """Delete expired sessions and return how many were removed"""
+    db = get_db()
+    cursor = db.execute("DELETE FROM sessions WHERE expires_at <= ?", (time.time(),))
+    db.commit()
+    return cursor.rowcount
+
+
+def get_deployment_value(key):
+    """Return a deployment-wide setting shared by every worker"""
+    row = get_db().execute("SELECT value FROM deployment_state WHERE key = ?", (key,)).fetchone()
+    return row["value"] if row else None
+
+
+def set_deployment_value(key, value, replace=True):
+    """Set a deployment-wide setting; with replace=False an existing value wins"""
+    db = get_db()
+    verb = "INSERT OR REPLACE" if replace else "INSERT OR IGNORE"
+    db.execute(f"{verb} INTO deployment_state (key, value) VALUES (?, ?)", (key, value))
+    db.commit()
+
+
+def find_known_participants(key_hashes):
+    """Map each known dedupe key hash to the row of the participant it belongs to"""
+    db = get_db()
+    key_hashes = list(key_hashes)
+    found = {}
+    for start in range(0, len(key_hashes), SQL_PARAMETER_CHUNK):
+        chunk = key_hashes[start:start + SQL_PARAMETER_CHUNK]
+        rows = db.execute(
+            "SELECT k.key_hash, p.* FROM participant_keys k "
+            "JOIN known_participants p ON p.id = k.participant_id "
+            f"WHERE k.key_hash IN ({', '.join('?' * len(chunk))})",
+            chunk
+        )
+        for row in rows:
+            found[bytes(row["key_hash"])] = row
+    return found
+
+
+def save_known_participants(records, study_id):
+    """Insert or update resolved participants and their dedupe keys in one transaction
+
+    records are (participant_id, name, email, phone, linkedin, key_hashes)
+    tuples, with participant_id None for someone new. Stored fields are only
+    filled in, never cleared. Returns the participant ids in order.
+    """
+    db = get_db()
+    ids = []
+    for participant_id, name, email, phone, linkedin, key_hashes in records:
+        if participant_id is None:
+            participant_id = db.execute(
+                "INSERT INTO known_participants (name, email, phone, linkedin, first_study_id, last_study_id) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (name, email, phone, linkedin, study_id, study_id)
+            ).lastrowid
+        else:
+            db.execute(
+                """
+                UPDATE known_participants SET
+                    name = COALESCE(name, ?),
+                    email = COALESCE(email, ?),
+                    phone = COALESCE(phone, ?),
+                    linkedin = COALESCE(linkedin, ?),
+                    last_study_id = ?,
+                    updated_at = CURRENT_TIMESTAMP
+                WHERE id = ?
+                """,
+                (name, email, phone, linkedin, study_id, participant_id)
+            )
+        db.executemany(
+            "INSERT OR IGNORE INTO participant_keys (key_hash, participant_id) VALUES (?, ?)",
+            [(key_hash, participant_id) for key_hash in key_hashes]
+        )
+        ids.append(participant_id)
+    db.commit()
+    return ids
+
+
+def mark_participants_contacted(participant_ids, sender):
+    """Record that the sender's Gmail account emailed these participants"""
+    db = get_db()
+    db.executemany(
+        "INSERT OR REPLACE INTO participant_contacts (participant_id, sender) VALUES (?, ?)",
+        [(participant_id, sender) for participant_id in participant_ids]
+    )
+    db.commit()
+
+
+def find_contacted_participants(participant_ids, sender):
+    """Return the ids among participant_ids that the sender's Gmail account has emailed"""
+    db = get_db()
+    participant_ids = list(participant_ids)
+    contacted = set()
+    for start in range(0, len(participant_ids), SQL_PARAMETER_CHUNK):
+        chunk = participant_ids[start:start + SQL_PARAMETER_CHUNK]
+        rows = db.execute(
+            "SELECT participant_id FROM participant_contacts "
+            f"WHERE sender = ? AND participant_id IN ({', '.join('?' * len(chunk))})",
+            [sender, *chunk]
+        )
+        contacted.update(row["participant_id"] for row in rows)
+    return contacted
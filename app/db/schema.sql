@@ -1,4 +1,4 @@
-CREATE TABLE research_studies (
+CREATE TABLE IF NOT EXISTS research_studies (
   id INTEGER PRIMARY KEY AUTOINCREMENT,
   title TEXT,
   description TEXT,
@@ -6,7 +6,7 @@ CREATE TABLE research_studies (
   created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
-CREATE TABLE participants (
+CREATE TABLE IF NOT EXISTS participants (
   id INTEGER PRIMARY KEY AUTOINCREMENT,
   research_id INTEGER,
   name TEXT,
@@ -14,4 +14,91 @@ CREATE TABLE participants (
   source TEXT,
   status TEXT,
   FOREIGN KEY(research_id) REFERENCES research_studies(id)
-); 
\ No newline at end of file
+);
+
+CREATE TABLE IF NOT EXISTS reply_threads (
+  thread_id TEXT PRIMARY KEY,
+  reply_count INTEGER NOT NULL DEFAULT 0,
+  last_message_id TEXT,
+  last_reply_at TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS draft_cache (
+  cache_key TEXT PRIMARY KEY,
+  content TEXT NOT NULL,
+  created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+  last_used_at REAL NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_draft_cache_last_used ON draft_cache(last_used_at);
+
+CREATE TABLE IF NOT EXISTS study_drafts (
+  study_id INTEGER NOT NULL,
+  mode TEXT NOT NULL,
+  content TEXT NOT NULL,
+  created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+  PRIMARY KEY (study_id, mode),
+  FOREIGN KEY(study_id) REFERENCES research_studies(id)
+);
+
+CREATE TABLE IF NOT EXISTS study_analyses (
+  cache_key TEXT PRIMARY KEY,
+  analysis_json TEXT NOT NULL,
+  created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS study_searches (
+  study_id INTEGER PRIMARY KEY,
+  status TEXT NOT NULL,
+  results_json TEXT,
+  error TEXT,
+  updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+  FOREIGN KEY(study_id) REFERENCES research_studies(id)
+);
+
+CREATE TABLE IF NOT EXISTS sessions (
+  sid TEXT PRIMARY KEY,
+  data TEXT NOT NULL,
+  expires_at REAL NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_sessions_expires_at ON sessions(expires_at);
+
+CREATE TABLE IF NOT EXISTS deployment_state (
+  key TEXT PRIMARY KEY,
+  value TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS known_participants (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  name TEXT,
+  email TEXT,
+  phone TEXT,
+  linkedin TEXT,
+  first_study_id INTEGER,
+  last_study_id INTEGER,
+  created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+  updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS participant_keys (
+  key_hash BLOB PRIMARY KEY,
+  participant_id INTEGER NOT NULL,
+  FOREIGN KEY(participant_id) REFERENCES known_participants(id)
+);
+
+-- Who each researcher's Gmail account has already emailed
+CREATE TABLE IF NOT EXISTS participant_contacts (
+  participant_id INTEGER NOT NULL,
+  sender TEXT NOT NULL,
+  contacted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+  PRIMARY KEY (participant_id, sender),
+  FOREIGN KEY(participant_id) REFERENCES known_participants(id)
+);
+
+CREATE TABLE IF NOT EXISTS study_websets (
+  study_id INTEGER PRIMARY KEY,
+  webset_id TEXT NOT NULL,
+  enrichments_json TEXT NOT NULL,
+  FOREIGN KEY(study_id) REFERENCES research_studies(id)
+);
@@ -0,0 +1,110 @@
+import asyncio
+import json
+import os
+import threading
+import weakref
+from app.agents.exa_agent import ENRICHMENT_DESCRIPTIONS, enrich_webset_async
+from app.db.models import get_study_search, get_study_webset, save_study_search, save_study_webset
+from app.executors import submit_background
+from app.participant_index import record_enrichments
+from app.participants import results_from_json, results_to_json
+from app.tracing import traced
+
+# How long a request waits for an on-demand enrichment before giving up;
+# the enrichment itself carries on and its results are kept
+ENRICHMENT_TIMEOUT = float(os.getenv("ENRICHMENT_TIMEOUT_SECONDS", "180"))
+
+_inflight = {}
+_inflight_lock = threading.Lock()
+
+# Serializes enrichments of one study on the background loop; entries go
+# away once no enrichment holds or waits for them
+_study_locks = weakref.WeakValueDictionary()
+
+
+class EnrichmentUnavailable(Exception):
+    """Raised when a study has no webset to enrich, e.g. it was searched before websets were recorded"""
+
+
+def unknown_enrichments(enrichments):
+    return [name for name in enrichments if name not in ENRICHMENT_DESCRIPTIONS]
+
+
+def missing_fields(participants, enrichments):
+    """The enrichments some of the given participants still have no value for"""
+    return [name for name in enrichments if any(value is None for value in participants.column(name))]
+
+
+def _study_lock(study_id):
+    lock = _study_locks.get(study_id)
+    if lock is None:
+        lock = _study_locks[study_id] = asyncio.Lock()
+    return lock
+
+
+async def _enrich(study_id, enrichments):
+    # Different enrichments of one study each read, merge and write back the
+    # whole result set, so they take turns; each one reads what the last saved
+    async with _study_lock(study_id):
+        return await _enrich_locked(study_id, enrichments)
+
+
+async def _enrich_locked(study_id, enrichments):
+    webset = get_study_webset(study_id)
+    search = get_study_search(study_id)
+    if webset is None or search is None or not search["results_json"]:
+        raise EnrichmentUnavailable(f"Study {study_id} has no webset to enrich")
+
+    results = results_from_json(json.loads(search["results_json"]))
+    participants = results["participants"]
+    requested = json.loads(webset["enrichments_json"])
+    # Formats already run on the webset won't turn up anything new, and known
+    # participants may have had the details filled in from earlier studies
+    needed = [name for name in missing_fields(participants, enrichments) if name not in requested]
+    if not needed:
+        return results_to_json(results)
+
+    with traced("study.enrich", study_id=study_id, enrichments=",".join(needed)):
+        enriched = await enrich_webset_async(webset["webset_id"], needed)
+    save_study_webset(study_id, webset["webset_id"], json.dumps(requested + needed))
+
+    # Merge column by column, by webset item, without overwriting known values
+    rows = {item_id: index for index, item_id in enumerate(participants.column("item_id"))}
+    enriched_items = enriched["participants"].column("item_id")
+    for name in needed:
+        column = participants.column(name)
+        for item_id, value in zip(enriched_items, enriched["participants"].column(name)):
+            index = rows.get(item_id)
+            if index is not None and column[index] is None:
+                column[index] = value
+
+    results["participants"] = record_enrichments(participants, study_id)
+    results["enrichments"] = requested + needed
+    results_json = results_to_json(results)
+    save_study_search(study_id, "done", results_json=json.dumps(results_json))
+    return results_json
+
+
+def _forget(key):
+    with _inflight_lock:
+        _inflight.pop(key, None)
+
+
+def enrich_study(study_id, enrichments):
+    """Add enrichments to a study's participants on demand
+
+    Runs on the background loop and returns a concurrent future of the
+    study's updated results in their JSON form. Concurrent requests for the
+    same study and enrichments share one Exa call. Nothing is requested from
+    Exa for details every participant already has.
+    """
+    key = (study_id, tuple(sorted(enrichments)))
+    with _inflight_lock:
+        future = _inflight.get(key)
+        if future is not None:
+            return future
+        future = submit_background(_enrich(study_id, list(key[1])))
+        _inflight[key] = future
+    # Outside the lock: the callback runs at once if the future is already done
+    future.add_done_callback(lambda _future: _forget(key))
+    return future
@@ -0,0 +1,49 @@
+import asyncio
+import contextvars
+import functools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Bounded pools for the blocking SDKs. Each outbound service gets its own pool
+# so a slow Exa search can't starve Gmail sends or LLM calls.
+EXECUTORS = {
+    'llm': ThreadPoolExecutor(max_workers=int(os.getenv("LLM_WORKERS", "16")), thread_name_prefix="llm"),
+    'exa': ThreadPoolExecutor(max_workers=int(os.getenv("EXA_WORKERS", "16")), thread_name_prefix="exa"),
+    'gmail': ThreadPoolExecutor(max_workers=int(os.getenv("GMAIL_WORKERS", "8")), thread_name_prefix="gmail"),
+    'auth': ThreadPoolExecutor(max_workers=int(os.getenv("AUTH_WORKERS", "4")), thread_name_prefix="auth"),
+}
+
+_background_loop = None
+_background_lock = threading.Lock()
+
+
+async def run_blocking(kind, fn, *args, **kwargs):
+    """Run a blocking call on the bounded executor for an outbound service
+
+    The caller's context variables (the Flask request context, per-request
+    stage timings) are carried into the worker thread.
+    """
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(EXECUTORS[kind], functools.partial(context.run, fn, *args, **kwargs))
+
+
+def background_loop():
+    """Event loop shared by long-running background jobs such as participant searches
+
+    Jobs await their SDK calls on the bounded executors, so hundreds of
+    in-flight searches are coroutines on this one thread rather than
+    hundreds of blocked threads.
+    """
+    global _background_loop
+    with _background_lock:
+        if _background_loop is None:
+            _background_loop = asyncio.new_event_loop()
+            threading.Thread(target=_background_loop.run_forever, name="background-jobs", daemon=True).start()
+    return _background_loop
+
+
+def submit_background(coro):
+    """Schedule a coroutine on the background loop and return a concurrent.futures.Future"""
+    return asyncio.run_coroutine_threadsafe(coro, background_loop())
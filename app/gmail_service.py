@@ -2,6 +2,7 @@ import base64
 from email.mime.text import MIMEText
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
+from app.metrics import count, timer
 
 class GmailService:
     @staticmethod
@@ -13,22 +14,26 @@ class GmailService:
             message['to'] = to_email
             message['subject'] = subject
             raw_message = base64.urlsafe_b64encode(message.as_bytes()).decode('utf-8')
-            sent_message = service.users().messages().send(
-                userId='me',
-                body={'raw': raw_message}
-            ).execute()
+            with timer("gmail_send"):
+                sent_message = service.users().messages().send(
+                    userId='me',
+                    body={'raw': raw_message}
+                ).execute()
+            count("gmail_sends", outcome="success")
             return {
                 'success': True,
                 'message_id': sent_message['id'],
                 'thread_id': sent_message['threadId']
             }
         except HttpError as error:
+            count("gmail_sends", outcome=f"http_{error.resp.status}")
             print(f'An error occurred: {error}')
             return {
                 'success': False,
                 'error': str(error)
             }
         except Exception as e:
+            count("gmail_sends", outcome="error")
             print(f'An unexpected error occurred: {e}')
             return {
                 'success': False,
@@ -41,17 +46,19 @@ class GmailService:
         results = {
             'sent_count': 0,
             'failed_count': 0,
-            'errors': []
+            'errors': [],
+            'sent': []
         }
         for recipient in recipients:
-            if recipient.get('email') and recipient['email'] != 'Not found':
-                result = GmailService.send_email_with_credentials(credentials, recipient['email'], subject, body)
+            if recipient.email:
+                result = GmailService.send_email_with_credentials(credentials, recipient.email, subject, body)
                 if result['success']:
                     results['sent_count'] += 1
+                    results['sent'].append(recipient)
                 else:
                     results['failed_count'] += 1
                     results['errors'].append({
-                        'email': recipient['email'],
+                        'email': recipient.email,
                         'error': result.get('error', 'Unknown error')
                     })
         return results 
\ No newline at end of file
@@ -0,0 +1,174 @@
+import bisect
+import contextlib
+import contextvars
+import functools
+import os
+import threading
+import time
+from flask import Response, g, request
+from app.tracing import TRACING_ENABLED, record_span
+
+# Set METRICS_ENABLED=0 to turn timers and counters into no-ops
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+
+# Stage timers also feed trace spans, so they stay on if either is enabled
+TIMERS_ENABLED = METRICS_ENABLED or TRACING_ENABLED
+
+# Histogram bucket upper bounds, in seconds; LLM and Exa stages run for minutes
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+# Stage timings of the current request, for the Server-Timing header
+_request_timings = contextvars.ContextVar("request_timings", default=None)
+
+_lock = threading.Lock()
+_histograms = {}
+_counters = {}
+
+
+class Histogram:
+    def __init__(self):
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.buckets[bisect.bisect_left(LATENCY_BUCKETS, value)] += 1
+        self.count += 1
+        self.sum += value
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def observe(metric, seconds, **labels):
+    """Record a latency in the histogram for metric and labels"""
+    key = (metric, _label_key(labels))
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = Histogram()
+        histogram.observe(seconds)
+
+
+def count(metric, amount=1, **labels):
+    """Increment a counter"""
+    if not METRICS_ENABLED:
+        return
+    key = (metric, _label_key(labels))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + amount
+
+
+@contextlib.contextmanager
+def _stage_timer(stage):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        if METRICS_ENABLED:
+            observe("stage_duration_seconds", elapsed, stage=stage)
+            timings = _request_timings.get()
+            if timings is not None:
+                timings.append((stage, elapsed))
+        if TRACING_ENABLED:
+            record_span(stage, elapsed)
+
+
+_NULL_TIMER = contextlib.nullcontext()
+
+
+def timer(stage):
+    """Context manager timing one stage into its histogram, the request's Server-Timing and trace"""
+    if not TIMERS_ENABLED:
+        return _NULL_TIMER
+    return _stage_timer(stage)
+
+
+def timed(stage):
+    """Decorator form of timer; returns the function unchanged when timers are disabled"""
+    def decorator(fn):
+        if not TIMERS_ENABLED:
+            return fn
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with _stage_timer(stage):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _format_labels(labels, **extra):
+    pairs = list(labels) + list(extra.items())
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}"
+
+
+def render_prometheus():
+    """All metrics in the Prometheus text exposition format"""
+    with _lock:
+        histograms = {key: (list(h.buckets), h.count, h.sum) for key, h in _histograms.items()}
+        counters = dict(_counters)
+
+    lines = []
+    for metric in sorted({name for name, _ in histograms}):
+        lines.append(f"# TYPE linkline_{metric} histogram")
+        for (name, labels), (buckets, total, value_sum) in sorted(histograms.items()):
+            if name != metric:
+                continue
+            cumulative = 0
+            for bound, bucket in zip(LATENCY_BUCKETS + ("+Inf",), buckets):
+                cumulative += bucket
+                lines.append(f"linkline_{metric}_bucket{_format_labels(labels, le=bound)} {cumulative}")
+            lines.append(f"linkline_{metric}_sum{_format_labels(labels)} {value_sum}")
+            lines.append(f"linkline_{metric}_count{_format_labels(labels)} {total}")
+    for metric in sorted({name for name, _ in counters}):
+        lines.append(f"# TYPE linkline_{metric}_total counter")
+        for (name, labels), value in sorted(counters.items()):
+            if name == metric:
+                lines.append(f"linkline_{metric}_total{_format_labels(labels)} {value}")
+    return "\n".join(lines) + "\n"
+
+
+def server_timing_header(timings, total):
+    """Sum timings per stage into a Server-Timing header value"""
+    stages = {}
+    for stage, elapsed in timings:
+        duration, calls = stages.get(stage, (0.0, 0))
+        stages[stage] = (duration + elapsed, calls + 1)
+    entries = [
+        f'{stage};dur={duration * 1000:.1f}' + (f';desc="x{calls}"' if calls > 1 else "")
+        for stage, (duration, calls) in stages.items()
+    ]
+    entries.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(entries)
+
+
+def init_metrics(app):
+    """Time every request, add Server-Timing headers and serve /metrics"""
+    if not METRICS_ENABLED:
+        return
+
+    @app.before_request
+    def start_request_timer():
+        g.metrics_start = time.perf_counter()
+        _request_timings.set([])
+
+    @app.after_request
+    def add_server_timing(response):
+        start = g.pop('metrics_start', None)
+        if start is None:
+            return response
+        total = time.perf_counter() - start
+        timings = _request_timings.get() or []
+        _request_timings.set(None)
+        observe("http_request_duration_seconds", total, endpoint=request.endpoint or "unknown", method=request.method)
+        response.headers['Server-Timing'] = server_timing_header(timings, total)
+        return response
+
+    @app.route("/metrics")
+    def metrics():
+        return Response(render_prometheus(), mimetype="text/plain; version=0.0.4")
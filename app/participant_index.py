@@ -0,0 +1,200 @@
+import hashlib
+import os
+import re
+from urllib.parse import unquote, urlsplit
+from app.db.models import find_contacted_participants, find_known_participants, save_known_participants
+from app.participants import ParticipantBatch
+
+# Country calling code assumed for phone numbers written without one
+DEFAULT_PHONE_COUNTRY_CODE = os.getenv("DEFAULT_PHONE_COUNTRY_CODE", "1")
+
+# Valid lengths of national numbers, without the trunk 0, for the country
+# codes that can be assumed. Numbers without a country code are only
+# accepted when DEFAULT_PHONE_COUNTRY_CODE is listed here.
+NATIONAL_NUMBER_LENGTHS = {
+    "1": (10,),
+    "33": (9,),
+    "44": (9, 10),
+    "49": (7, 8, 9, 10, 11),
+    "61": (9,),
+    "91": (10,),
+}
+
+_EMAIL_RE = re.compile(r"^[^@\s]+@[^@\s]+\.[^@\s]+$")
+
+
+def canonical_linkedin(url):
+    """Reduce a profile URL to linkedin.com/in/<slug>; other URLs to host and path
+
+    Only the host is case-insensitive in general, so other paths keep their case.
+    """
+    if not url:
+        return None
+    parts = urlsplit(url.strip() if "//" in url else f"//{url.strip()}")
+    host = parts.netloc.lower().split("@")[-1].split(":")[0]
+    segments = [unquote(s) for s in parts.path.split("/") if s]
+    if host == "linkedin.com" or host.endswith(".linkedin.com"):
+        segments = [s.lower() for s in segments]
+        if len(segments) >= 2 and segments[0] in ("in", "pub"):
+            return f"linkedin.com/in/{segments[1]}"
+        host = "linkedin.com"
+    if host.startswith("www."):
+        host = host[4:]
+    return "/".join([host] + segments) if host else None
+
+
+def normalize_email(email):
+    """Lower-case and trim an email address; None if it isn't one"""
+    if not email:
+        return None
+    email = email.strip().lower()
+    return email if _EMAIL_RE.match(email) else None
+
+
+def email_identity(email):
+    """The address with any +tag removed, so aliases of one mailbox match"""
+    local, _, domain = email.partition("@")
+    return f"{local.split('+', 1)[0]}@{domain}"
+
+
+def normalize_phone(phone):
+    """Convert a phone number to E.164, or None if it can't be one
+
+    A number without a country code is only given DEFAULT_PHONE_COUNTRY_CODE
+    when it has a valid national length for it. A short local number or a
+    foreign number written nationally would otherwise pass as someone
+    else's number.
+    """
+    if not phone:
+        return None
+    phone = phone.strip()
+    digits = re.sub(r"\D", "", phone)
+    if phone.startswith("+"):
+        pass
+    elif digits.startswith("00"):
+        digits = digits[2:]
+    else:
+        code = DEFAULT_PHONE_COUNTRY_CODE
+        national = digits
+        if code == "1" and len(digits) == 11 and digits.startswith("1"):
+            national = digits[1:]
+        elif code != "1":
+            national = digits[1:] if digits.startswith("0") else digits  # trunk prefix
+        if len(national) not in NATIONAL_NUMBER_LENGTHS.get(code, ()):
+            return None
+        # North American area codes never start with 0 or 1
+        if code == "1" and national[0] in "01":
+            return None
+        digits = code + national
+    return f"+{digits}" if 8 <= len(digits) <= 15 else None
+
+
+def _key_hash(kind, value):
+    return hashlib.blake2b(f"{kind}:{value}".encode("utf-8"), digest_size=16).digest()
+
+
+def normalize_participant(participant):
+    """Normalize a participant's contact fields in place and return its dedupe key hashes
+
+    Keys come in priority order (profile, then email, then phone), which
+    decides the match when different keys point at different people.
+    """
+    linkedin = canonical_linkedin(participant.linkedin)
+    email = normalize_email(participant.email)
+    phone = normalize_phone(participant.phone)
+
+    if linkedin and linkedin.startswith("linkedin.com/"):
+        participant.linkedin = f"https://www.{linkedin}"
+    if email:
+        participant.email = email
+    if phone:
+        participant.phone = phone
+
+    keys = []
+    if linkedin:
+        keys.append(_key_hash("url", linkedin))
+    if email:
+        keys.append(_key_hash("email", email_identity(email)))
+    if phone:
+        keys.append(_key_hash("phone", phone))
+    return keys
+
+
+def resolve_participants(participants, study_id=None):
+    """Merge search results with everyone found in earlier studies
+
+    Each participant is normalized and looked up by its keys in the
+    persistent index with one batched query. Known people get contact
+    details found earlier filled in, so they needn't be enriched again,
+    and are flagged if they were already emailed. People who appear twice
+    in the same results are kept once. Returns a de-duplicated
+    ParticipantBatch in which everyone has a participant_id.
+    """
+    keyed = [(participant, normalize_participant(participant)) for participant in participants]
+    known = find_known_participants({key for _, keys in keyed for key in keys})
+
+    resolved, records = [], []
+    claimed = {}  # key hash -> index into resolved, for duplicates within these results
+    by_known_id = {}  # known participant id -> index into resolved
+    for participant, keys in keyed:
+        row = next((known[key] for key in keys if key in known), None)
+        # Rows can be the same person without sharing a key, e.g. one found
+        # by profile and one by email that both resolve to one known person
+        duplicate = next((claimed[key] for key in keys if key in claimed), None)
+        if duplicate is None and row is not None:
+            duplicate = by_known_id.get(row["id"])
+        if duplicate is not None:
+            kept = resolved[duplicate]
+            for name in ("email", "phone", "linkedin"):
+                if not getattr(kept, name) and getattr(participant, name):
+                    setattr(kept, name, getattr(participant, name))
+            records[duplicate][5].extend(keys)
+            for key in keys:
+                claimed.setdefault(key, duplicate)
+            continue
+
+        if row is not None:
+            for name in ("email", "phone", "linkedin"):
+                if not getattr(participant, name) and row[name]:
+                    setattr(participant, name, row[name])
+            by_known_id[row["id"]] = len(resolved)
+
+        for key in keys:
+            claimed[key] = len(resolved)
+        resolved.append(participant)
+        records.append([row["id"] if row is not None else None, None, None, None, None, list(keys)])
+
+    # Stored after merging so duplicates contribute their details too
+    for record, participant in zip(records, resolved):
+        record[1:5] = [participant.name, participant.email, participant.phone, participant.linkedin]
+    ids = save_known_participants([tuple(record) for record in records], study_id)
+    for participant, participant_id in zip(resolved, ids):
+        participant.participant_id = participant_id
+    return ParticipantBatch.from_participants(resolved)
+
+
+def record_enrichments(batch, study_id=None):
+    """Normalize details added by a later enrichment and store them on the known participants
+
+    Returns the normalized batch.
+    """
+    participants = list(batch)
+    records = [
+        (p.participant_id, p.name, p.email, p.phone, p.linkedin, normalize_participant(p))
+        for p in participants
+    ]
+    save_known_participants([record for record in records if record[0] is not None], study_id)
+    return ParticipantBatch.from_participants(participants)
+
+
+def flag_contacted(batch, sender):
+    """Set contacted_before on everyone the sender's Gmail account has already emailed
+
+    Contacts are per account, so researchers don't skip, or learn about,
+    people someone else emailed. Without a known sender nobody is flagged.
+    Returns the batch, updated in place.
+    """
+    ids = batch.column("participant_id")
+    contacted = find_contacted_participants([i for i in ids if i is not None], sender) if sender else set()
+    batch.columns["contacted_before"] = [participant_id in contacted for participant_id in ids]
+    return batch
@@ -0,0 +1,108 @@
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+# Placeholder older stored results used for missing contact details
+LEGACY_MISSING = "Not found"
+
+SERIALIZATION_VERSION = 1
+
+
+class Participant:
+    """One potential participant; missing contact details are None"""
+
+    __slots__ = ("name", "email", "phone", "linkedin", "participant_id", "contacted_before", "item_id")
+
+    def __init__(self, name: Optional[str] = None, email: Optional[str] = None, phone: Optional[str] = None,
+                 linkedin: Optional[str] = None, participant_id: Optional[int] = None,
+                 contacted_before: bool = False, item_id: Optional[str] = None):
+        self.name = name
+        self.email = email
+        self.phone = phone
+        self.linkedin = linkedin
+        self.participant_id = participant_id
+        self.contacted_before = contacted_before
+        self.item_id = item_id  # Exa webset item the participant came from
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Participant":
+        """Build from a per-participant dict, including the older "Not found" format"""
+        return cls(**{
+            field: None if data.get(field) == LEGACY_MISSING else data.get(field)
+            for field in cls.__slots__ if field in data
+        })
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {field: getattr(self, field) for field in self.__slots__}
+
+    def __eq__(self, other):
+        return isinstance(other, Participant) and self.to_dict() == other.to_dict()
+
+    def __repr__(self):
+        return f"Participant(name={self.name!r}, email={self.email!r}, participant_id={self.participant_id!r})"
+
+
+class ParticipantBatch:
+    """Participants stored column by column: one list per field
+
+    Large result sets cost one list slot per field per person rather than
+    an object each, and serialize to a single JSON object of columns.
+    Iterating yields Participant records built on the fly.
+    """
+
+    __slots__ = ("columns",)
+
+    FIELDS = Participant.__slots__
+
+    def __init__(self, columns: Optional[Dict[str, List[Any]]] = None):
+        self.columns = columns if columns is not None else {field: [] for field in self.FIELDS}
+
+    @classmethod
+    def from_participants(cls, participants: Iterable[Participant]) -> "ParticipantBatch":
+        batch = cls()
+        for participant in participants:
+            batch.append(participant)
+        return batch
+
+    def append(self, participant: Participant):
+        for field in self.FIELDS:
+            self.columns[field].append(getattr(participant, field))
+
+    def column(self, field: str) -> List[Any]:
+        return self.columns[field]
+
+    def __len__(self) -> int:
+        return len(self.columns["name"])
+
+    def __getitem__(self, index: int) -> Participant:
+        return Participant(*(self.columns[field][index] for field in self.FIELDS))
+
+    def __iter__(self) -> Iterator[Participant]:
+        return (Participant(*row) for row in zip(*(self.columns[field] for field in self.FIELDS)))
+
+    def to_json(self) -> Dict[str, Any]:
+        """JSON-safe form for the session and the study_searches table"""
+        return {"version": SERIALIZATION_VERSION, "columns": self.columns}
+
+    @classmethod
+    def from_json(cls, data) -> "ParticipantBatch":
+        """Load to_json output, or the list of per-participant dicts stored before it existed"""
+        if data is None:
+            return cls()
+        if isinstance(data, list):
+            return cls.from_participants(Participant.from_dict(item) for item in data)
+        stored = data["columns"]
+        size = len(next(iter(stored.values()), []))
+        # Fields added in later versions read as their default
+        defaults = Participant().to_dict()
+        return cls({field: stored.get(field) or [defaults[field]] * size for field in cls.FIELDS})
+
+
+def results_to_json(results: Dict[str, Any]) -> Dict[str, Any]:
+    """Search results with their ParticipantBatch in its JSON form"""
+    return {**results, "participants": results["participants"].to_json()}
+
+
+def results_from_json(data: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """Inverse of results_to_json; also reads results stored as per-participant dicts"""
+    if data is None:
+        return None
+    return {**data, "participants": ParticipantBatch.from_json(data.get("participants"))}
@@ -0,0 +1,216 @@
+import atexit
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from app.agents.email_reply_client import SERVER_SECRET, SERVER_SECRET_HEADER, SERVER_URL
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+SERVER_SCRIPT = os.path.join(PROJECT_ROOT, "app", "agents", "email_reply_server.py")
+LOG_FILE = os.path.join(PROJECT_ROOT, "email_reply_server.log")
+
+MCP_PROTOCOL_VERSION = "2024-11-05"
+
+
+class EmailReplyServerSupervisor:
+    """Runs the email reply MCP server as a supervised child process
+
+    The server is started on a background thread, so callers never block on
+    process start-up. It is considered ready once it has answered the MCP
+    ``initialize`` handshake over streamable HTTP. It is given the shared
+    secret clients must send, through its environment. Its output is written to a
+    log file instead of unread pipes, and it is restarted with exponential
+    backoff if it crashes.
+    """
+
+    def __init__(self, server_script: str = SERVER_SCRIPT, server_url: str = SERVER_URL, log_file: str = LOG_FILE,
+                 ready_timeout: float = 30, max_backoff: float = 60, stable_after: float = 60,
+                 secret: str = SERVER_SECRET):
+        self.server_script = server_script
+        self.server_url = server_url
+        self.secret = secret
+        self.log_file = log_file
+        self.ready_timeout = ready_timeout
+        self.max_backoff = max_backoff
+        self.stable_after = stable_after
+
+        self.process = None
+        self.state = "stopped"  # stopped | starting | ready | backoff
+        self.restart_count = 0
+        self.last_error = None
+
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._ready_event = threading.Event()
+        self._thread = None
+        self._ready_callbacks = []
+        self._log = None
+
+    @property
+    def is_running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    @property
+    def is_ready(self) -> bool:
+        return self._ready_event.is_set()
+
+    def add_ready_callback(self, callback):
+        """Register a callable run every time the server becomes ready (including after restarts)"""
+        with self._lock:
+            if callback not in self._ready_callbacks:
+                self._ready_callbacks.append(callback)
+
+    def start(self) -> str:
+        """Start supervising the server without waiting for it to come up"""
+        with self._lock:
+            if self.is_running:
+                return f"Email reply server is already running ({self.state})"
+
+            self._stop_event.clear()
+            self._ready_event.clear()
+            self.state = "starting"
+            self._thread = threading.Thread(target=self._supervise, name="email-reply-supervisor", daemon=True)
+            self._thread.start()
+        return "Email reply server is starting"
+
+    def stop(self, timeout: float = 5) -> str:
+        """Stop the server and its supervisor"""
+        with self._lock:
+            if not self.is_running:
+                return "Email reply server is not running"
+            self._stop_event.set()
+            thread = self._thread
+
+        self._terminate(timeout)
+        thread.join(timeout=timeout)
+        self.state = "stopped"
+        if self._log and not self._log.closed:
+            self._log.close()
+        return "Email reply server stopped successfully"
+
+    def wait_until_ready(self, timeout: float = None) -> bool:
+        """Block until the server has completed the MCP handshake"""
+        return self._ready_event.wait(timeout)
+
+    def status(self) -> dict:
+        return {
+            "state": self.state,
+            "ready": self.is_ready,
+            "pid": self.process.pid if self.process and self.process.poll() is None else None,
+            "restart_count": self.restart_count,
+            "last_error": self.last_error,
+        }
+
+    def _supervise(self):
+        """Background loop: spawn, wait for readiness, wait for exit, back off, repeat"""
+        failures = 0
+
+        while not self._stop_event.is_set():
+            started_at = time.monotonic()
+            try:
+                self._spawn()
+                if self._wait_for_handshake():
+                    self.state = "ready"
+                    self.last_error = None
+                    self._ready_event.set()
+                    self._run_ready_callbacks()
+                    self.process.wait()
+            except Exception as e:
+                self.last_error = str(e)
+                print(f"Email reply server supervisor error: {e}")
+            finally:
+                self._ready_event.clear()
+                self._terminate()
+
+            if self._stop_event.is_set():
+                break
+
+            # A server that stayed up for a while is not crash-looping
+            if time.monotonic() - started_at >= self.stable_after:
+                failures = 0
+            failures += 1
+            self.restart_count += 1
+            backoff = min(self.max_backoff, 2 ** (failures - 1))
+            exit_code = self.process.returncode if self.process else None
+            print(f"Email reply server exited (code {exit_code}), restarting in {backoff}s")
+            self.state = "backoff"
+            self._stop_event.wait(backoff)
+            self.state = "starting"
+
+    def _spawn(self):
+        if self._log is None or self._log.closed:
+            self._log = open(self.log_file, "a", buffering=1)
+        self.process = subprocess.Popen(
+            [sys.executable, self.server_script],
+            stdin=subprocess.DEVNULL,
+            stdout=self._log,
+            stderr=subprocess.STDOUT,
+            cwd=PROJECT_ROOT,
+            env={**os.environ, "EMAIL_REPLY_SERVER_SECRET": self.secret},
+        )
+
+    def _wait_for_handshake(self) -> bool:
+        """Probe the server with an MCP initialize request until it answers"""
+        body = json.dumps({
+            "jsonrpc": "2.0",
+            "id": 0,
+            "method": "initialize",
+            "params": {
+                "protocolVersion": MCP_PROTOCOL_VERSION,
+                "capabilities": {},
+                "clientInfo": {"name": "linkline-supervisor", "version": "1.0"},
+            },
+        }).encode("utf-8")
+
+        deadline = time.monotonic() + self.ready_timeout
+        delay = 0.05
+        while not self._stop_event.is_set():
+            if self.process.poll() is not None:
+                self.last_error = "Email reply server exited during start-up"
+                return False
+
+            request = urllib.request.Request(self.server_url, data=body, method="POST", headers={
+                "Content-Type": "application/json",
+                "Accept": "application/json, text/event-stream",
+                SERVER_SECRET_HEADER: self.secret,
+            })
+            try:
+                with urllib.request.urlopen(request, timeout=2) as response:
+                    if response.status == 200:
+                        return True
+            except (urllib.error.URLError, ConnectionError, TimeoutError) as e:
+                self.last_error = f"Waiting for MCP initialize response: {e}"
+
+            if time.monotonic() + delay > deadline:
+                self.last_error = "Timed out waiting for MCP initialize response"
+                return False
+            self._stop_event.wait(delay)
+            delay = min(delay * 2, 1)
+        return False
+
+    def _run_ready_callbacks(self):
+        for callback in list(self._ready_callbacks):
+            try:
+                callback()
+            except Exception as e:
+                print(f"Email reply server ready callback failed: {e}")
+
+    def _terminate(self, timeout: float = 5):
+        process = self.process
+        if process is None:
+            return
+        if process.poll() is None:
+            process.terminate()
+            try:
+                process.wait(timeout=timeout)
+            except subprocess.TimeoutExpired:
+                process.kill()
+                process.wait()
+
+
+reply_server_supervisor = EmailReplyServerSupervisor()
+atexit.register(reply_server_supervisor.stop)
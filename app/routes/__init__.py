@@ -1,4 +1,3 @@
-from flask import Blueprint
 from .main import main_bp
 from .study import study_bp
 from .email import email_bp
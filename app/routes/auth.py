@@ -1,29 +1,30 @@
-from flask import Blueprint, request, jsonify, redirect, url_for, session
+from flask import Blueprint, g, request, jsonify, redirect, url_for, session
 from google_auth_oauthlib.flow import Flow
-from google.oauth2.credentials import Credentials
+from app.agents.email_reply_client import email_reply_client_pool
+from app.auth_middleware import forget_credentials
+from app.executors import run_blocking
+from app.reply_supervisor import reply_server_supervisor
+from app.token_manager import add_refresh_listener, credentials_to_dict, load_client_config, sender_address
 import datetime
 import os
-import sys
-import subprocess
-import time
 
 auth_bp = Blueprint('auth', __name__)
 
 os.environ['OAUTHLIB_INSECURE_TRANSPORT'] = '1'
-GOOGLE_CLIENT_SECRETS_FILE = "credentials.json"
-SCOPES = ["https://www.googleapis.com/auth/gmail.send"]
+# openid and email identify the sending account, so "already contacted" is tracked per account
+SCOPES = [
+    "https://www.googleapis.com/auth/gmail.send",
+    "openid",
+    "https://www.googleapis.com/auth/userinfo.email",
+]
 
-# Global variable to track email reply server process
-email_reply_server_process = None
-email_reply_server_active = False
-
-# Server start time to track restarts
-SERVER_START_TIME = datetime.datetime.now()
+# Latest Gmail credentials handed to the email reply server
+email_reply_server_credentials = None
 
 @auth_bp.route("/start_auth", methods=["GET", "POST"])
 def start_auth():
-    flow = Flow.from_client_secrets_file(
-        GOOGLE_CLIENT_SECRETS_FILE,
+    flow = Flow.from_client_config(
+        load_client_config(),
         scopes=SCOPES,
         redirect_uri=url_for('auth.oauth2callback', _external=True)
     )
@@ -37,33 +38,31 @@ def start_auth():
     return redirect(auth_url)
 
 @auth_bp.route('/oauth2callback')
-def oauth2callback():
+async def oauth2callback():
     state = session['state']
-    flow = Flow.from_client_secrets_file(
-        GOOGLE_CLIENT_SECRETS_FILE,
+    flow = Flow.from_client_config(
+        load_client_config(),
         scopes=SCOPES,
         state=state,
         redirect_uri=url_for('auth.oauth2callback', _external=True)
     )
-    flow.fetch_token(authorization_response=request.url)
+    await run_blocking('auth', flow.fetch_token, authorization_response=request.url)
     credentials = flow.credentials
     
     # Store credentials with timestamp
     session['credentials'] = {
-        'token': credentials.token,
-        'refresh_token': credentials.refresh_token,
-        'token_uri': credentials.token_uri,
-        'client_id': credentials.client_id,
-        'client_secret': credentials.client_secret,
-        'scopes': credentials.scopes,
+        **credentials_to_dict(credentials),
         'auth_time': datetime.datetime.now().isoformat()
     }
+    session['gmail_sender'] = sender_address(credentials)
     
     # Redirect back to results page
     return redirect(url_for('main.index'))
 
 @auth_bp.route("/logout")
 def logout():
+    forget_credentials(getattr(session, 'sid', None))
+    
     # Alternative way to remove specific keys
     if 'credentials' in session:
         del session['credentials']
@@ -79,111 +78,69 @@ def logout():
 @auth_bp.route("/status")
 def auth_status():
     """Check authentication status"""
-    credentials = get_gmail_credentials_from_session()
-    is_authenticated = credentials is not None
+    is_authenticated = g.authenticated
     
     return jsonify({
         "authenticated": is_authenticated,
         "auth_url": url_for('auth.start_auth', _external=True) if not is_authenticated else None
     })
 
-def get_gmail_credentials_from_session():
-    """Get Gmail credentials from session, checking for expiration"""
-    creds_dict = session.get('credentials')
-    if not creds_dict:
-        return None
-    
-    # Check if credentials are from before server restart
-    if 'auth_time' in creds_dict:
-        try:
-            auth_time = datetime.datetime.fromisoformat(creds_dict['auth_time'])
-            if auth_time < SERVER_START_TIME:
-                # Credentials are from before server restart, clear them
-                session.pop('credentials', None)
-                return None
-        except (ValueError, TypeError):
-            # Invalid timestamp format, clear credentials
-            session.pop('credentials', None)
-            return None
-    else:
-        # Old format credentials without timestamp, clear them
-        session.pop('credentials', None)
-        return None
-    
-    try:
-        return Credentials(
-            creds_dict['token'],
-            refresh_token=creds_dict.get('refresh_token'),
-            token_uri=creds_dict['token_uri'],
-            client_id=creds_dict['client_id'],
-            client_secret=creds_dict['client_secret'],
-            scopes=creds_dict['scopes']
-        )
-    except (KeyError, TypeError):
-        # Invalid credentials format, clear them
-        session.pop('credentials', None)
-        return None
-
 def start_email_reply_server(credentials):
-    """Start the email reply MCP server in a separate process"""
-    global email_reply_server_process, email_reply_server_active
-    
-    if email_reply_server_active:
-        return "Email reply server is already running"
-    
+    """Start the email reply MCP server in the background
+
+    Returns immediately; the supervisor waits for the MCP handshake and
+    restarts the server if it crashes.
+    """
     try:
-        # Start the MCP server process
-        server_script = os.path.join(os.path.dirname(__file__), "..", "agents", "email_reply_server.py")
-        email_reply_server_process = subprocess.Popen(
-            [sys.executable, server_script],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            stdin=subprocess.PIPE
-        )
-        
-        # Wait a moment for the server to start
-        time.sleep(2)
-        
-        if email_reply_server_process.poll() is None:
-            email_reply_server_active = True
-            return "Email reply server started successfully"
-        else:
-            return "Failed to start email reply server"
-            
+        return reply_server_supervisor.start()
     except Exception as e:
         return f"Error starting email reply server: {str(e)}"
 
 def stop_email_reply_server():
     """Stop the email reply MCP server"""
-    global email_reply_server_process, email_reply_server_active
-    
-    if not email_reply_server_active:
-        return "Email reply server is not running"
-    
     try:
-        if email_reply_server_process:
-            email_reply_server_process.terminate()
-            email_reply_server_process.wait(timeout=5)
-        email_reply_server_active = False
-        return "Email reply server stopped successfully"
+        return reply_server_supervisor.stop()
     except Exception as e:
         return f"Error stopping email reply server: {str(e)}"
 
+def _configure_email_reply_server():
+    """Push the latest Gmail credentials to the reply server, start its listener
+    and tell it a campaign just went out
+
+    Registered as a supervisor ready callback, so it also runs after the
+    server has been restarted.
+    """
+    if not email_reply_server_credentials:
+        return
+    print(email_reply_client_pool.call_tool("initialize_gmail", {"credentials_dict": email_reply_server_credentials}))
+    print(email_reply_client_pool.call_tool("start_email_listener"))
+    print(email_reply_client_pool.call_tool("notify_campaign_sent"))
+
+reply_server_supervisor.add_ready_callback(_configure_email_reply_server)
+
+def _share_refreshed_credentials(credentials):
+    """Hand a refreshed access token to the reply server if it runs on the same grant"""
+    global email_reply_server_credentials
+    if not email_reply_server_credentials:
+        return
+    if email_reply_server_credentials.get('refresh_token') != credentials.refresh_token:
+        return
+    email_reply_server_credentials = credentials_to_dict(credentials)
+    if reply_server_supervisor.is_ready:
+        print(email_reply_client_pool.call_tool("initialize_gmail", {"credentials_dict": email_reply_server_credentials}))
+
+add_refresh_listener(_share_refreshed_credentials)
+
 def initialize_email_reply_server(credentials):
     """Initialize the email reply server with Gmail credentials"""
+    global email_reply_server_credentials
     try:
         # Convert credentials to dict format for MCP server
-        creds_dict = {
-            'token': credentials.token,
-            'refresh_token': credentials.refresh_token,
-            'token_uri': credentials.token_uri,
-            'client_id': credentials.client_id,
-            'client_secret': credentials.client_secret,
-            'scopes': credentials.scopes
-        }
+        email_reply_server_credentials = credentials_to_dict(credentials)
         
-        # Here you would typically communicate with the MCP server
-        # For now, we'll just start the server and it will initialize when needed
+        if reply_server_supervisor.is_ready:
+            _configure_email_reply_server()
+            return "Email reply server updated with new credentials"
         return start_email_reply_server(credentials)
         
     except Exception as e:
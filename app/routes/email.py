@@ -1,20 +1,55 @@
-from flask import Blueprint, request, jsonify, session, url_for
-from app.agents.compose_email import compose_recruitment_email
+from flask import Blueprint, Response, g, request, jsonify, session, stream_with_context, url_for
+from app.admission import (
+    AdmissionRejected,
+    admission_controlled,
+    coalesce_duplicates,
+    compose_admission,
+    current_user_key,
+    send_admission,
+    too_many_requests,
+)
+from app.agents.compose_email import COMPOSE_MODES, compose_recruitment_email, stream_recruitment_email
+from app.db.models import get_study_draft, mark_participants_contacted, save_study_draft
+from app.participant_index import flag_contacted
+from app.executors import run_blocking
 from app.gmail_service import GmailService
-from .auth import get_gmail_credentials_from_session, initialize_email_reply_server
+from app.participants import results_from_json
+from app.study_jobs import get_speculative_draft, wait_for_speculative_draft
+from app.token_manager import persist_credentials, refresh_if_expiring
+from google.auth.exceptions import RefreshError
+import json
+from .auth import initialize_email_reply_server
 
 email_bp = Blueprint('email', __name__)
 
+def _compose_request_key():
+    options = request.get_json(silent=True) or {}
+    return session.get('study_description'), options.get('mode', 'full'), bool(options.get('regenerate', False))
+
 @email_bp.route("/compose-email", methods=["POST"])
-def compose_email():
+@coalesce_duplicates(_compose_request_key)
+@admission_controlled(compose_admission)
+async def compose_email():
     """Generate email draft using Crew AI"""
     try:
         study_description = session.get('study_description')
         if not study_description:
             return jsonify({"error": "Study description not found"}), 400
         
-        # Generate email draft using Crew AI
-        email_content = compose_recruitment_email(study_description)
+        options = request.get_json(silent=True) or {}
+        mode = options.get('mode', 'full')
+        if mode not in COMPOSE_MODES:
+            return jsonify({"error": f"Unknown compose mode: {mode}"}), 400
+        
+        # Use the draft composed alongside the search, waiting for it if still running
+        regenerate = bool(options.get('regenerate', False))
+        email_content = None if regenerate else await wait_for_speculative_draft(session.get('study_id'), mode)
+        
+        # Generate email draft using Crew AI; drafts are cached unless a regenerate is requested
+        if email_content is None:
+            email_content = await run_blocking(
+                'llm', compose_recruitment_email, study_description, mode=mode, regenerate=regenerate
+            )
         
         # Store email draft in session
         session['email_draft'] = email_content
@@ -27,6 +62,57 @@ def compose_email():
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@email_bp.route("/compose-email/stream", methods=["POST"])
+@coalesce_duplicates(_compose_request_key)
+def compose_email_stream():
+    """Stream an email draft to the browser as server-sent events"""
+    study_description = session.get('study_description')
+    if not study_description:
+        return jsonify({"error": "Study description not found"}), 400
+    
+    options = request.get_json(silent=True) or {}
+    mode = options.get('mode', 'full')
+    if mode not in COMPOSE_MODES:
+        return jsonify({"error": f"Unknown compose mode: {mode}"}), 400
+    regenerate = bool(options.get('regenerate', False))
+    
+    try:
+        ticket = compose_admission.acquire(current_user_key())
+    except AdmissionRejected as e:
+        return too_many_requests(e)
+    
+    # The session cookie is sent before the body streams, so point the
+    # session at the study's stored draft, which the stream fills in with
+    # whatever draft it finishes with, fallback included
+    session.pop('email_draft', None)
+    session['email_draft_mode'] = mode
+    
+    study_id = session.get('study_id')
+    
+    def generate():
+        events = stream_recruitment_email(study_description, mode=mode, regenerate=regenerate)
+        if not regenerate:
+            yield f"event: stage\ndata: {json.dumps('drafting')}\n\n"
+            draft = get_speculative_draft(study_id, mode)
+            if draft is not None:
+                events = [("delta", draft), ("done", draft)]
+            else:
+                # The drafting stage was announced above, while the speculative draft was awaited
+                events = (item for item in events if item != ("stage", "drafting"))
+        for event, data in events:
+            if event == "done" and study_id is not None:
+                save_study_draft(study_id, mode, data)
+            yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
+    
+    response = Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+    # Released when the stream ends or the client disconnects
+    response.call_on_close(ticket.release)
+    return response
+
 @email_bp.route("/save-email", methods=["POST"])
 def save_email():
     """Save the edited email draft"""
@@ -47,12 +133,16 @@ def save_email():
         return jsonify({"error": str(e)}), 500
 
 @email_bp.route("/send-emails", methods=["POST"])
-def send_emails():
-    credentials = get_gmail_credentials_from_session()
+@coalesce_duplicates(lambda: (
+    session.get('study_id'), bool((request.get_json(silent=True) or {}).get('include_contacted', False))
+))
+@admission_controlled(send_admission)
+async def send_emails():
+    credentials = g.credentials
     if not credentials:
         return jsonify({"auth_required": True, "auth_url": url_for('auth.start_auth', _external=True)}), 401
     results = session.get('search_results')
-    email_draft = session.get('email_draft')
+    email_draft = session.get('email_draft') or get_study_draft(session.get('study_id'), session.get('email_draft_mode'))
     if not results or not email_draft:
         return jsonify({"error": "Missing search results or email draft"}), 400
     # Extract subject line from email draft (first line after "Subject:")
@@ -67,21 +157,38 @@ def send_emails():
     else:
         # If no subject line found, use the entire draft as body
         email_body = email_draft
-    # Send emails to participants with valid email addresses using GmailService
-    participants = results.get('participants', [])
+    # Send emails to participants with valid email addresses using GmailService,
+    # skipping anyone this Gmail account emailed for an earlier study unless asked not to
+    sender = session.get('gmail_sender')
+    found = flag_contacted(results_from_json(results)['participants'], sender)
+    include_contacted = bool((request.get_json(silent=True) or {}).get('include_contacted', False))
+    participants = [p for p in found if include_contacted or not p.contacted_before]
+    skipped_count = len(found) - len(participants)
+    try:
+        # Refresh ahead of expiry so the sends don't each hit an expired token
+        await run_blocking('auth', refresh_if_expiring, credentials)
+    except RefreshError:
+        return jsonify({"auth_required": True, "auth_url": url_for('auth.start_auth', _external=True)}), 401
     try:
-        send_results = GmailService.send_bulk_emails_with_credentials(credentials, participants, subject, email_body)
+        send_results = await run_blocking(
+            'gmail', GmailService.send_bulk_emails_with_credentials, credentials, participants, subject, email_body
+        )
         session['email_sent'] = True
+        persist_credentials(credentials)
+        if sender:
+            mark_participants_contacted([p.participant_id for p in send_results['sent'] if p.participant_id], sender)
         
         # Start email reply server after successfully sending emails
-        email_reply_status = initialize_email_reply_server(credentials)
+        email_reply_status = await run_blocking('gmail', initialize_email_reply_server, credentials)
         
         return jsonify({
             "success": True,
             "sent_count": send_results['sent_count'],
             "failed_count": send_results['failed_count'],
+            "skipped_count": skipped_count,
             "errors": send_results['errors'],
-            "message": f"Successfully sent {send_results['sent_count']} emails. {send_results['failed_count']} failed.",
+            "message": f"Successfully sent {send_results['sent_count']} emails. {send_results['failed_count']} failed."
+                       + (f" {skipped_count} already contacted from this account for an earlier study." if skipped_count else ""),
             "email_reply_server": email_reply_status
         })
     except Exception as e:
@@ -1,40 +1,12 @@
-from flask import Blueprint, render_template, redirect, url_for, session
-import datetime
+from flask import Blueprint, g, render_template, redirect, url_for, session
+from app.participant_index import flag_contacted
+from app.participants import results_from_json
 
 main_bp = Blueprint('main', __name__)
 
-# Server start time to track restarts
-SERVER_START_TIME = datetime.datetime.now()
-
-def check_authentication():
-    """Check if user is authenticated with valid credentials"""
-    credentials = session.get('credentials')
-    if not credentials:
-        return False, "not_authenticated"
-    
-    # Check if credentials are from before server restart
-    if 'auth_time' in credentials:
-        try:
-            auth_time = datetime.datetime.fromisoformat(credentials['auth_time'])
-            if auth_time < SERVER_START_TIME:
-                # Credentials are from before server restart, clear them
-                session.pop('credentials', None)
-                return False, "server_restart"
-        except (ValueError, TypeError):
-            # Invalid timestamp format, clear credentials
-            session.pop('credentials', None)
-            return False, "invalid_format"
-    else:
-        # Old format credentials without timestamp, clear them
-        session.pop('credentials', None)
-        return False, "invalid_format"
-    
-    return True, None
-
 @main_bp.route("/")
 def index():
-    is_authenticated, auth_reason = check_authentication()
-    if is_authenticated:
+    if g.authenticated:
         credentials = session.get("credentials")
         return render_template("index.html", user=credentials)
     else:
@@ -42,8 +14,7 @@ def index():
 
 @main_bp.route("/login")
 def login():
-    is_authenticated, auth_reason = check_authentication()
-    if is_authenticated:
+    if g.authenticated:
         return redirect(url_for("main.index"))  # redirect to index if already signed in
 
     return render_template("login.html")
@@ -56,35 +27,17 @@ def show_results():
         # Session expired, redirect to home
         return redirect(url_for('main.index'))
     
-    results = session.get('search_results', None)
+    results = results_from_json(session.get('search_results', None))
+    if results:
+        flag_contacted(results['participants'], session.get('gmail_sender'))
     study_description = session.get('study_description', None)
     email_draft = session.get('email_draft', None)
     email_sent = session.get('email_sent', False)
-    credentials = session.get('credentials', None)
-    
-    # Check if user is authenticated and credentials are valid
-    is_authenticated = False
-    auth_needed_reason = None
-    
-    if credentials:
-        # Check if credentials are from before server restart
-        if 'auth_time' in credentials:
-            auth_time = datetime.datetime.fromisoformat(credentials['auth_time'])
-            if auth_time < SERVER_START_TIME:
-                # Credentials are from before server restart, clear them
-                session.pop('credentials', None)
-                auth_needed_reason = "server_restart"
-            else:
-                is_authenticated = True
-        else:
-            # Old format credentials without timestamp, clear them
-            session.pop('credentials', None)
-            auth_needed_reason = "invalid_format"
     
     return render_template("results.html", 
                          results=results, 
                          study_description=study_description,
                          email_draft=email_draft,
                          email_sent=email_sent,
-                         is_authenticated=is_authenticated,
-                         auth_needed_reason=auth_needed_reason) 
\ No newline at end of file
+                         is_authenticated=g.authenticated,
+                         auth_needed_reason=None if g.auth_reason == "not_authenticated" else g.auth_reason) 
\ No newline at end of file
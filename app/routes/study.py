@@ -1,66 +1,193 @@
-from flask import Blueprint, request, jsonify, session, redirect, url_for
-from app.agents.exa_agent import search_participants
+from flask import Blueprint, Response, g, request, jsonify, session, url_for
+from app.admission import AdmissionRejected, coalesce_duplicates, current_user_key, study_admission, too_many_requests
+from app.agents.exa_agent import DEFAULT_SEARCH_ENRICHMENTS
+from app.enrichment import ENRICHMENT_TIMEOUT, EnrichmentUnavailable, enrich_study, missing_fields, unknown_enrichments
+from app.participant_index import flag_contacted
+from app.participants import ParticipantBatch, results_from_json
+from app.study_jobs import cancel_study, get_study_status, start_study
+import asyncio
+import csv
 import datetime
+import io
 
 study_bp = Blueprint('study', __name__)
 
-# Server start time to track restarts
-SERVER_START_TIME = datetime.datetime.now()
+def _authentication_required():
+    return jsonify({
+        "error": "Authentication required",
+        "auth_required": True,
+        "auth_reason": g.auth_reason,
+        "auth_url": url_for('auth.start_auth', _external=True)
+    }), 401
 
-def check_authentication():
-    """Check if user is authenticated with valid credentials"""
-    credentials = session.get('credentials')
-    if not credentials:
-        return False, "not_authenticated"
-    
-    # Check if credentials are from before server restart
-    if 'auth_time' in credentials:
-        try:
-            auth_time = datetime.datetime.fromisoformat(credentials['auth_time'])
-            if auth_time < SERVER_START_TIME:
-                # Credentials are from before server restart, clear them
-                session.pop('credentials', None)
-                return False, "server_restart"
-        except (ValueError, TypeError):
-            # Invalid timestamp format, clear credentials
-            session.pop('credentials', None)
-            return False, "invalid_format"
-    else:
-        # Old format credentials without timestamp, clear them
-        session.pop('credentials', None)
-        return False, "invalid_format"
-    
-    return True, None
+def _submit_request_key():
+    return request.form.get('description'), tuple(sorted(request.form.getlist('enrichments')))
 
 @study_bp.route("/submit", methods=["POST"])
+@coalesce_duplicates(_submit_request_key)
 def submit_study():
-    """Handle study submission and start search"""
+    """Handle study submission and start the search in the background
+
+    Returns immediately with the study id; the browser polls /study/status
+    until the search finishes.
+    """
     # Check authentication first
-    is_authenticated, auth_reason = check_authentication()
-    if not is_authenticated:
-        return jsonify({
-            "error": "Authentication required",
-            "auth_required": True,
-            "auth_reason": auth_reason
-        }), 401
+    if not g.authenticated:
+        return _authentication_required()
     
     try:
         description = request.form.get('description')
         if not description:
             return jsonify({"error": "Study description is required"}), 400
+        enrichments = request.form.getlist('enrichments') or DEFAULT_SEARCH_ENRICHMENTS
+        unknown = unknown_enrichments(enrichments)
+        if unknown:
+            return jsonify({"error": f"Unknown enrichments: {', '.join(unknown)}"}), 400
         
-        # Start the search process
-        results = search_participants(description)
+        # The slot is held until the background search finishes, not just for this request
+        try:
+            ticket = study_admission.acquire(current_user_key())
+        except AdmissionRejected as e:
+            return too_many_requests(e)
         
-        # Store results and study description in session for the results page
-        session['search_results'] = results
-        session['study_description'] = description
-        session['search_time'] = datetime.datetime.now().isoformat()
+        # Start the search, drafting the recruitment email alongside it
+        try:
+            job = start_study(
+                description, token=request.form.get('study_token'), enrichments=enrichments,
+                owner=current_user_key()
+            )
+        except Exception:
+            ticket.release()
+            raise
+        job.search_future.add_done_callback(lambda _future: ticket.release())
+        session['pending_study'] = {"id": job.study_id, "description": description}
         
         return jsonify({
             "success": True,
-            "redirect": "/results"
-        })
+            "study_id": job.study_id,
+            "status_url": url_for('study.study_status', study_id=job.study_id)
+        }), 202
         
     except Exception as e:
-        return jsonify({"error": str(e)}), 500 
\ No newline at end of file
+        return jsonify({"error": str(e)}), 500
+
+@study_bp.route("/status/<int:study_id>", methods=["GET"])
+def study_status(study_id):
+    """Report a background search and hand its results to the results page when done"""
+    pending = session.get('pending_study')
+    if not pending or pending.get('id') != study_id:
+        return jsonify({"error": "Study not found"}), 404
+    
+    status, results, error = get_study_status(study_id)
+    if status == "running":
+        return jsonify({"status": status})
+    if status == "cancelled":
+        session.pop('pending_study', None)
+        return jsonify({"error": "Search was cancelled", "cancelled": True}), 409
+    if status != "done":
+        session.pop('pending_study', None)
+        return jsonify({"error": error or "Search failed"}), 500
+    
+    # Store results and study description in session for the results page
+    session.pop('pending_study', None)
+    session['search_results'] = results
+    session['study_description'] = pending['description']
+    session['study_id'] = study_id
+    session['search_time'] = datetime.datetime.now().isoformat()
+    session.pop('email_draft', None)
+    session.pop('email_draft_mode', None)
+    
+    return jsonify({
+        "status": status,
+        "success": True,
+        "redirect": "/results"
+    })
+
+@study_bp.route("/cancel", methods=["POST"])
+def cancel_study_search():
+    """Cancel an in-flight study search and its speculative email draft"""
+    study_token = request.form.get('study_token') or (request.get_json(silent=True) or {}).get('study_token')
+    if not study_token:
+        return jsonify({"error": "Study token is required"}), 400
+    
+    # Tokens come from the browser, so only the session that submitted the study may cancel it
+    return jsonify({"success": True, "cancelled": cancel_study(study_token, owner=current_user_key())})
+
+async def _ensure_enrichments(participants, enrichments):
+    """Enrich the session's study if the given participants are missing any of the details
+
+    Returns the updated results, or an error response tuple.
+    """
+    if not missing_fields(participants, enrichments):
+        return results_from_json(session['search_results'])
+    try:
+        # Shielded so a timed-out request leaves the shared enrichment running
+        results_json = await asyncio.wait_for(
+            asyncio.shield(asyncio.wrap_future(enrich_study(session.get('study_id'), enrichments))),
+            ENRICHMENT_TIMEOUT
+        )
+    except asyncio.TimeoutError:
+        return jsonify({"error": "Enrichment is still running, try again shortly"}), 504
+    except EnrichmentUnavailable as e:
+        return jsonify({"error": str(e)}), 404
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+    session['search_results'] = results_json
+    return results_from_json(results_json)
+
+@study_bp.route("/participants/<int:participant_id>/enrich", methods=["POST"])
+async def enrich_participant(participant_id):
+    """Look up contact details for one participant that the search didn't request"""
+    # Enrichment spends Exa credits, so it is limited to signed-in researchers
+    if not g.authenticated:
+        return _authentication_required()
+    results = results_from_json(session.get('search_results'))
+    if not results:
+        return jsonify({"error": "No search results"}), 400
+    participants = results['participants']
+    enrichments = (request.get_json(silent=True) or {}).get('enrichments') or [
+        name for name in ('email', 'phone') if name not in results.get('enrichments', [])
+    ]
+    unknown = unknown_enrichments(enrichments)
+    if unknown:
+        return jsonify({"error": f"Unknown enrichments: {', '.join(unknown)}"}), 400
+    
+    ids = participants.column('participant_id')
+    if participant_id not in ids:
+        return jsonify({"error": "Participant not found"}), 404
+    participant = participants[ids.index(participant_id)]
+    
+    results = await _ensure_enrichments(ParticipantBatch.from_participants([participant]), enrichments)
+    if isinstance(results, tuple):
+        return results
+    participants = results['participants']
+    return jsonify(participants[participants.column('participant_id').index(participant_id)].to_dict())
+
+@study_bp.route("/export.csv", methods=["GET"])
+async def export_participants():
+    """Download the results as CSV, enriching them first with any ?enrich= details"""
+    if not g.authenticated:
+        return _authentication_required()
+    results = results_from_json(session.get('search_results'))
+    if not results:
+        return jsonify({"error": "No search results"}), 400
+    enrichments = request.args.getlist('enrich')
+    unknown = unknown_enrichments(enrichments)
+    if unknown:
+        return jsonify({"error": f"Unknown enrichments: {', '.join(unknown)}"}), 400
+    
+    results = await _ensure_enrichments(results['participants'], enrichments)
+    if isinstance(results, tuple):
+        return results
+    
+    fields = ['name', 'email', 'phone', 'linkedin', 'contacted_before']
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(fields)
+    participants = flag_contacted(results['participants'], session.get('gmail_sender'))
+    writer.writerows(zip(*(participants.column(field) for field in fields)))
+    return Response(
+        output.getvalue(),
+        mimetype='text/csv',
+        headers={'Content-Disposition': f'attachment; filename=study-{session.get("study_id")}-participants.csv'}
+    )
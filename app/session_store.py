@@ -0,0 +1,197 @@
+import datetime
+import os
+import random
+import secrets
+import time
+
+import click
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SessionInterface, SessionMixin
+from itsdangerous import BadSignature, Signer
+from werkzeug.datastructures import CallbackDict
+from app.db.models import (
+    delete_session_data,
+    get_deployment_value,
+    get_session_data,
+    purge_expired_sessions,
+    set_deployment_value,
+    store_session_data,
+)
+
+# "sqlite" (the default) or a redis:// URL
+SESSION_STORE = os.getenv("SESSION_STORE", "sqlite")
+
+AUTH_EPOCH_KEY = "auth_epoch"
+
+# How long a worker reuses the auth epoch before reading it from the store again;
+# other workers see invalidate_sessions within this many seconds
+AUTH_EPOCH_CACHE_SECONDS = float(os.getenv("AUTH_EPOCH_CACHE_SECONDS", "10"))
+
+# Chance that a session write also purges expired SQLite sessions
+PURGE_PROBABILITY = 0.01
+
+
+class SQLiteSessionBackend:
+    """Sessions and deployment state in the app's SQLite database"""
+
+    def load(self, sid):
+        return get_session_data(sid)
+
+    def save(self, sid, data, ttl):
+        store_session_data(sid, data, time.time() + ttl)
+        if random.random() < PURGE_PROBABILITY:
+            purge_expired_sessions()
+
+    def delete(self, sid):
+        delete_session_data(sid)
+
+    def get_value(self, key):
+        return get_deployment_value(key)
+
+    def set_value(self, key, value, replace=True):
+        set_deployment_value(key, value, replace=replace)
+
+
+class RedisSessionBackend:
+    """Sessions and deployment state in Redis, for deployments spanning several nodes"""
+
+    def __init__(self, url, prefix="linkline:"):
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError("SESSION_STORE is a Redis URL but the redis package is not installed") from e
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def load(self, sid):
+        data = self.client.get(f"{self.prefix}session:{sid}")
+        return data.decode("utf-8") if data is not None else None
+
+    def save(self, sid, data, ttl):
+        self.client.setex(f"{self.prefix}session:{sid}", int(ttl), data)
+
+    def delete(self, sid):
+        self.client.delete(f"{self.prefix}session:{sid}")
+
+    def get_value(self, key):
+        value = self.client.get(f"{self.prefix}{key}")
+        return value.decode("utf-8") if value is not None else None
+
+    def set_value(self, key, value, replace=True):
+        self.client.set(f"{self.prefix}{key}", value, nx=not replace)
+
+
+def create_session_backend(store=SESSION_STORE):
+    if store.startswith(("redis://", "rediss://", "unix://")):
+        return RedisSessionBackend(store)
+    if store == "sqlite":
+        return SQLiteSessionBackend()
+    raise ValueError(f"Unknown SESSION_STORE: {store}")
+
+
+session_backend = create_session_backend()
+
+
+_epoch_cache = (None, 0.0)  # (epoch, time.monotonic() when it was read)
+
+
+def auth_epoch():
+    """Credentials issued before this time are invalid on every worker and node
+
+    The epoch is created the first time any worker asks for it and only moves
+    when invalidate_sessions is called, so restarts and new workers no
+    longer log users out. Each worker caches it for AUTH_EPOCH_CACHE_SECONDS
+    rather than reading the store on every request.
+    """
+    global _epoch_cache
+    epoch, read_at = _epoch_cache
+    if epoch is not None and time.monotonic() - read_at < AUTH_EPOCH_CACHE_SECONDS:
+        return epoch
+    value = session_backend.get_value(AUTH_EPOCH_KEY)
+    if value is None:
+        session_backend.set_value(AUTH_EPOCH_KEY, datetime.datetime.now().isoformat(), replace=False)
+        value = session_backend.get_value(AUTH_EPOCH_KEY)
+    epoch = datetime.datetime.fromisoformat(value)
+    _epoch_cache = (epoch, time.monotonic())
+    return epoch
+
+
+def invalidate_sessions():
+    """Move the epoch to now, logging out every user"""
+    global _epoch_cache
+    epoch = datetime.datetime.now()
+    session_backend.set_value(AUTH_EPOCH_KEY, epoch.isoformat())
+    _epoch_cache = (epoch, time.monotonic())
+    return epoch
+
+
+class ServerSideSession(CallbackDict, SessionMixin):
+    def __init__(self, initial=None, sid=None, new=False):
+        def on_update(self):
+            self.modified = True
+
+        CallbackDict.__init__(self, initial, on_update)
+        self.sid = sid
+        self.new = new
+        self.modified = False
+
+
+class ServerSideSessionInterface(SessionInterface):
+    """Keeps session data in the session backend; the cookie only carries a signed session id"""
+
+    serializer = TaggedJSONSerializer()
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    def _signer(self, app):
+        return Signer(app.secret_key, salt="linkline-session")
+
+    def open_session(self, app, request):
+        cookie = request.cookies.get(self.get_cookie_name(app))
+        if cookie:
+            try:
+                sid = self._signer(app).unsign(cookie).decode("utf-8")
+            except BadSignature:
+                sid = None
+            data = self.backend.load(sid) if sid else None
+            if data is not None:
+                return ServerSideSession(self.serializer.loads(data), sid=sid)
+        return ServerSideSession(sid=secrets.token_urlsafe(32), new=True)
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+
+        if not session:
+            if session.modified and not session.new:
+                self.backend.delete(session.sid)
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+
+        if session.modified or session.new:
+            ttl = app.permanent_session_lifetime.total_seconds()
+            self.backend.save(session.sid, self.serializer.dumps(dict(session)), ttl)
+
+        if self.should_set_cookie(app, session) or session.new:
+            response.set_cookie(
+                name,
+                self._signer(app).sign(session.sid).decode("utf-8"),
+                expires=self.get_expiration_time(app, session),
+                httponly=self.get_cookie_httponly(app),
+                domain=domain,
+                path=path,
+                secure=self.get_cookie_secure(app),
+                samesite=self.get_cookie_samesite(app),
+            )
+
+
+def init_session_store(app):
+    """Use the shared session store for the app and register its CLI commands"""
+    app.session_interface = ServerSideSessionInterface(session_backend)
+
+    @app.cli.command("invalidate-sessions")
+    def invalidate_sessions_command():
+        """Log out every user on every worker"""
+        click.echo(f"Credentials issued before {invalidate_sessions().isoformat()} are now invalid")
@@ -1,7 +1,20 @@
+const STATUS_POLL_INTERVAL_MS = 2000;
+
 document.addEventListener('DOMContentLoaded', function () {
     const form = document.getElementById('research-form');
     const submitBtn = document.getElementById('submit-btn');
     const loadingScreen = document.getElementById('loading-screen');
+    const cancelBtn = document.getElementById('cancel-btn');
+    let studyToken = null;
+
+    cancelBtn.addEventListener('click', function () {
+        if (!studyToken) return;
+        cancelBtn.disabled = true;
+        const formData = new FormData();
+        formData.append('study_token', studyToken);
+        fetch('study/cancel', { method: 'POST', body: formData })
+            .catch(error => console.error('Error cancelling search:', error));
+    });
 
     form.addEventListener('submit', function (e) {
         e.preventDefault();
@@ -17,11 +30,17 @@ document.addEventListener('DOMContentLoaded', function () {
         submitBtn.disabled = true;
         submitBtn.textContent = 'Searching...';
 
-        // Create form data
+        // Create form data; the token lets the search be cancelled while it runs
+        studyToken = crypto.randomUUID();
+        cancelBtn.disabled = false;
         const formData = new FormData();
         formData.append('description', description);
+        formData.append('study_token', studyToken);
+        // Details left unchecked can still be looked up from the results page
+        document.querySelectorAll('input[name="enrichments"]:checked')
+            .forEach(input => formData.append('enrichments', input.value));
 
-        // Send AJAX request
+        // Start the search, then poll until it finishes
         fetch('study/submit', {
             method: 'POST',
             body: formData
@@ -34,6 +53,12 @@ document.addEventListener('DOMContentLoaded', function () {
                 }
                 return response.json();
             })
+            .then(data => {
+                if (data && data.success && data.status_url) {
+                    return pollStudyStatus(data.status_url);
+                }
+                return data;
+            })
             .then(data => {
                 // Hide loading screen
                 loadingScreen.style.display = 'none';
@@ -43,6 +68,8 @@ document.addEventListener('DOMContentLoaded', function () {
                 if (data && data.success) {
                     // Redirect to results page
                     window.location.href = data.redirect;
+                } else if (data && data.cancelled) {
+                    return;
                 } else if (data) {
                     showError(data.error || 'An error occurred while searching for participants');
                 }
@@ -58,6 +85,13 @@ document.addEventListener('DOMContentLoaded', function () {
             });
     });
 
+    function pollStudyStatus(statusUrl) {
+        return new Promise(resolve => setTimeout(resolve, STATUS_POLL_INTERVAL_MS))
+            .then(() => fetch(statusUrl))
+            .then(response => response.json())
+            .then(data => data.status === 'running' ? pollStudyStatus(statusUrl) : data);
+    }
+
     function showError(message) {
         // Remove any existing error messages
         const existingError = document.querySelector('.error-message');
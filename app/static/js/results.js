@@ -1,29 +1,79 @@
-function composeEmail() {
+const COMPOSE_STAGE_LABELS = {
+    drafting: 'Analyzing study and drafting email...',
+    editing: 'Polishing draft...'
+};
+
+function composeEmail(regenerate = false) {
     const modal = document.getElementById('emailModal');
     const loading = document.getElementById('emailLoading');
+    const loadingText = loading.querySelector('p');
     const form = document.getElementById('emailForm');
+    const textarea = document.getElementById('emailContent');
     modal.style.display = 'block';
     loading.style.display = 'block';
+    loadingText.textContent = 'Generating email draft...';
     form.style.display = 'none';
+    textarea.value = '';
 
-    fetch('email/compose-email', {
+    // Show the form as soon as the first token arrives
+    function showDraft() {
+        loading.style.display = 'none';
+        form.style.display = 'block';
+    }
+
+    function handleEvent(event, data) {
+        if (event === 'stage') {
+            loadingText.textContent = COMPOSE_STAGE_LABELS[data] || loadingText.textContent;
+        } else if (event === 'delta') {
+            showDraft();
+            textarea.value += data;
+            textarea.scrollTop = textarea.scrollHeight;
+        } else if (event === 'error') {
+            console.error('Error composing email:', data);
+        } else if (event === 'done') {
+            showDraft();
+            textarea.value = data;
+        }
+    }
+
+    fetch('email/compose-email/stream', {
         method: 'POST',
-        headers: { 'Content-Type': 'application/json' }
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({
+            regenerate: regenerate,
+            mode: document.getElementById('composeMode').value
+        })
     })
-        .then(res => res.json())
-        .then(data => {
-            loading.style.display = 'none';
-            form.style.display = 'block';
-            if (data.success) {
-                document.getElementById('emailContent').value = data.email_content;
-            } else {
-                alert('Error: ' + data.error);
-                closeModal();
+        .then(async res => {
+            if (!res.ok) {
+                const data = await res.json();
+                throw new Error(data.error);
+            }
+
+            // Parse server-sent events from the response body
+            const reader = res.body.getReader();
+            const decoder = new TextDecoder();
+            let buffer = '';
+            while (true) {
+                const { value, done } = await reader.read();
+                if (done) break;
+                buffer += decoder.decode(value, { stream: true });
+                const messages = buffer.split('\n\n');
+                buffer = messages.pop();
+                messages.forEach(message => {
+                    let event = 'message';
+                    let data = '';
+                    message.split('\n').forEach(line => {
+                        if (line.startsWith('event: ')) event = line.slice(7);
+                        else if (line.startsWith('data: ')) data += line.slice(6);
+                    });
+                    handleEvent(event, JSON.parse(data));
+                });
             }
         })
         .catch(err => {
             loading.style.display = 'none';
-            alert('Error: ' + err);
+            alert('Error: ' + err.message);
             closeModal();
         });
 }
@@ -58,9 +108,11 @@ function sendEmails() {
     const originalText = sendBtn.textContent;
     sendBtn.textContent = 'Sending...';
     sendBtn.disabled = true;
+    const includeContacted = document.getElementById('includeContacted');
     fetch('email/send-emails', {
         method: 'POST',
-        headers: { 'Content-Type': 'application/json' }
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ include_contacted: Boolean(includeContacted && includeContacted.checked) })
     })
         .then(async res => {
             if (res.status === 401) {
@@ -95,6 +147,37 @@ function sendEmails() {
         });
 }
 
+function enrichParticipant(button) {
+    const enrichment = button.dataset.enrichment;
+    const cell = button.parentElement;
+    button.disabled = true;
+    button.textContent = 'Looking up...';
+    fetch(`study/participants/${button.dataset.participantId}/enrich`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ enrichments: [enrichment] })
+    })
+        .then(async res => {
+            const data = await res.json();
+            if (!res.ok) throw new Error(data.error);
+            const value = data[enrichment];
+            if (!value) {
+                cell.textContent = 'Not found';
+                return;
+            }
+            const link = document.createElement('a');
+            link.href = (enrichment === 'phone' ? 'tel:' : 'mailto:') + value;
+            link.className = enrichment === 'phone' ? 'phone-link' : 'email-link';
+            link.textContent = value;
+            cell.replaceChildren(link);
+        })
+        .catch(err => {
+            button.disabled = false;
+            button.textContent = 'Look up';
+            alert('Error: ' + err.message);
+        });
+}
+
 function checkAuthStatus() {
     fetch('/auth/status')
         .then(res => res.json())
@@ -0,0 +1,178 @@
+import asyncio
+import json
+import os
+import threading
+from concurrent.futures import CancelledError
+from app.agents.compose_email import compose_recruitment_email
+from app.agents.exa_agent import DEFAULT_SEARCH_ENRICHMENTS, search_participants_async
+from app.db.models import (
+    create_study, get_study_draft, get_study_search, save_study_draft, save_study_search, save_study_webset
+)
+from app.executors import run_blocking, submit_background
+from app.participant_index import resolve_participants
+from app.participants import results_to_json
+from app.tracing import traced
+
+# Compose mode drafted speculatively while the search runs; empty disables it
+SPECULATIVE_COMPOSE_MODE = os.getenv("SPECULATIVE_COMPOSE_MODE", "full")
+
+_jobs = {}
+_jobs_lock = threading.Lock()
+
+
+class StudyJob:
+    """Participant search and speculative draft composition for one study"""
+
+    def __init__(self, study_id, description, token=None, enrichments=None, owner=None):
+        self.study_id = study_id
+        self.description = description
+        self.token = token
+        self.owner = owner
+        self.enrichments = enrichments or DEFAULT_SEARCH_ENRICHMENTS
+        self.cancel_event = threading.Event()
+        self.search_future = None
+        self.draft_future = None
+
+    @property
+    def cancelled(self):
+        return self.cancel_event.is_set()
+
+    def cancel(self):
+        """Cancel both branches; running work stops at its next checkpoint"""
+        self.cancel_event.set()
+        for future in (self.search_future, self.draft_future):
+            if future is not None:
+                future.cancel()
+
+    def _compose_draft(self, mode):
+        if self.cancelled:
+            return None
+        draft = compose_recruitment_email(self.description, mode=mode)
+        if self.cancelled:
+            return None
+        save_study_draft(self.study_id, mode, draft)
+        return draft
+
+    async def _search(self):
+        try:
+            with traced("study.search", study_id=self.study_id):
+                results = await search_participants_async(self.description, enrichments=self.enrichments)
+                save_study_webset(self.study_id, results.pop("webset_id"), json.dumps(self.enrichments))
+                results["enrichments"] = self.enrichments
+                results["participants"] = resolve_participants(results["participants"], self.study_id)
+                results["total_results"] = len(results["participants"])
+                results_json = json.dumps(results_to_json(results))
+        except asyncio.CancelledError:
+            save_study_search(self.study_id, "cancelled")
+            raise
+        except Exception as e:
+            save_study_search(self.study_id, "failed", error=str(e))
+            raise
+        save_study_search(self.study_id, "done", results_json=results_json)
+        return results
+
+    def _finished(self, _future):
+        if all(f is None or f.done() for f in (self.search_future, self.draft_future)):
+            with _jobs_lock:
+                _jobs.pop(self.study_id, None)
+                if self.token:
+                    _jobs.pop(self.token, None)
+
+
+def start_study(description, token=None, enrichments=None, owner=None):
+    """Create a study and start its search and draft composition in parallel
+
+    Both run on the background event loop and the call returns immediately;
+    the outcome of the search is stored with the study for get_study_status.
+
+    Args:
+        description: The study description
+        token: Optional client-generated id the browser can cancel the study by
+            before it knows the study id
+        enrichments: Enrichment formats the search requests up front
+        owner: Key of the session that started the study; only it may cancel
+    """
+    job = StudyJob(create_study(description), description, token, enrichments, owner)
+    save_study_search(job.study_id, "running")
+    with _jobs_lock:
+        _jobs[job.study_id] = job
+        if token:
+            _jobs[token] = job
+
+    if SPECULATIVE_COMPOSE_MODE:
+        job.draft_future = submit_background(run_blocking('llm', job._compose_draft, SPECULATIVE_COMPOSE_MODE))
+    job.search_future = submit_background(job._search())
+
+    # Registered once both futures exist, so the job is only dropped when both are done
+    for future in (job.search_future, job.draft_future):
+        if future is not None:
+            future.add_done_callback(job._finished)
+    return job
+
+
+def cancel_study(key, owner=None):
+    """Cancel an in-flight study by study id or client token
+
+    Jobs live in the process that started them, so this only finds studies
+    started by the same worker. Returns False for unknown studies and for
+    studies started by a different owner.
+    """
+    with _jobs_lock:
+        job = _jobs.get(key)
+    if job is None or job.owner != owner:
+        return False
+    job.cancel()
+    return True
+
+
+def get_study_status(study_id):
+    """Return (status, results, error) for a study's participant search
+
+    status is one of "running", "done", "failed", "cancelled", or None for
+    an unknown study. results is in its JSON form; see results_from_json.
+    """
+    row = get_study_search(study_id)
+    if row is None:
+        return None, None, None
+    results = json.loads(row["results_json"]) if row["results_json"] else None
+    return row["status"], results, row["error"]
+
+
+def _draft_future(study_id, mode):
+    with _jobs_lock:
+        job = _jobs.get(study_id)
+    if job is not None and mode == SPECULATIVE_COMPOSE_MODE:
+        return job.draft_future
+    return None
+
+
+def get_speculative_draft(study_id, mode, timeout=None):
+    """Return the draft composed for a study, waiting for it if still in flight"""
+    if study_id is None:
+        return None
+    future = _draft_future(study_id, mode)
+    if future is not None:
+        try:
+            return future.result(timeout)
+        except (CancelledError, TimeoutError):
+            return None
+        except Exception as e:
+            print(f"Speculative draft for study {study_id} failed: {e}")
+            return None
+    return get_study_draft(study_id, mode)
+
+
+async def wait_for_speculative_draft(study_id, mode):
+    """Async variant of get_speculative_draft for async views"""
+    if study_id is None:
+        return None
+    future = _draft_future(study_id, mode)
+    if future is not None:
+        try:
+            return await asyncio.wrap_future(future)
+        except (CancelledError, asyncio.CancelledError):
+            return None
+        except Exception as e:
+            print(f"Speculative draft for study {study_id} failed: {e}")
+            return None
+    return get_study_draft(study_id, mode)
@@ -0,0 +1,119 @@
+import datetime
+import json
+import os
+import threading
+import weakref
+from flask import has_request_context, session
+from google.auth import jwt
+from google.auth.transport.requests import Request
+
+GOOGLE_CLIENT_SECRETS_FILE = "credentials.json"
+
+# Refresh access tokens this long before they expire
+REFRESH_MARGIN = datetime.timedelta(seconds=int(os.getenv("TOKEN_REFRESH_MARGIN_SECONDS", "300")))
+
+_client_config = None
+_client_config_mtime = None
+_config_lock = threading.Lock()
+
+# One lock per refresh token, dropped once no refresh holds or waits for it
+_refresh_locks = weakref.WeakValueDictionary()
+_refresh_locks_lock = threading.Lock()
+_refresh_listeners = []
+
+
+def load_client_config(path=GOOGLE_CLIENT_SECRETS_FILE):
+    """Return the parsed OAuth client secrets, re-reading the file only when it changes"""
+    global _client_config, _client_config_mtime
+    mtime = os.path.getmtime(path)
+    with _config_lock:
+        if _client_config is None or mtime != _client_config_mtime:
+            with open(path, 'r') as f:
+                _client_config = json.load(f)
+            _client_config_mtime = mtime
+        return _client_config
+
+
+def credentials_to_dict(credentials):
+    """Serializable form of google Credentials, as stored in the session and sent to the reply server"""
+    return {
+        'token': credentials.token,
+        'refresh_token': credentials.refresh_token,
+        'token_uri': credentials.token_uri,
+        'client_id': credentials.client_id,
+        'client_secret': credentials.client_secret,
+        'scopes': credentials.scopes,
+        'expiry': credentials.expiry.isoformat() if credentials.expiry else None
+    }
+
+
+def sender_address(credentials):
+    """The Gmail address credentials were issued for, read from their OpenID token; None without one"""
+    id_token = getattr(credentials, 'id_token', None)
+    if not id_token:
+        return None
+    # Received straight from Google's token endpoint over TLS, so the signature isn't re-checked
+    return jwt.decode(id_token, verify=False).get('email')
+
+
+def parse_expiry(value):
+    """Parse a stored expiry; google-auth expects naive UTC datetimes"""
+    return datetime.datetime.fromisoformat(value) if value else None
+
+
+def add_refresh_listener(callback):
+    """Call callback(credentials) after any credentials are refreshed"""
+    _refresh_listeners.append(callback)
+
+
+def _lock_for(refresh_token):
+    with _refresh_locks_lock:
+        lock = _refresh_locks.get(refresh_token)
+        if lock is None:
+            lock = _refresh_locks[refresh_token] = threading.Lock()
+        return lock
+
+
+def _needs_refresh(credentials, margin):
+    if credentials.expiry is None:
+        return not credentials.token
+    return credentials.expiry - datetime.datetime.utcnow() <= margin
+
+
+def refresh_if_expiring(credentials, margin=REFRESH_MARGIN):
+    """Refresh credentials that expire within margin, before a Gmail call finds out
+
+    Concurrent callers holding the same credentials refresh once. Returns
+    True if a refresh happened.
+    """
+    if not credentials.refresh_token or not _needs_refresh(credentials, margin):
+        return False
+    with _lock_for(credentials.refresh_token):
+        if not _needs_refresh(credentials, margin):
+            return False
+        credentials.refresh(Request())
+
+    for callback in _refresh_listeners:
+        try:
+            callback(credentials)
+        except Exception as e:
+            print(f"Error sharing refreshed credentials: {e}")
+    return True
+
+
+def persist_credentials(credentials):
+    """Write a new access token back to the session so later requests reuse it
+
+    Covers both proactive refreshes and ones google-auth did itself during a
+    Gmail call. No-op outside a request or when nothing changed.
+    """
+    if not has_request_context():
+        return False
+    stored = session.get('credentials')
+    if not stored or stored.get('refresh_token') != credentials.refresh_token:
+        return False
+    updated = credentials_to_dict(credentials)
+    if stored.get('token') == updated['token'] and stored.get('expiry') == updated['expiry']:
+        return False
+    session['credentials'] = {**stored, 'token': updated['token'], 'expiry': updated['expiry']}
+    return True
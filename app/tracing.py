@@ -0,0 +1,232 @@
+import contextlib
+import contextvars
+import json
+import os
+import queue
+import random
+import secrets
+import sqlite3
+import threading
+import time
+from flask import g, request
+
+# Tracing is off unless TRACING_ENABLED=1; when off nothing below is started
+# and the stage timers don't call into this module
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "0") == "1"
+
+# Head-based sampling: the fraction of traces kept, decided when a trace starts
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0.05"))
+
+# Per-route overrides as "endpoint=rate,...", e.g. "study.submit_study=1,auth.auth_status=0"
+TRACE_ROUTE_SAMPLE_RATES = os.getenv("TRACE_ROUTE_SAMPLE_RATES", "")
+
+# "sqlite" or "file"; the path is a SQLite database or a JSON lines file
+TRACE_SINK = os.getenv("TRACE_SINK", "sqlite")
+TRACE_PATH = os.getenv("TRACE_PATH", "traces.db" if TRACE_SINK == "sqlite" else "traces.jsonl")
+
+# Also initialize Weights & Biases Weave for this project, off the request path.
+# Weave patches the LLM client libraries process-wide, so it records every
+# LLM call; TRACE_SAMPLE_RATE and the route rates don't apply to it
+WEAVE_PROJECT = os.getenv("WEAVE_PROJECT")
+
+EXPORT_QUEUE_SIZE = 10000
+EXPORT_BATCH_SIZE = 200
+EXPORT_FLUSH_SECONDS = 2.0
+
+_current_trace = contextvars.ContextVar("current_trace", default=None)
+
+
+def _parse_route_rates(spec):
+    rates = {}
+    for entry in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, rate = entry.partition("=")
+        rates[name.strip()] = float(rate)
+    return rates
+
+
+_route_rates = _parse_route_rates(TRACE_ROUTE_SAMPLE_RATES)
+
+
+class Trace:
+    __slots__ = ("trace_id", "name", "start", "duration", "attributes", "spans")
+
+    def __init__(self, name, attributes):
+        self.trace_id = secrets.token_hex(16)
+        self.name = name
+        self.start = time.time()
+        self.duration = None
+        self.attributes = attributes
+        self.spans = []
+
+    def to_dict(self):
+        return {
+            "trace_id": self.trace_id,
+            "name": self.name,
+            "start": self.start,
+            "duration": self.duration,
+            "attributes": self.attributes,
+            "spans": [{"name": name, "start": start, "duration": duration} for name, start, duration in self.spans],
+        }
+
+
+class SQLiteTraceSink:
+    def __init__(self, path):
+        self.path = path
+        self.conn = None
+
+    def write(self, traces):
+        # Connected lazily so the connection belongs to the export thread
+        if self.conn is None:
+            self.conn = sqlite3.connect(self.path)
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS traces (trace_id TEXT PRIMARY KEY, name TEXT, "
+                "start REAL, duration REAL, attributes_json TEXT, spans_json TEXT)"
+            )
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO traces VALUES (?, ?, ?, ?, ?, ?)",
+            [
+                (t["trace_id"], t["name"], t["start"], t["duration"], json.dumps(t["attributes"]), json.dumps(t["spans"]))
+                for t in traces
+            ]
+        )
+        self.conn.commit()
+
+
+class FileTraceSink:
+    def __init__(self, path):
+        self.path = path
+
+    def write(self, traces):
+        with open(self.path, "a") as f:
+            for trace in traces:
+                f.write(json.dumps(trace) + "\n")
+
+
+class TraceExporter:
+    """Batches finished traces to a sink on a background thread
+
+    submit never blocks: when the queue is full the trace is dropped and
+    counted in dropped.
+    """
+
+    def __init__(self, sink):
+        self.sink = sink
+        self.queue = queue.Queue(maxsize=EXPORT_QUEUE_SIZE)
+        self.dropped = 0
+        self._thread = threading.Thread(target=self._run, name="trace-exporter", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def submit(self, trace):
+        try:
+            self.queue.put_nowait(trace.to_dict())
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        if WEAVE_PROJECT:
+            try:
+                import weave
+                weave.init(WEAVE_PROJECT)
+            except Exception as e:
+                print(f"Error initializing Weave: {e}")
+
+        while True:
+            batch = [self.queue.get()]
+            deadline = time.monotonic() + EXPORT_FLUSH_SECONDS
+            while len(batch) < EXPORT_BATCH_SIZE:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self.queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            try:
+                self.sink.write(batch)
+            except Exception as e:
+                print(f"Error exporting {len(batch)} traces: {e}")
+
+
+def _create_exporter():
+    sink = SQLiteTraceSink(TRACE_PATH) if TRACE_SINK == "sqlite" else FileTraceSink(TRACE_PATH)
+    exporter = TraceExporter(sink)
+    exporter.start()
+    return exporter
+
+
+exporter = _create_exporter() if TRACING_ENABLED else None
+
+
+def start_trace(name, **attributes):
+    """Begin a trace if it's sampled; returns the Trace or None"""
+    rate = _route_rates.get(name, TRACE_SAMPLE_RATE)
+    if random.random() >= rate:
+        return None
+    trace = Trace(name, attributes)
+    _current_trace.set(trace)
+    return trace
+
+
+def finish_trace(trace, **attributes):
+    _current_trace.set(None)
+    trace.duration = time.time() - trace.start
+    trace.attributes.update(attributes)
+    exporter.submit(trace)
+
+
+def record_span(stage, elapsed):
+    """Add a finished stage timing to the current trace, if this one is sampled"""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.spans.append((stage, time.time() - elapsed, elapsed))
+
+
+@contextlib.contextmanager
+def _traced(name, attributes):
+    token = _current_trace.set(None)
+    trace = start_trace(name, **attributes)
+    try:
+        yield trace
+    except BaseException as e:
+        if trace is not None:
+            trace.attributes["error"] = type(e).__name__
+        raise
+    finally:
+        if trace is not None:
+            finish_trace(trace)
+        _current_trace.reset(token)
+
+
+_NULL_TRACE = contextlib.nullcontext()
+
+
+def traced(name, **attributes):
+    """Context manager tracing a unit of work outside a request, such as a background search"""
+    if not TRACING_ENABLED:
+        return _NULL_TRACE
+    return _traced(name, attributes)
+
+
+def init_tracing(app):
+    """Start a sampled trace per request; does nothing when tracing is disabled"""
+    if not TRACING_ENABLED:
+        return
+
+    @app.before_request
+    def start_request_trace():
+        g.trace = start_trace(request.endpoint or "unknown", method=request.method, path=request.path)
+
+    @app.after_request
+    def record_response_status(response):
+        trace = g.get('trace')
+        if trace is not None:
+            trace.attributes["status"] = response.status_code
+        return response
+
+    @app.teardown_request
+    def finish_request_trace(error=None):
+        trace = g.pop('trace', None)
+        if trace is not None:
+            finish_trace(trace, **({"error": type(error).__name__} if error else {}))
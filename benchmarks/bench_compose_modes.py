@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Benchmark comparing the "full" (two-agent crew) and "fast" (single
+structured Gemini call) compose pipelines
+
+Calls the live Gemini API, so GEMINI_API_KEY must be set. The draft cache
+is bypassed; every run is a real pipeline run. Both modes start from the
+same cached study analysis, so the analysis is timed as its own stage and
+warmed before the compose modes are measured.
+
+Usage: python benchmarks/bench_compose_modes.py [--runs N] [--description TEXT]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.agents.compose_email import COMPOSE_PIPELINES
+from app.agents.study_analysis import analyze_study, run_study_analysis
+
+DEFAULT_DESCRIPTION = (
+    "We are conducting a study on AI adoption in healthcare. We need healthcare "
+    "professionals who have experience with AI tools in their practice. Participants "
+    "should be working in hospitals or clinics and have used AI-powered diagnostic "
+    "tools or patient management systems. The study is a 45 minute remote interview "
+    "and participants receive a $75 gift card."
+)
+
+
+def run_analysis(description):
+    """The uncached study analysis, as a stage; its tokens aren't reported"""
+    return json.dumps(run_study_analysis(description)), None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--description", default=DEFAULT_DESCRIPTION)
+    args = parser.parse_args()
+
+    # Only the first compose run would otherwise pay for the analysis
+    analyze_study(args.description)
+
+    stages = {"analysis": run_analysis, **COMPOSE_PIPELINES}
+    print(f"{'stage':<10}{'runs':>6}{'p50 s':>10}{'max s':>10}{'tokens':>10}{'chars':>8}{'failures':>10}")
+    for mode, pipeline in stages.items():
+        latencies, tokens, lengths, failures = [], [], [], 0
+        for _ in range(args.runs):
+            start = time.perf_counter()
+            try:
+                draft, total_tokens = pipeline(args.description)
+            except Exception as e:
+                failures += 1
+                print(f"{mode} run failed: {e}", file=sys.stderr)
+                continue
+            latencies.append(time.perf_counter() - start)
+            if total_tokens is not None:
+                tokens.append(total_tokens)
+            lengths.append(len(draft))
+
+        if not latencies:
+            print(f"{mode:<10}{args.runs:>6}{'-':>10}{'-':>10}{'-':>10}{'-':>8}{failures:>10}")
+            continue
+        print(
+            f"{mode:<10}{args.runs:>6}{statistics.median(latencies):>10.2f}{max(latencies):>10.2f}"
+            f"{f'{statistics.mean(tokens):.0f}' if tokens else '-':>10}{statistics.mean(lengths):>8.0f}{failures:>10}"
+        )
+
+
+if __name__ == "__main__":
+    main()
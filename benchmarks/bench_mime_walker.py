@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Benchmark for MIME body extraction on large, realistically structured messages
+
+Compares the old top-level-only extraction in _get_email_content with the
+recursive walker in app/agents/mime_walker.py. Fixtures mirror the MIME
+layouts produced by common mail clients and are converted to the Gmail API
+``payload`` shape.
+
+Usage: python benchmarks/bench_mime_walker.py [--iterations N]
+"""
+
+import argparse
+import base64
+import os
+import statistics
+import sys
+import time
+from email.mime.application import MIMEApplication
+from email.mime.message import MIMEMessage
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+
+# Load the walker directly so the Flask app is not built
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app", "agents"))
+from mime_walker import DEFAULT_MAX_BODY_BYTES, extract_body
+
+REPLY_TEXT = "Hi, I would love to participate in the study. What time commitment is involved?\n"
+QUOTED_HISTORY = "> Earlier message in the thread, quoted by the mail client.\n" * 4000
+NEWSLETTER_HTML = (
+    "<html><head><style>td {font-family: Arial}</style></head><body><table>"
+    + "<tr><td><p>Thanks for reaching out about the research study &amp; compensation.</p></td></tr>" * 8000
+    + "</table></body></html>"
+)
+
+
+def to_gmail_payload(message) -> dict:
+    """Convert an email.message.Message into a Gmail API payload dict"""
+    part = {
+        "mimeType": message.get_content_type(),
+        "filename": message.get_filename() or "",
+        "headers": [{"name": k, "value": v} for k, v in message.items()],
+        "body": {"size": 0},
+    }
+    if message.is_multipart():
+        part["parts"] = [to_gmail_payload(p) for p in message.get_payload()]
+    else:
+        raw = message.get_payload(decode=True) or b""
+        part["body"] = {"size": len(raw), "data": base64.urlsafe_b64encode(raw).decode("ascii")}
+    return part
+
+
+def gmail_web_reply():
+    """multipart/alternative with a long quoted history"""
+    message = MIMEMultipart("alternative")
+    message.attach(MIMEText(REPLY_TEXT + QUOTED_HISTORY, "plain"))
+    message.attach(MIMEText(f"<div>{REPLY_TEXT}</div><blockquote>{QUOTED_HISTORY}</blockquote>", "html"))
+    return message
+
+
+def outlook_with_attachments():
+    """multipart/mixed > multipart/alternative plus several MB of attachments"""
+    message = MIMEMultipart("mixed")
+    alternative = MIMEMultipart("alternative")
+    alternative.attach(MIMEText(REPLY_TEXT, "plain"))
+    alternative.attach(MIMEText(f"<p>{REPLY_TEXT}</p>", "html"))
+    message.attach(alternative)
+    for index in range(3):
+        attachment = MIMEApplication(os.urandom(2 * 1024 * 1024), Name=f"consent_form_{index}.pdf")
+        attachment["Content-Disposition"] = f'attachment; filename="consent_form_{index}.pdf"'
+        message.attach(attachment)
+    return message
+
+
+def apple_mail_html_only():
+    """multipart/related wrapping a large HTML body and an inline image"""
+    message = MIMEMultipart("related")
+    message.attach(MIMEText(NEWSLETTER_HTML, "html"))
+    image = MIMEApplication(os.urandom(512 * 1024), "png", Name="logo.png")
+    image["Content-Disposition"] = 'inline; filename="logo.png"'
+    message.attach(image)
+    return message
+
+
+def forwarded_chain():
+    """Nested message/rfc822 forwards, the reply text several levels down"""
+    inner = MIMEMultipart("alternative")
+    inner.attach(MIMEText(REPLY_TEXT + QUOTED_HISTORY, "plain"))
+    for depth in range(5):
+        wrapper = MIMEMultipart("mixed")
+        wrapper.attach(MIMEMessage(inner))
+        inner = wrapper
+    return inner
+
+
+FIXTURES = {
+    "gmail_web_reply": gmail_web_reply,
+    "outlook_with_attachments": outlook_with_attachments,
+    "apple_mail_html_only": apple_mail_html_only,
+    "forwarded_chain": forwarded_chain,
+}
+
+
+def legacy_extract(payload: dict) -> str:
+    """The original top-level-only extraction, for comparison"""
+    body = ""
+    if 'parts' in payload:
+        for part in payload['parts']:
+            if part['mimeType'] == 'text/plain':
+                body = base64.urlsafe_b64decode(part['body']['data']).decode('utf-8')
+                break
+    elif 'body' in payload and 'data' in payload['body']:
+        body = base64.urlsafe_b64decode(payload['body']['data']).decode('utf-8')
+    return body
+
+
+def bench(fn, payload, iterations):
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        result = fn(payload)
+        timings.append(time.perf_counter() - start)
+    return result, timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--max-bytes", type=int, default=DEFAULT_MAX_BODY_BYTES)
+    args = parser.parse_args()
+
+    print(f"{'fixture':<28}{'impl':<10}{'body chars':>12}{'p50 ms':>10}{'p99 ms':>10}")
+    for name, build in FIXTURES.items():
+        payload = to_gmail_payload(build())
+        for impl, fn in (("legacy", legacy_extract), ("walker", lambda p: extract_body(p, args.max_bytes))):
+            body, timings = bench(fn, payload, args.iterations)
+            timings.sort()
+            p50 = statistics.median(timings) * 1000
+            p99 = timings[min(len(timings) - 1, int(len(timings) * 0.99))] * 1000
+            print(f"{name:<28}{impl:<10}{len(body):>12}{p50:>10.3f}{p99:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
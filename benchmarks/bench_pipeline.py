@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+Offline end-to-end benchmark of the search, compose, send and auto-reply paths
+
+Runs the real app code against the local fakes in benchmarks/fakes.py, so no
+API keys or network are needed and runs are repeatable. Each remote call
+gets the configured latency and error rate. Every study description is made
+unique, so the analysis and draft caches don't hide the pipeline cost. The
+search stage runs the study job's search as /study/submit does, on the
+background loop and including participant index resolution.
+
+For each stage it reports throughput at the given concurrency, p50/p99
+latency, the error count, and the memory allocated per operation, measured
+with tracemalloc in a separate single-threaded pass so that tracing doesn't
+skew the timings.
+
+Usage: python benchmarks/bench_pipeline.py [--stages search,compose_full,...]
+           [--iterations N] [--concurrency N] [--gemini-ms MS] [--exa-ms MS]
+           [--error-rate P] ...
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# Configure the app for offline use before any of it is imported
+os.environ.setdefault("GEMINI_API_KEY", "offline")
+os.environ.setdefault("EXA_API_KEY", "offline")
+os.environ["LINKLINE_DB"] = os.path.join(tempfile.mkdtemp(prefix="linkline-bench-"), "bench.db")
+
+from fakes import FaultInjector, install_fakes
+from app.agents.compose_email import compose_recruitment_email, fallback_email
+from app.agents.email_reply import EmailReplyMCP
+from app.db.models import create_study
+from app.executors import submit_background
+from app.gmail_service import GmailService
+from app.participants import Participant
+from app.study_jobs import StudyJob
+
+DESCRIPTION = (
+    "We are conducting a study on AI adoption in healthcare. We need healthcare "
+    "professionals who have used AI-powered diagnostic tools in hospitals or clinics. "
+    "The study is a 45 minute remote interview with a $75 gift card."
+)
+
+STAGES = ("search", "compose_full", "compose_fast", "send", "replies")
+
+
+def build_stages(args):
+    """Map stage name -> callable(i) returning True on success"""
+    recipients = [Participant(email=f"participant{i}@example.org") for i in range(args.recipients)]
+    reply_agent = EmailReplyMCP(credentials=None, data_file=os.path.join(ROOT, "data", "data.json"))
+    reply_agent.reply_contexts["auto_reply_settings"]["coalesce_window_seconds"] = args.coalesce_window
+
+    def search(i):
+        # The search half of /study/submit: async Exa calls on the bounded
+        # executors, run on the background loop, then resolution against the
+        # participant index
+        description = f"{DESCRIPTION} #{i}"
+        job = StudyJob(create_study(description), description)
+        return submit_background(job._search()).result()["total_results"] > 0
+
+    def compose(mode):
+        def run(i):
+            description = f"{DESCRIPTION} #{mode}-{i}"
+            return compose_recruitment_email(description, mode=mode) != fallback_email(description)
+        return run
+
+    def send(i):
+        results = GmailService.send_bulk_emails_with_credentials(None, recipients, "Invitation", "Body")
+        return results["failed_count"] == 0
+
+    def replies(i):
+        return reply_agent._process_incoming_emails() > 0
+
+    return {
+        "search": search,
+        "compose_full": compose("full"),
+        "compose_fast": compose("fast"),
+        "send": send,
+        "replies": replies,
+    }
+
+
+def run_timed(fn, iterations, concurrency):
+    latencies, errors = [], 0
+
+    def one(i):
+        start = time.perf_counter()
+        try:
+            ok = fn(i)
+        except Exception:
+            ok = False
+        return time.perf_counter() - start, ok
+
+    wall_start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for elapsed, ok in pool.map(one, range(iterations)):
+            latencies.append(elapsed)
+            errors += not ok
+    wall = time.perf_counter() - wall_start
+    return latencies, errors, wall
+
+
+def run_allocations(fn, iterations, offset):
+    """Mean peak and retained KiB per operation"""
+    peaks, retained = [], []
+    tracemalloc.start()
+    try:
+        for i in range(iterations):
+            before = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            try:
+                fn(offset + i)
+            except Exception:
+                pass
+            current, peak = tracemalloc.get_traced_memory()
+            peaks.append(peak - before)
+            retained.append(current - before)
+    finally:
+        tracemalloc.stop()
+    return statistics.mean(peaks) / 1024, statistics.mean(retained) / 1024
+
+
+def percentile(sorted_values, fraction):
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--stages", default=",".join(STAGES))
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--alloc-iterations", type=int, default=10)
+    parser.add_argument("--gemini-ms", type=float, default=50)
+    parser.add_argument("--crew-ms", type=float, default=200, help="latency of each CrewAI task")
+    parser.add_argument("--exa-ms", type=float, default=20)
+    parser.add_argument("--exa-processing-ms", type=float, default=500, help="time for a webset to go idle")
+    parser.add_argument("--gmail-ms", type=float, default=30)
+    parser.add_argument("--jitter-ms", type=float, default=10)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--recipients", type=int, default=10)
+    parser.add_argument("--coalesce-window", type=float, default=0,
+                        help="reply coalescing window; above 0, replies wait for a later poll")
+    parser.add_argument("--verbose", action="store_true", help="show the app's own output")
+    args = parser.parse_args()
+
+    def faults(latency_ms, seed_offset):
+        return FaultInjector(latency_ms, args.jitter_ms, args.error_rate, seed=args.seed + seed_offset)
+
+    install_fakes(
+        gemini=faults(args.gemini_ms, 1),
+        crew=faults(args.crew_ms, 2),
+        exa=faults(args.exa_ms, 3),
+        exa_processing=FaultInjector(args.exa_processing_ms, args.jitter_ms, seed=args.seed + 4),
+        gmail=faults(args.gmail_ms, 5),
+    )
+    stages = build_stages(args)
+
+    print(f"{'stage':<14}{'ops':>6}{'errors':>8}{'ops/s':>9}{'p50 ms':>10}{'p99 ms':>10}{'peak KiB/op':>13}{'kept KiB/op':>13}")
+    for name in args.stages.split(","):
+        fn = stages[name]
+        # The reply listener is a single thread in production
+        concurrency = 1 if name == "replies" else args.concurrency
+        output = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+        with output:
+            latencies, errors, wall = run_timed(fn, args.iterations, concurrency)
+            peak_kib, kept_kib = run_allocations(fn, args.alloc_iterations, offset=args.iterations)
+        latencies.sort()
+        print(
+            f"{name:<14}{len(latencies):>6}{errors:>8}{len(latencies) / wall:>9.1f}"
+            f"{statistics.median(latencies) * 1000:>10.1f}{percentile(latencies, 0.99) * 1000:>10.1f}"
+            f"{peak_kib:>13.1f}{kept_kib:>13.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
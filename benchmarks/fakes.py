@@ -0,0 +1,322 @@
+"""
+Deterministic local stand-ins for Gemini, Exa websets, CrewAI and the Gmail API
+
+Each fake takes a FaultInjector that adds latency (base plus jitter) and
+raises injected errors at a configurable rate from a seeded RNG, so runs are
+repeatable. install_fakes() patches them into the app modules in place of
+the real SDK entry points; the code under test runs unchanged.
+"""
+
+import base64
+import itertools
+import json
+import random
+import threading
+import time
+from email.mime.text import MIMEText
+from types import SimpleNamespace
+
+
+class InjectedError(Exception):
+    """Error raised by a fake to simulate a failing remote call"""
+
+
+class FaultInjector:
+    def __init__(self, latency_ms=0.0, jitter_ms=0.0, error_rate=0.0, seed=0):
+        self.latency = latency_ms / 1000
+        self.jitter = jitter_ms / 1000
+        self.error_rate = error_rate
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def __call__(self, operation):
+        """Sleep for the configured latency, then maybe raise InjectedError"""
+        with self._lock:
+            delay = self.latency + self._rng.uniform(0, self.jitter)
+            fail = self._rng.random() < self.error_rate
+        if delay:
+            time.sleep(delay)
+        if fail:
+            raise InjectedError(f"Injected failure in {operation}")
+
+
+# --- Gemini ---------------------------------------------------------------
+
+FAKE_ANALYSIS = {
+    "purpose": "Understand how clinicians adopt AI diagnostic tools",
+    "target_roles": ["physician", "nurse practitioner", "radiologist"],
+    "industries": ["healthcare"],
+    "skills": ["clinical AI tools"],
+    "demographics": {"location": "United States"},
+    "query_variants": ["clinicians using AI diagnostic tools in US hospitals"],
+    "compensation": "$75 gift card",
+    "time_commitment": "45 minute remote interview",
+    "selling_points": ["shape the future of clinical AI"],
+    "special_considerations": [],
+}
+
+FAKE_EMAIL_BODY = (
+    "Dear Participant,\n\nWe are inviting clinicians who use AI diagnostic tools to a "
+    "45 minute remote interview. Participants receive a $75 gift card.\n\n"
+    "Reply to this email if you are interested.\n\nBest regards,\nResearch Team"
+)
+
+
+class FakeGenerativeModel:
+    """Stands in for genai.GenerativeModel; responses depend on which prompt is sent"""
+
+    faults = FaultInjector()
+
+    def __init__(self, model_name, system_instruction=None, generation_config=None, **kwargs):
+        self.model_name = model_name
+        self.generation_config = generation_config or {}
+
+    def _respond(self, prompt):
+        if "Analyze the following research study" in prompt:
+            return json.dumps(FAKE_ANALYSIS)
+        if self.generation_config.get("response_mime_type") == "application/json":
+            return json.dumps({"subject": "Invitation: AI in clinical practice study", "body": FAKE_EMAIL_BODY})
+        return f"Subject: Invitation: AI in clinical practice study\n\n{FAKE_EMAIL_BODY}"
+
+    def generate_content(self, prompt, stream=False):
+        self.faults("gemini.generate_content")
+        text = self._respond(prompt)
+        usage = SimpleNamespace(total_token_count=len(prompt.split()) + len(text.split()))
+        if not stream:
+            return SimpleNamespace(text=text, parts=[text], usage_metadata=usage)
+        return (SimpleNamespace(text=word + " ", parts=[word]) for word in text.split(" "))
+
+
+# --- CrewAI ---------------------------------------------------------------
+
+class FakeAgent:
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+
+class FakeTask:
+    def __init__(self, description, agent=None, context=None, expected_output=None):
+        self.description = description
+        self.agent = agent
+        self.context = context or []
+
+
+class FakeCrewOutput:
+    def __init__(self, text, tokens):
+        self._text = text
+        self.token_usage = SimpleNamespace(total_tokens=tokens)
+
+    def __str__(self):
+        return self._text
+
+
+class FakeCrew:
+    """Stands in for crewai.Crew; kickoff pays one model call per task"""
+
+    faults = FaultInjector()
+
+    def __init__(self, agents, tasks, verbose=False, process=None):
+        self.tasks = tasks
+
+    def kickoff(self):
+        for task in self.tasks:
+            self.faults("crew.kickoff")
+        text = f"Subject: Invitation: AI in clinical practice study\n\n{FAKE_EMAIL_BODY}"
+        return FakeCrewOutput(text, tokens=sum(len(t.description.split()) for t in self.tasks) + len(text.split()))
+
+
+def fake_setup_crewai_agents():
+    return FakeAgent(role="copywriter"), FakeAgent(role="editor")
+
+
+# --- Exa websets -----------------------------------------------------------
+
+class _FakeEnrichments:
+    """websets.enrichments; an enrichment completes on its first status check
+
+    That check pays processing_faults, and from then on list() returns the
+    enrichment's format for the webset.
+    """
+
+    def __init__(self, exa):
+        self._exa = exa
+
+    def create(self, webset_id, params=None):
+        self._exa.faults("exa.websets.enrichments.create")
+        enrichment_id = f"enrichment_{next(FakeExa._ids)}"
+        with FakeExa._lock:
+            FakeExa._pending_enrichments[enrichment_id] = (webset_id, _format_name(params.format))
+        return SimpleNamespace(id=enrichment_id, status="pending")
+
+    def get(self, webset_id, enrichment_id):
+        self._exa.faults("exa.websets.enrichments.get")
+        with FakeExa._lock:
+            pending = FakeExa._pending_enrichments.pop(enrichment_id, None)
+        if pending is not None:
+            self._exa.processing_faults("exa.enrichment_processing")
+            with FakeExa._lock:
+                FakeExa._formats.setdefault(webset_id, set()).add(pending[1])
+        return SimpleNamespace(id=enrichment_id, status="completed")
+
+
+def _format_name(enrichment_format):
+    return getattr(enrichment_format, "value", enrichment_format)
+
+
+class FakeExa:
+    """Stands in for exa_py.Exa; a webset turns idle on its first status check
+
+    The first get pays processing_faults, modelling the time Exa spends
+    building the webset, so harnesses don't wait on the real poll interval.
+    Items carry only the enrichment formats requested for their webset.
+    """
+
+    faults = FaultInjector()
+    processing_faults = FaultInjector()
+    items_per_webset = 10
+    _ids = itertools.count()
+    # Shared by every client, as the app creates one per call
+    _formats = {}
+    _pending_enrichments = {}
+    _lock = threading.Lock()
+
+    def __init__(self, api_key=None):
+        self.websets = self
+        self.items = self
+        self.enrichments = _FakeEnrichments(self)
+        self._polled = set()
+
+    def create(self, params=None):
+        self.faults("exa.websets.create")
+        webset_id = f"webset_{next(self._ids)}"
+        formats = {_format_name(enrichment.format) for enrichment in (params.enrichments or [])} if params else set()
+        with self._lock:
+            self._formats[webset_id] = formats
+        return SimpleNamespace(id=webset_id, status="running")
+
+    def get(self, webset_id):
+        self.faults("exa.websets.get")
+        if webset_id not in self._polled:
+            self._polled.add(webset_id)
+            self.processing_faults("exa.webset_processing")
+        return SimpleNamespace(id=webset_id, status="idle")
+
+    def cancel(self, webset_id):
+        self.faults("exa.websets.cancel")
+
+    def list(self, webset_id):
+        self.faults("exa.websets.items.list")
+        with self._lock:
+            formats = set(self._formats.get(webset_id, ()))
+        # People are unique per webset so cross-study de-duplication doesn't drop them
+        webset_number = int(webset_id.split("_")[1])
+        data = []
+        for index in range(self.items_per_webset):
+            person_id = webset_number * self.items_per_webset + index
+            person = SimpleNamespace(name=f"Participant {person_id}")
+            enrichments = []
+            if "email" in formats:
+                enrichments.append(SimpleNamespace(format="email", result=[f"participant{person_id}@example.org"]))
+            if "phone" in formats:
+                enrichments.append(SimpleNamespace(format="phone", result=f"+1415{person_id:07d}"))
+            data.append(SimpleNamespace(
+                id=f"item_{person_id}",
+                properties=SimpleNamespace(person=person, url=f"https://www.linkedin.com/in/participant-{person_id}"),
+                enrichments=enrichments,
+            ))
+        return SimpleNamespace(data=data)
+
+
+# --- Gmail -----------------------------------------------------------------
+
+def _raw_reply(index):
+    message = MIMEText(
+        "Hi, I would love to participate in the study. What is the compensation "
+        "and time commitment?\n\n> quoted original invitation\n" * 3
+    )
+    return base64.urlsafe_b64encode(message.as_bytes()).decode("ascii")
+
+
+class _Request:
+    def __init__(self, faults, operation, result):
+        self._faults = faults
+        self._operation = operation
+        self._result = result
+
+    def execute(self):
+        self._faults(self._operation)
+        return self._result() if callable(self._result) else self._result
+
+
+class FakeGmailService:
+    """Stands in for the resource returned by build('gmail', 'v1', ...)
+
+    Every messages().list() call returns messages_per_poll messages that
+    haven't been seen before, so each poll does a full round of work.
+    """
+
+    faults = FaultInjector()
+    messages_per_poll = 10
+
+    def __init__(self):
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+        self.sent = 0
+
+    def users(self):
+        return self
+
+    def messages(self):
+        return self
+
+    def send(self, userId, body):
+        def result():
+            with self._lock:
+                self.sent += 1
+                return {"id": f"sent_{self.sent}", "threadId": body.get("threadId", f"thread_sent_{self.sent}")}
+        return _Request(self.faults, "gmail.messages.send", result)
+
+    def list(self, userId, q=None, **kwargs):
+        with self._lock:
+            ids = [next(self._ids) for _ in range(self.messages_per_poll)]
+        messages = [{"id": f"msg_{i}", "threadId": f"thread_{i}"} for i in ids]
+        return _Request(self.faults, "gmail.messages.list", {"messages": messages})
+
+    def get(self, userId, id, **kwargs):
+        index = int(id.split("_")[1])
+        payload = {
+            "mimeType": "text/plain",
+            "headers": [
+                {"name": "Subject", "value": "Re: Invitation: AI in clinical practice study"},
+                {"name": "From", "value": f"participant{index}@example.org"},
+                {"name": "Message-ID", "value": f"<{id}@mail.example.org>"},
+            ],
+            "body": {"data": _raw_reply(index)},
+        }
+        return _Request(self.faults, "gmail.messages.get", {"id": id, "threadId": f"thread_{index}", "payload": payload})
+
+
+def fake_build(service_name, version, credentials=None, **kwargs):
+    return FakeGmailService()
+
+
+def install_fakes(gemini=None, crew=None, exa=None, exa_processing=None, gmail=None):
+    """Patch the fakes into the app modules; each argument is a FaultInjector"""
+    import google.generativeai as genai
+    from app import gmail_service
+    from app.agents import compose_email, email_reply, exa_agent
+
+    FakeGenerativeModel.faults = gemini or FaultInjector()
+    FakeCrew.faults = crew or FaultInjector()
+    FakeExa.faults = exa or FaultInjector()
+    FakeExa.processing_faults = exa_processing or FaultInjector()
+    FakeGmailService.faults = gmail or FaultInjector()
+
+    genai.configure = lambda **kwargs: None
+    genai.GenerativeModel = FakeGenerativeModel
+    compose_email.Crew = FakeCrew
+    compose_email.Task = FakeTask
+    compose_email.setup_crewai_agents = fake_setup_crewai_agents
+    exa_agent.Exa = FakeExa
+    gmail_service.build = fake_build
+    email_reply.build = fake_build
@@ -0,0 +1,369 @@
+#!/usr/bin/env python3
+"""
+HTTP load test: N concurrent researchers against the app wired to the local fakes
+
+Starts the production server from serve.py in a child process, with Gemini,
+CrewAI, Exa and Gmail replaced by benchmarks/fakes.py in its worker and the
+email reply server disabled. Each virtual user gets a stub OAuth session written straight into
+the session store. It then replays the browser flow: index, submit, poll
+/study/status, results, the streamed compose, save and send. A background
+poller hits /auth/status the way results.js does.
+
+The report shows p50/p99 latency, error rate and 429 rejections per
+endpoint, the peak number of requests in flight on the server for each
+endpoint, and the peak queue depth of each outbound executor, which shows
+where the workers saturate.
+
+Usage: python benchmarks/load_test.py [--users N] [--rounds N] [--gemini-ms MS] ...
+"""
+
+import argparse
+import datetime
+import json
+import os
+import secrets
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# Configure the app for offline use before any of it is imported
+os.environ.setdefault("GEMINI_API_KEY", "offline")
+os.environ.setdefault("EXA_API_KEY", "offline")
+# The server process inherits LOAD_TEST_DB, so both sides share one throwaway database
+os.environ["LINKLINE_DB"] = os.environ.setdefault(
+    "LOAD_TEST_DB", os.path.join(tempfile.mkdtemp(prefix="linkline-load-"), "load.db")
+)
+
+import requests
+from flask import jsonify
+from fakes import FaultInjector, install_fakes
+from app import app
+from app.executors import EXECUTORS
+from app.reply_supervisor import reply_server_supervisor
+from app.session_store import auth_epoch, session_backend
+
+DESCRIPTION = (
+    "We are conducting a study on AI adoption in healthcare. We need healthcare "
+    "professionals who have used AI-powered diagnostic tools in hospitals or clinics."
+)
+
+
+class InFlightMiddleware:
+    """Counts requests in flight on the server, per endpoint and in total"""
+
+    def __init__(self, wsgi_app, url_map):
+        self.wsgi_app = wsgi_app
+        self.url_map = url_map
+        self.lock = threading.Lock()
+        self.inflight = Counter()
+        self.peak = Counter()
+
+    def _endpoint(self, environ):
+        try:
+            return self.url_map.bind_to_environ(environ).match()[0]
+        except Exception:
+            return "unmatched"
+
+    def _add(self, endpoint, delta):
+        with self.lock:
+            self.inflight[endpoint] += delta
+            self.inflight["*"] += delta
+            for key in (endpoint, "*"):
+                self.peak[key] = max(self.peak[key], self.inflight[key])
+
+    def __call__(self, environ, start_response):
+        endpoint = self._endpoint(environ)
+        self._add(endpoint, 1)
+        result = self.wsgi_app(environ, start_response)
+        try:
+            # Consumed here so streamed responses count until their last byte
+            return list(result)
+        finally:
+            if hasattr(result, "close"):
+                result.close()
+            self._add(endpoint, -1)
+
+
+class ExecutorMonitor(threading.Thread):
+    """Samples the queue depth of each outbound executor"""
+
+    def __init__(self, interval=0.05):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.peak_queue = Counter()
+        self.peak_threads = Counter()
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            for name, executor in EXECUTORS.items():
+                self.peak_queue[name] = max(self.peak_queue[name], executor._work_queue.qsize())
+                self.peak_threads[name] = max(self.peak_threads[name], len(executor._threads))
+
+
+class Recorder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = Counter()
+        self.rejected = Counter()
+        self.unauthorized = Counter()
+        self.studies_finished = 0
+
+    def request(self, http, name, method, url, **kwargs):
+        start = time.perf_counter()
+        try:
+            response = http.request(method, url, timeout=600, **kwargs)
+            response.content
+        except requests.RequestException:
+            response = None
+        elapsed = time.perf_counter() - start
+        with self.lock:
+            self.latencies[name].append(elapsed)
+            if response is None or response.status_code >= 400:
+                if response is not None and response.status_code == 429:
+                    self.rejected[name] += 1
+                elif response is not None and response.status_code == 401:
+                    self.unauthorized[name] += 1
+                    self.errors[name] += 1
+                else:
+                    self.errors[name] += 1
+        return response
+
+
+def stub_oauth_session():
+    """Write a logged-in session into the store and return its signed cookie value"""
+    sid = secrets.token_urlsafe(32)
+    interface = app.session_interface
+    expiry = datetime.datetime.utcnow() + datetime.timedelta(days=1)
+    # Create the auth epoch first; on a fresh database the first request would
+    # otherwise create one later than auth_time and reject the session
+    auth_epoch()
+    data = {
+        "credentials": {
+            "token": "fake-access-token",
+            "refresh_token": f"fake-refresh-{sid}",
+            "token_uri": "https://oauth2.googleapis.com/token",
+            "client_id": "fake-client",
+            "client_secret": "fake-secret",
+            "scopes": ["https://www.googleapis.com/auth/gmail.send"],
+            "expiry": expiry.isoformat(),
+            "auth_time": datetime.datetime.now().isoformat(),
+        },
+        "gmail_sender": f"researcher-{sid[:8]}@example.org",
+    }
+    session_backend.save(sid, interface.serializer.dumps(data), app.permanent_session_lifetime.total_seconds())
+    return interface._signer(app).sign(sid).decode("utf-8")
+
+
+def researcher(user, base_url, recorder, args):
+    """One researcher replaying the browser flow args.rounds times"""
+    http = requests.Session()
+    http.cookies.set(app.config["SESSION_COOKIE_NAME"], stub_oauth_session())
+    think = args.think_ms / 1000
+
+    for round_number in range(args.rounds):
+        recorder.request(http, "index", "GET", f"{base_url}/")
+        submitted = recorder.request(http, "submit", "POST", f"{base_url}/study/submit", data={
+            "description": f"{DESCRIPTION} (user {user}, round {round_number})",
+            "study_token": secrets.token_hex(8),
+        })
+        if submitted is None or submitted.status_code != 202:
+            continue
+
+        status_url = f"{base_url}{submitted.json()['status_url']}"
+        while True:
+            time.sleep(args.status_poll_ms / 1000)
+            status = recorder.request(http, "status", "GET", status_url)
+            if status is None or status.status_code != 200 or status.json().get("status") != "running":
+                break
+        if status is not None and status.status_code == 200 and status.json().get("success"):
+            with recorder.lock:
+                recorder.studies_finished += 1
+
+        recorder.request(http, "results", "GET", f"{base_url}/results")
+
+        # results.js polls /auth/status while the page is open
+        page_closed = threading.Event()
+
+        def poll_auth_status():
+            while not page_closed.wait(args.auth_poll_ms / 1000):
+                recorder.request(http, "auth_status", "GET", f"{base_url}/auth/status")
+
+        poller = threading.Thread(target=poll_auth_status, daemon=True)
+        poller.start()
+
+        time.sleep(think)
+        composed = recorder.request(http, "compose_stream", "POST", f"{base_url}/email/compose-email/stream",
+                                    json={"mode": args.compose_mode})
+        draft = "Subject: Invitation\n\nBody"
+        if composed is not None and composed.ok:
+            data_lines = [line for line in composed.text.splitlines() if line.startswith("data:")]
+            draft = json.loads(data_lines[-1][5:]) if data_lines else draft
+
+        time.sleep(think)
+        recorder.request(http, "save", "POST", f"{base_url}/email/save-email", json={"email_content": draft})
+        time.sleep(think)
+        recorder.request(http, "send", "POST", f"{base_url}/email/send-emails", json={})
+
+        page_closed.set()
+        poller.join()
+
+
+def percentile(sorted_values, fraction):
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_until_serving(base_url, server, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            sys.exit(f"Server exited with code {server.returncode} before it started serving")
+        try:
+            requests.get(f"{base_url}/_load_test/stats", timeout=1)
+            return
+        except requests.RequestException:
+            time.sleep(0.2)
+    server.terminate()
+    sys.exit(f"Server didn't start serving within {timeout}s")
+
+
+def serve(args):
+    """Server process: serve.py's gunicorn server, with the fakes installed in its worker"""
+    from serve import LinkLineServer, server_options
+
+    def load_app():
+        def faults(latency_ms, seed_offset):
+            return FaultInjector(latency_ms, args.jitter_ms, args.error_rate, seed=args.seed + seed_offset)
+
+        install_fakes(
+            gemini=faults(args.gemini_ms, 1),
+            crew=faults(args.crew_ms, 2),
+            exa=faults(args.exa_ms, 3),
+            exa_processing=FaultInjector(args.exa_processing_ms, args.jitter_ms, seed=args.seed + 4),
+            gmail=faults(args.gmail_ms, 5),
+        )
+        # The reply server is a separate process; keep it out of the load test
+        reply_server_supervisor.start = lambda: "Email reply server disabled for load test"
+
+        monitor = ExecutorMonitor()
+        monitor.start()
+        middleware = InFlightMiddleware(app.wsgi_app, app.url_map)
+
+        @app.route("/_load_test/stats")
+        def load_test_stats():
+            return jsonify({
+                "peak_inflight": dict(middleware.peak),
+                "executors": {
+                    name: {
+                        "max_workers": executor._max_workers,
+                        "peak_threads": monitor.peak_threads[name],
+                        "peak_queued": monitor.peak_queue[name],
+                    }
+                    for name, executor in EXECUTORS.items()
+                },
+            })
+
+        app.wsgi_app = middleware
+        return app
+
+    LinkLineServer({**server_options(), "bind": f"127.0.0.1:{args.serve_port}"}, load_app).run()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--rounds", type=int, default=2)
+    parser.add_argument("--think-ms", type=float, default=200)
+    parser.add_argument("--status-poll-ms", type=float, default=500)
+    parser.add_argument("--auth-poll-ms", type=float, default=2000)
+    parser.add_argument("--compose-mode", default="fast", choices=("full", "fast"))
+    parser.add_argument("--gemini-ms", type=float, default=200)
+    parser.add_argument("--crew-ms", type=float, default=800)
+    parser.add_argument("--exa-ms", type=float, default=50)
+    parser.add_argument("--exa-processing-ms", type=float, default=3000)
+    parser.add_argument("--gmail-ms", type=float, default=80)
+    parser.add_argument("--jitter-ms", type=float, default=20)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--verbose", action="store_true", help="show the app's own output")
+    parser.add_argument("--serve-port", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve_port is not None:
+        serve(args)
+        return
+
+    port = free_port()
+    server = subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), *sys.argv[1:], "--serve-port", str(port)],
+        stdout=None if args.verbose else subprocess.DEVNULL,
+        stderr=None if args.verbose else subprocess.DEVNULL,
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        wait_until_serving(base_url, server)
+
+        recorder = Recorder()
+        started = time.perf_counter()
+        users = [
+            threading.Thread(target=researcher, args=(user, base_url, recorder, args))
+            for user in range(args.users)
+        ]
+        for thread in users:
+            thread.start()
+        for thread in users:
+            thread.join()
+        wall = time.perf_counter() - started
+        stats = requests.get(f"{base_url}/_load_test/stats", timeout=30).json()
+    finally:
+        server.terminate()
+        server.wait()
+    peak = Counter(stats["peak_inflight"])
+
+    print(f"{args.users} users x {args.rounds} rounds in {wall:.1f}s, "
+          f"peak {peak['*']} requests in flight\n")
+    print(f"{'endpoint':<16}{'requests':>9}{'p50 ms':>10}{'p99 ms':>10}{'error %':>9}{'429s':>6}{'peak inflight':>15}")
+    endpoint_names = {
+        "index": "main.index", "submit": "study.submit_study", "status": "study.study_status",
+        "results": "main.show_results", "auth_status": "auth.auth_status",
+        "compose_stream": "email.compose_email_stream", "save": "email.save_email", "send": "email.send_emails",
+    }
+    for name, endpoint in endpoint_names.items():
+        latencies = sorted(recorder.latencies[name])
+        if not latencies:
+            continue
+        print(
+            f"{name:<16}{len(latencies):>9}{statistics.median(latencies) * 1000:>10.1f}"
+            f"{percentile(latencies, 0.99) * 1000:>10.1f}{100 * recorder.errors[name] / len(latencies):>9.1f}"
+            f"{recorder.rejected[name]:>6}{peak[endpoint]:>15}"
+        )
+
+    print(f"\n{'executor':<10}{'max workers':>12}{'peak threads':>14}{'peak queued':>13}")
+    for name, executor in stats["executors"].items():
+        print(f"{name:<10}{executor['max_workers']:>12}{executor['peak_threads']:>14}{executor['peak_queued']:>13}")
+
+    # A run where nobody got through measures nothing; fail rather than print a clean-looking report
+    if recorder.unauthorized["submit"] or not recorder.studies_finished:
+        print(f"\nFAILED: {recorder.unauthorized['submit']} submits rejected as unauthenticated, "
+              f"{recorder.studies_finished} studies finished", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
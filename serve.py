@@ -0,0 +1,51 @@
+"""
+Production entry point: serves the Flask app on gunicorn's threaded workers
+
+run.py starts Flask's debug server. Here each worker process serves up to
+WEB_THREADS requests at once, each on its own thread, so an open compose
+stream or a bulk send doesn't hold up anyone else. Long-running work is
+still handed to the bounded executors and background loop in
+app/executors.py rather than kept on request threads.
+
+Usage: python serve.py   (HOST, PORT, WEB_WORKERS and WEB_THREADS configure it)
+"""
+
+import os
+from gunicorn.app.base import BaseApplication
+
+
+def server_options():
+    """gunicorn settings from the environment"""
+    return {
+        "bind": f"{os.getenv('HOST', '127.0.0.1')}:{os.getenv('PORT', '5000')}",
+        # Study jobs and the reply server supervisor live in-process, so keep
+        # one worker unless a shared job store is in place
+        "workers": int(os.getenv("WEB_WORKERS", "1")),
+        "worker_class": "gthread",
+        "threads": int(os.getenv("WEB_THREADS", "32")),
+    }
+
+
+class LinkLineServer(BaseApplication):
+    """Runs the app under gunicorn without a separate config file"""
+
+    def __init__(self, options, app_loader=None):
+        self.options = options
+        self.app_loader = app_loader
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        # Imported in the worker, after the fork, so each worker starts its
+        # own executors and background loop
+        if self.app_loader is not None:
+            return self.app_loader()
+        from app import app
+        return app
+
+
+if __name__ == "__main__":
+    LinkLineServer(server_options()).run()
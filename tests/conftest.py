@@ -0,0 +1,12 @@
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Importing the app writes secret_key.txt to the working directory and opens
+# linkline.db, so the tests run in a scratch directory with their own database
+_scratch = tempfile.mkdtemp(prefix="linkline-tests-")
+os.environ["LINKLINE_DB"] = os.path.join(_scratch, "linkline.db")
+os.chdir(_scratch)
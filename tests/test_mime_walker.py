@@ -0,0 +1,55 @@
+import base64
+from app.agents.mime_walker import decode_part, extract_body
+
+
+def encode(data):
+    # Gmail sends base64url without padding
+    return base64.urlsafe_b64encode(data).decode("ascii").rstrip("=")
+
+
+def part(mime_type, data, content_type=None, **extra):
+    headers = [{"name": "Content-Type", "value": content_type}] if content_type else []
+    return {"mimeType": mime_type, "headers": headers, "body": {"data": encode(data)}, **extra}
+
+
+def test_decode_part_decodes_unpadded_base64url():
+    assert decode_part(part("text/plain", "Happy to take part? ~ yes".encode())) == "Happy to take part? ~ yes"
+
+
+def test_decode_part_stops_at_max_bytes():
+    body = part("text/plain", b"abcdefghij" * 100)
+    for max_bytes in (1, 2, 3, 10, 11):
+        assert decode_part(body, max_bytes) == ("abcdefghij" * 2)[:max_bytes]
+
+
+def test_decode_part_uses_the_declared_charset():
+    body = part("text/plain", "Café".encode("iso-8859-1"), content_type='text/plain; charset="ISO-8859-1"')
+    assert decode_part(body) == "Café"
+
+
+def test_decode_part_falls_back_to_utf8_for_unknown_charsets():
+    body = part("text/plain", "Café".encode(), content_type="text/plain; charset=x-unknown")
+    assert decode_part(body) == "Café"
+
+
+def test_decode_part_without_data():
+    assert decode_part({"mimeType": "text/plain", "body": {"size": 0}}) == ""
+    assert decode_part({"mimeType": "text/plain", "body": {"data": "!!!"}}) == ""
+
+
+def test_extract_body_prefers_plain_text_and_skips_attachments():
+    payload = {"mimeType": "multipart/mixed", "parts": [
+        part("text/plain", b"attached notes", filename="notes.txt"),
+        {"mimeType": "multipart/alternative", "parts": [
+            part("text/html", b"<p>Hello <b>there</b></p>"),
+            part("text/plain", b"Hello there"),
+        ]},
+    ]}
+    assert extract_body(payload) == "Hello there"
+
+
+def test_extract_body_falls_back_to_stripped_html():
+    payload = {"mimeType": "multipart/alternative", "parts": [
+        part("text/html", b"<p>Hello <b>there</b></p><script>ignored()</script>"),
+    ]}
+    assert "Hello" in extract_body(payload) and "ignored" not in extract_body(payload)
@@ -0,0 +1,116 @@
+import pytest
+from app import participant_index
+from app.participant_index import (
+    canonical_linkedin, email_identity, normalize_email, normalize_phone, resolve_participants
+)
+from app.participants import Participant
+
+
+@pytest.mark.parametrize("phone, expected", [
+    ("+1 (415) 555-2671", "+14155552671"),
+    ("(415) 555-2671", "+14155552671"),
+    ("1-415-555-2671", "+14155552671"),
+    ("0044 20 7946 0958", "+442079460958"),
+    ("555-1234", None),            # too short to be a national number
+    ("020 7946 0958", None),       # a UK number, not a valid US one
+    ("(015) 555-2671", None),      # US area codes never start with 0 or 1
+    ("+1 234", None),
+    ("", None),
+    (None, None),
+])
+def test_normalize_phone(phone, expected):
+    assert normalize_phone(phone) == expected
+
+
+def test_normalize_phone_uses_the_default_country_code(monkeypatch):
+    monkeypatch.setattr(participant_index, "DEFAULT_PHONE_COUNTRY_CODE", "44")
+    assert normalize_phone("020 7946 0958") == "+442079460958"
+    assert normalize_phone("7946 0958") is None
+
+
+def test_normalize_phone_rejects_numbers_for_unlisted_default_codes(monkeypatch):
+    monkeypatch.setattr(participant_index, "DEFAULT_PHONE_COUNTRY_CODE", "7")
+    assert normalize_phone("912 345 6789") is None
+    assert normalize_phone("+7 912 345 6789") == "+79123456789"
+
+
+@pytest.mark.parametrize("email, expected", [
+    (" Jane.Doe@Example.COM ", "jane.doe@example.com"),
+    ("jane+study@example.com", "jane+study@example.com"),
+    ("not-an-email", None),
+    ("two@at@example.com", None),
+    ("", None),
+    (None, None),
+])
+def test_normalize_email(email, expected):
+    assert normalize_email(email) == expected
+
+
+def test_email_identity_drops_the_plus_tag():
+    assert email_identity("jane+study@example.com") == "jane@example.com"
+    assert email_identity("jane@example.com") == "jane@example.com"
+
+
+@pytest.mark.parametrize("url, expected", [
+    ("https://www.linkedin.com/in/Jane-Doe/?trk=public", "linkedin.com/in/jane-doe"),
+    ("linkedin.com/in/jane-doe", "linkedin.com/in/jane-doe"),
+    ("https://uk.linkedin.com/pub/jane-doe/1/2/3", "linkedin.com/in/jane-doe"),
+    ("https://www.linkedin.com/in/j%C3%A9r%C3%B4me", "linkedin.com/in/jérôme"),
+    ("https://WWW.Example.com/People/Jane", "example.com/People/Jane"),
+    ("", None),
+    (None, None),
+])
+def test_canonical_linkedin(url, expected):
+    assert canonical_linkedin(url) == expected
+
+
+def test_resolve_participants_merges_duplicates_within_results():
+    batch = resolve_participants([
+        Participant(name="Ada", email="ada+lab@dup.example", linkedin="https://linkedin.com/in/ada-dup"),
+        Participant(name="Ada L.", email="ADA@dup.example", phone="(415) 555-0101"),
+    ])
+
+    assert len(batch) == 1
+    ada = batch[0]
+    assert ada.participant_id is not None
+    assert ada.email == "ada+lab@dup.example"
+    assert ada.phone == "+14155550101"
+    assert ada.linkedin == "https://www.linkedin.com/in/ada-dup"
+
+
+def test_resolve_participants_fills_in_details_found_in_earlier_studies():
+    first = resolve_participants([
+        Participant(name="Grace", email="grace@known.example", linkedin="https://linkedin.com/in/grace-known"),
+    ], study_id=1)
+
+    second = resolve_participants([Participant(name="Grace H.", linkedin="linkedin.com/in/Grace-Known")], study_id=2)
+
+    assert second[0].participant_id == first[0].participant_id
+    assert second[0].email == "grace@known.example"
+
+
+def test_resolve_participants_merges_rows_that_resolve_to_the_same_known_person():
+    first = resolve_participants([
+        Participant(name="Alan", email="alan@merge.example", linkedin="https://linkedin.com/in/alan-merge"),
+    ], study_id=1)
+
+    # Neither row shares a key with the other, only with the known participant
+    second = resolve_participants([
+        Participant(name="Alan T.", linkedin="https://linkedin.com/in/alan-merge"),
+        Participant(name="A. Turing", email="alan@merge.example", phone="(415) 555-0102"),
+    ], study_id=2)
+
+    assert len(second) == 1
+    assert second[0].participant_id == first[0].participant_id
+    assert second[0].phone == "+14155550102"
+
+
+def test_resolve_participants_keeps_different_people_apart():
+    batch = resolve_participants([
+        Participant(name="Barbara", email="barbara@apart.example"),
+        Participant(name="Edsger", email="edsger@apart.example"),
+        Participant(name="No details"),
+    ])
+
+    assert len(batch) == 3
+    assert len(set(batch.column("participant_id"))) == 3
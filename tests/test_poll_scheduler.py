@@ -0,0 +1,111 @@
+from app.agents.poll_scheduler import AdaptivePollScheduler, is_rate_limit_error, retry_after_seconds
+
+SETTINGS = {
+    "check_interval_minutes": 5,
+    "min_check_interval_seconds": 30,
+    "max_check_interval_minutes": 30,
+    "backoff_factor": 2,
+    "campaign_boost_minutes": 60,
+}
+
+
+class FakeResponse(dict):
+    def __init__(self, status, headers=None):
+        super().__init__(headers or {})
+        self.status = status
+
+
+class FakeHttpError(Exception):
+    def __init__(self, status, headers=None, error_details=None):
+        self.resp = FakeResponse(status, headers)
+        self.error_details = error_details
+
+
+def scheduler(settings=None):
+    settings = dict(SETTINGS, **(settings or {}))
+    return AdaptivePollScheduler(lambda: settings)
+
+
+def test_polls_at_the_minimum_interval_while_mail_arrives():
+    poll_scheduler = scheduler()
+    poll_scheduler.record_poll(3)
+    assert poll_scheduler.next_delay() == 30
+
+
+def test_backs_off_on_empty_polls_up_to_the_maximum():
+    poll_scheduler = scheduler()
+    delays = []
+    for _ in range(6):
+        poll_scheduler.record_poll(0)
+        delays.append(poll_scheduler.next_delay())
+    assert delays == [300, 600, 1200, 1800, 1800, 1800]
+
+    poll_scheduler.record_poll(1)
+    assert poll_scheduler.next_delay() == 30
+
+
+def test_reads_settings_on_every_decision():
+    settings = dict(SETTINGS)
+    poll_scheduler = AdaptivePollScheduler(lambda: settings)
+    poll_scheduler.record_poll(0)
+    settings["check_interval_minutes"] = 1
+    assert poll_scheduler.next_delay() == 60
+
+
+def test_campaign_boost_overrides_the_backoff():
+    poll_scheduler = scheduler()
+    for _ in range(3):
+        poll_scheduler.record_poll(0)
+    poll_scheduler.notify_campaign_sent()
+    poll_scheduler.record_poll(0)
+    assert poll_scheduler.next_delay() == 30
+
+
+def test_held_replies_shorten_the_wait():
+    poll_scheduler = scheduler()
+    poll_scheduler.record_poll(0)
+    poll_scheduler.record_pending(45)
+    assert poll_scheduler.next_delay() == 45
+    poll_scheduler.record_pending(5)
+    assert poll_scheduler.next_delay() == 30
+    poll_scheduler.record_pending(None)
+    assert poll_scheduler.next_delay() == 300
+
+
+def test_rate_limits_pause_for_retry_after_once():
+    poll_scheduler = scheduler()
+    poll_scheduler.record_rate_limit(120)
+    assert poll_scheduler.next_delay() == 120
+    assert poll_scheduler.next_delay() == 30
+
+
+def test_rate_limits_without_retry_after_back_off_exponentially():
+    poll_scheduler = scheduler()
+    poll_scheduler.record_rate_limit()
+    assert poll_scheduler.next_delay() == 60
+    poll_scheduler.record_rate_limit()
+    assert poll_scheduler.next_delay() == 120
+    poll_scheduler.record_poll(0)
+    poll_scheduler.record_rate_limit()
+    assert poll_scheduler.next_delay() == 60
+
+
+def test_wait_records_the_delay():
+    poll_scheduler = scheduler({"min_check_interval_seconds": 0.01})
+    poll_scheduler.record_poll(1)
+    poll_scheduler.wait()
+    assert poll_scheduler.last_delay == 0.01
+
+
+def test_rate_limit_errors():
+    assert is_rate_limit_error(FakeHttpError(429))
+    assert is_rate_limit_error(FakeHttpError(403, error_details=[{"reason": "userRateLimitExceeded"}]))
+    assert not is_rate_limit_error(FakeHttpError(403, error_details=[{"reason": "forbidden"}]))
+    assert not is_rate_limit_error(FakeHttpError(500))
+
+
+def test_retry_after_seconds():
+    assert retry_after_seconds(FakeHttpError(429, {"retry-after": "30"})) == 30
+    assert retry_after_seconds(FakeHttpError(429, {"retry-after": "Wed, 21 Oct 2015 07:28:00 GMT"})) == 0
+    assert retry_after_seconds(FakeHttpError(429, {"retry-after": "soon"})) is None
+    assert retry_after_seconds(FakeHttpError(429)) is None
@@ -0,0 +1,62 @@
+from app.agents.reply_coalescer import ReplyCoalescer, normalize_sender
+
+
+def test_normalize_sender():
+    assert normalize_sender('Jane Doe <Jane+Study@Example.com>') == "jane@example.com"
+    assert normalize_sender("jane@example.com") == "jane@example.com"
+
+
+def test_zero_window_flushes_on_the_collecting_poll():
+    coalescer = ReplyCoalescer(lambda: 0)
+    coalescer.add("m1", "t1", "jane@example.com", "Question", "Hi", now=100)
+
+    groups = coalescer.pop_due(100)
+
+    assert [group.message_ids for group in groups] == [["m1"]]
+    assert not coalescer.is_pending("m1")
+
+
+def test_messages_from_one_sender_on_one_thread_share_a_reply():
+    coalescer = ReplyCoalescer(lambda: 60)
+    # Gmail lists the newest message first
+    coalescer.add("m2", "t1", "Jane <jane@example.com>", "Re: Question", "Also...", now=10,
+                  message_id_header="<m2@mail>", references="<m1@mail>", sent_at=2000)
+    coalescer.add("m1", "t1", "jane+alias@EXAMPLE.com", "Question", "First", now=10,
+                  message_id_header="<m1@mail>", sent_at=1000)
+
+    assert coalescer.pop_due(59) == []
+    assert coalescer.next_due_in(10) == 50
+    assert coalescer.is_pending("m1") and coalescer.is_pending("m2")
+    assert coalescer.stats() == {"pending_reply_groups": 1, "pending_messages": 2}
+
+    [group] = coalescer.pop_due(60)
+    assert group.message_ids == ["m1", "m2"]
+    assert group.body == "First\n\nAlso..."
+    # The reply answers the latest message
+    assert group.subject == "Re: Question"
+    assert group.message_id_header == "<m2@mail>"
+    assert group.references == "<m1@mail>"
+    assert coalescer.next_due_in(60) is None
+    assert coalescer.stats() == {"pending_reply_groups": 0, "pending_messages": 0}
+
+
+def test_other_threads_and_senders_get_their_own_replies():
+    coalescer = ReplyCoalescer(lambda: 60)
+    coalescer.add("m1", "t1", "jane@example.com", "A", "a", now=10)
+    coalescer.add("m2", "t2", "jane@example.com", "B", "b", now=10)
+    coalescer.add("m3", "t1", "john@example.com", "A", "c", now=10)
+
+    groups = coalescer.pop_due(60)
+
+    assert sorted(group.message_ids[0] for group in groups) == ["m1", "m2", "m3"]
+
+
+def test_a_group_stays_in_the_window_it_was_opened_in():
+    coalescer = ReplyCoalescer(lambda: 60)
+    coalescer.add("m1", "t1", "jane@example.com", "A", "a", now=50)
+    coalescer.add("m2", "t1", "jane@example.com", "A", "b", now=65)
+    coalescer.add("m3", "t2", "jane@example.com", "B", "c", now=65)
+
+    [group] = coalescer.pop_due(60)
+    assert group.message_ids == ["m1", "m2"]
+    assert [group.message_ids for group in coalescer.pop_due(120)] == [["m3"]]